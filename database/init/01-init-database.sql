@@ -19,6 +19,24 @@ CREATE TABLE IF NOT EXISTS status (
     last_update TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Checkpoints of an unfinished full load (scripts/load_checkpoint.py)
+CREATE UNLOGGED TABLE IF NOT EXISTS load_run (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    fingerprint TEXT NOT NULL,
+    started_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE UNLOGGED TABLE IF NOT EXISTS load_stage (
+    stage VARCHAR(50) PRIMARY KEY
+);
+
+CREATE UNLOGGED TABLE IF NOT EXISTS load_batch (
+    stage VARCHAR(50) NOT NULL,
+    shard INTEGER NOT NULL,
+    batch INTEGER NOT NULL,
+    PRIMARY KEY (stage, shard, batch)
+);
+
 -- ============================================
 -- KANJI
 -- ============================================
@@ -30,6 +48,7 @@ CREATE TABLE IF NOT EXISTS kanji (
     frequency INTEGER,
     jlpt_level_old INTEGER,
     jlpt_level_new INTEGER,
+    content_hash BYTEA,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
@@ -163,6 +182,8 @@ CREATE TABLE IF NOT EXISTS vocabulary (
     jmdict_id VARCHAR(20) UNIQUE NOT NULL,
     jlpt_level_new INTEGER,
     slug TEXT,
+    content_hash BYTEA,
+    examples_hash BYTEA,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
@@ -307,6 +328,7 @@ CREATE TABLE IF NOT EXISTS proper_noun (
     id UUID PRIMARY KEY DEFAULT uuidv7(),
     jmnedict_id VARCHAR(20) UNIQUE NOT NULL,
     slug TEXT,
+    content_hash BYTEA,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
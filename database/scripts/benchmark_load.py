@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+End-to-end load benchmark on synthetic sources.
+
+For every processor, loads synthetic sources (synthetic_sources.py) into a
+throwaway database created from the init scripts, runs run_processor.py
+like the data-processor container does, and compares the per-stage
+throughput (rows/s from load_metrics.json) with a stored baseline. Exits
+with 1 when a stage or the whole load got slower than the baseline by more
+than BENCH_TOLERANCE.
+
+The throwaway database is created on the POSTGRES_* server, or with
+--initdb in a temporary cluster (initdb/pg_ctl from PG_BIN or the PATH).
+
+    python benchmark_load.py --scale 0.05 --update-baseline   # record
+    python benchmark_load.py --scale 0.05                     # compare
+
+Baselines are machine specific and not committed; record one on the machine
+that runs the comparison.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import psycopg2
+
+import load_metrics
+import ndjson_shards
+import synthetic_sources
+from shadow_schema import INIT_SQL_DIR
+
+script_dir = Path(__file__).parent
+
+# Generated sources, per-run state and reports
+BENCH_DIR = Path(os.getenv('BENCH_DIR', script_dir / '.benchmark'))
+BENCH_BASELINE = Path(os.getenv('BENCH_BASELINE', script_dir / 'benchmark_baseline.json'))
+
+# Allowed throughput drop against the baseline before a stage counts as a regression
+BENCH_TOLERANCE = float(os.getenv('BENCH_TOLERANCE', '0.2'))
+
+# Shorter stages are too noisy to compare (the whole load is always compared)
+BENCH_MIN_STAGE_SECONDS = float(os.getenv('BENCH_MIN_STAGE_SECONDS', '1.0'))
+
+# Directory with initdb/pg_ctl for --initdb (default: the PATH)
+PG_BIN = os.getenv('PG_BIN', '')
+
+PROCESSORS = {'async': '1', 'parallel': '0'}
+TOTAL = 'total'
+
+# run_processor phases around the stage graph; their few writes are not throughput
+RUN_PHASES = ('setup', 'clean', 'drop_indexes', 'load', 'rebuild_indexes', 'analyze', 'swap')
+
+
+def server_params() -> Dict[str, str]:
+    """Return connection parameters of the POSTGRES_* server (maintenance database)."""
+    return {
+        'host': os.getenv('POSTGRES_HOST', 'localhost'),
+        'port': os.getenv('POSTGRES_PORT', '5432'),
+        'database': 'postgres',
+        'user': os.getenv('POSTGRES_USER', 'jlptuser'),
+        'password': os.getenv('POSTGRES_PASSWORD', 'jlptpassword'),
+    }
+
+
+class TemporaryCluster:
+    """A PostgreSQL cluster in a temporary directory, listening on a socket only."""
+
+    def __init__(self, user: str):
+        self.user = user
+        self.directory = Path(tempfile.mkdtemp(prefix='jlpt-bench-pg-'))
+        with socket.socket() as s:
+            s.bind(('127.0.0.1', 0))
+            self.port = str(s.getsockname()[1])
+
+    def _binary(self, name: str) -> str:
+        path = Path(PG_BIN) / name if PG_BIN else shutil.which(name)
+        if not path:
+            raise RuntimeError(f"{name} not found; install PostgreSQL or set PG_BIN")
+        return str(path)
+
+    def start(self) -> Dict[str, str]:
+        data = self.directory / 'data'
+        subprocess.run([self._binary('initdb'), '-D', str(data), '-U', self.user, '--auth=trust',
+                        '--encoding=UTF8', '--no-sync'], check=True, stdout=subprocess.DEVNULL)
+        subprocess.run([self._binary('pg_ctl'), '-D', str(data), '-l', str(self.directory / 'server.log'),
+                        '-o', f"-k {self.directory} -p {self.port} -c listen_addresses='' -c fsync=off",
+                        '-w', 'start'], check=True, stdout=subprocess.DEVNULL)
+        return {'host': str(self.directory), 'port': self.port, 'database': 'postgres',
+                'user': self.user, 'password': ''}
+
+    def stop(self) -> None:
+        subprocess.run([self._binary('pg_ctl'), '-D', str(self.directory / 'data'), '-m', 'fast', 'stop'],
+                       stdout=subprocess.DEVNULL)
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def create_database(params: Dict[str, str], name: str) -> None:
+    """(Re)create a database and run the init scripts in it."""
+    conn = psycopg2.connect(**params)
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(f'DROP DATABASE IF EXISTS {name}')
+            cursor.execute(f'CREATE DATABASE {name}')
+    finally:
+        conn.close()
+
+    conn = psycopg2.connect(**{**params, 'database': name})
+    try:
+        with conn.cursor() as cursor:
+            for path in sorted(INIT_SQL_DIR.glob('*.sql')):
+                cursor.execute(path.read_text(encoding='utf-8'))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def drop_database(params: Dict[str, str], name: str) -> None:
+    conn = psycopg2.connect(**params)
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(f'DROP DATABASE IF EXISTS {name} WITH (FORCE)')
+    finally:
+        conn.close()
+
+
+def prepare_sources(scale: float, seed: int) -> Path:
+    """Generate the sources for a scale and seed once and reuse them afterwards."""
+    source_dir = BENCH_DIR / f'source-{scale:g}-{seed}'
+    if not (source_dir / '.complete').exists():
+        shutil.rmtree(source_dir, ignore_errors=True)
+        print(f"Generating synthetic sources (scale {scale:g}, seed {seed})...", flush=True)
+        sizes = synthetic_sources.generate(source_dir, scale, seed)
+        ndjson_shards.convert_sources(source_dir)
+        (source_dir / '.complete').write_text(json.dumps(sizes), encoding='utf-8')
+    return source_dir
+
+
+def run_load(processor: str, params: Dict[str, str], database: str, source_dir: Path) -> Dict[str, Any]:
+    """
+    Load the sources into a fresh database with run_processor.py.
+
+    Returns:
+        The load_metrics.json report of the run
+    """
+    run_dir = BENCH_DIR / 'run'
+    shutil.rmtree(run_dir, ignore_errors=True)
+    run_dir.mkdir(parents=True)
+    create_database(params, database)
+
+    env = {
+        **os.environ,
+        'POSTGRES_HOST': params['host'],
+        'POSTGRES_PORT': params['port'],
+        'POSTGRES_DB': database,
+        'POSTGRES_USER': params['user'],
+        'POSTGRES_PASSWORD': params['password'],
+        'JMDICT_SOURCE_DIR': str(source_dir),
+        'USE_ASYNC': PROCESSORS[processor],
+        'LOAD_MODE': 'full',
+        'SHADOW_LOAD': '0',
+        'LOAD_RESUME': '0',
+        'METRICS_DIR': str(run_dir),
+        'CHECKPOINT_DIR': str(run_dir / 'checkpoint'),
+        'INDEX_STATE_FILE': str(run_dir / 'index_state.json'),
+        'CACHE_DIR': str(run_dir / 'cache'),
+    }
+    with open(run_dir / 'processor.log', 'w', encoding='utf-8') as log:
+        result = subprocess.run([sys.executable, str(script_dir / 'run_processor.py')],
+                                env=env, stdout=log, stderr=subprocess.STDOUT)
+    report_path = run_dir / load_metrics.METRICS_JSON
+    report = json.loads(report_path.read_text(encoding='utf-8')) if report_path.exists() else {}
+    if result.returncode != 0 or not report.get('success'):
+        raise RuntimeError(f"{processor} load failed, see {run_dir / 'processor.log'}")
+    return report
+
+
+def throughput(report: Dict[str, Any]) -> Dict[str, float]:
+    """Return rows/s by stage (stages that wrote rows for long enough) and for the whole load."""
+    rates = {}
+    for name, stage in report['stages'].items():
+        if name not in RUN_PHASES and stage['rows'] and stage['wall_seconds'] >= BENCH_MIN_STAGE_SECONDS:
+            rates[name] = stage['rows_per_second']
+    rows = sum(stage['rows'] for stage in report['stages'].values())
+    rates[TOTAL] = round(rows / report['duration_seconds'], 1)
+    return rates
+
+
+def best_of(runs: List[Dict[str, float]]) -> Dict[str, float]:
+    """Return the best throughput of each stage over several runs."""
+    best: Dict[str, float] = {}
+    for rates in runs:
+        for name, rate in rates.items():
+            best[name] = max(best.get(name, 0.0), rate)
+    return best
+
+
+def compare(processor: str, rates: Dict[str, float], baseline: Optional[Dict[str, float]]) -> List[str]:
+    """
+    Print the throughput next to the baseline.
+
+    Returns:
+        The stages that regressed
+    """
+    print(f"\n=== {processor} processor ===", flush=True)
+    print(f"{'stage':<24} {'rows/s':>12} {'baseline':>12} {'change':>8}", flush=True)
+    regressed = []
+    for name in sorted(set(rates) | set(baseline or {}), key=lambda n: (n == TOTAL, n)):
+        rate, expected = rates.get(name), (baseline or {}).get(name)
+        if rate is None or expected is None:
+            change = 'new' if expected is None else 'skipped'
+        else:
+            change = f'{(rate / expected - 1) * 100:+.0f}%'
+            if rate < expected * (1 - BENCH_TOLERANCE):
+                regressed.append(name)
+                change += '  REGRESSED'
+        print(f"{name:<24} {rate if rate is not None else '-':>12} "
+              f"{expected if expected is not None else '-':>12} {change:>8}", flush=True)
+    return regressed
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', type=float, default=0.05, help='Source size relative to the upstream releases')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--processor', choices=[*PROCESSORS, 'all'], default='all')
+    parser.add_argument('--runs', type=int, default=1, help='Loads per processor; the best throughput counts')
+    parser.add_argument('--update-baseline', action='store_true', help='Store the results as the new baseline')
+    parser.add_argument('--initdb', action='store_true', help='Run against a temporary cluster')
+    parser.add_argument('--keep', action='store_true', help='Keep the benchmark database after the run')
+    args = parser.parse_args()
+
+    processors = list(PROCESSORS) if args.processor == 'all' else [args.processor]
+    scale_key = f'{args.scale:g}/{args.seed}'
+    baselines = json.loads(BENCH_BASELINE.read_text(encoding='utf-8')) if BENCH_BASELINE.exists() else {}
+
+    source_dir = prepare_sources(args.scale, args.seed)
+    cluster = TemporaryCluster(server_params()['user']) if args.initdb else None
+    params = server_params()
+    database = f'jlpt_bench_{os.getpid()}'
+
+    results: Dict[str, Dict[str, float]] = {}
+    regressions: Dict[str, List[str]] = {}
+    try:
+        if cluster:
+            params = cluster.start()
+        for processor in processors:
+            runs = []
+            for run in range(args.runs):
+                print(f"Loading with the {processor} processor (run {run + 1}/{args.runs})...", flush=True)
+                started = time.perf_counter()
+                runs.append(throughput(run_load(processor, params, database, source_dir)))
+                print(f"  done in {time.perf_counter() - started:.1f}s", flush=True)
+            results[processor] = best_of(runs)
+            baseline = baselines.get(processor, {}).get(scale_key)
+            if baseline is None and not args.update_baseline:
+                print(f"No baseline for the {processor} processor at scale {scale_key}; "
+                      f"record one with --update-baseline", flush=True)
+            regressions[processor] = compare(processor, results[processor], baseline)
+    finally:
+        if cluster:
+            cluster.stop()
+        elif not args.keep:
+            drop_database(params, database)
+
+    if args.update_baseline:
+        for processor, rates in results.items():
+            baselines.setdefault(processor, {})[scale_key] = rates
+        BENCH_BASELINE.write_text(json.dumps(baselines, indent=2, sort_keys=True) + '\n', encoding='utf-8')
+        print(f"\nBaseline written to {BENCH_BASELINE}", flush=True)
+        return 0
+
+    failed = {p: stages for p, stages in regressions.items() if stages}
+    if failed:
+        for processor, stages in failed.items():
+            print(f"\n❌ {processor}: throughput dropped more than {BENCH_TOLERANCE:.0%} in "
+                  f"{', '.join(stages)}", flush=True)
+        return 1
+    print(f"\n✅ No stage more than {BENCH_TOLERANCE:.0%} below the baseline", flush=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks of the per-entry transforms, without a database.
+
+Runs the transforms that run for every source entry (JLPT level lookup,
+furigana, sense relation resolution, radical normalization, the kanji scan
+of the uses_kanji links) over synthetic entries (synthetic_sources.py), for
+the async transformer (writing to a RowBuffer) and the parallel processor
+(writing to a cursor that only records statements). Like pytest-benchmark,
+every benchmark runs for several rounds with the garbage collector off and
+reports the best and median time per entry.
+
+    python benchmark_transforms.py --entries 20000
+    python benchmark_transforms.py --filter furigana --save before.json
+    python benchmark_transforms.py --filter furigana --compare before.json
+
+test_benchmark_transforms.py checks the output of the same transforms and
+runs these benchmarks under pytest when asked to (see there).
+"""
+
+import argparse
+import gc
+import json
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import key_allocator
+import synthetic_sources
+from bulk_sink import RowBuffer
+from cache_manager import DiskBackedCache
+from entry_transform import EntryTransformer, scan_kanji
+from process_data_async import AsyncJLPTDataProcessor
+from process_data_parallel import SENSE_ATTRIBUTE_COLUMNS, ParallelJLPTDataProcessor
+from source_scan import SourceSummary, scan_entry
+
+
+class RecordingCursor:
+    """psycopg2 cursor stand-in that counts statements and parameter rows."""
+
+    def __init__(self):
+        self.statements = 0
+        self.rows = 0
+
+    def execute(self, query, vars=None):
+        self.statements += 1
+        self.rows += 1
+
+    def executemany(self, query, vars_list):
+        self.statements += 1
+        self.rows += len(vars_list)
+
+
+class Benchmark:
+    """A transform applied to every item of a sample."""
+
+    def __init__(self, name: str, items: List[Any], run: Callable[[Any], Any],
+                 setup: Optional[Callable[[], None]] = None):
+        """
+        Args:
+            name: Benchmark name, 'transform[processor]'
+            items: Items of one round
+            run: Called with each item
+            setup: Called before each round (resets sinks), not timed
+        """
+        self.name = name
+        self.items = items
+        self.run = run
+        self.setup = setup
+
+    def measure(self, rounds: int) -> Dict[str, float]:
+        """Return the best and median microseconds per item over the rounds."""
+        run, items = self.run, self.items
+        timings = []
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            for _ in range(rounds):
+                if self.setup:
+                    self.setup()
+                started = time.perf_counter()
+                for item in items:
+                    run(item)
+                timings.append((time.perf_counter() - started) / len(items) * 1e6)
+        finally:
+            if gc_enabled:
+                gc.enable()
+        return {'min_us': round(min(timings), 3), 'median_us': round(statistics.median(timings), 3),
+                'items': len(items)}
+
+
+class TransformBenchmarks:
+    """Builds the sample entries, the transformers and the benchmarks over them."""
+
+    def __init__(self, entries: int, seed: int, cache_dir: Path):
+        generator = synthetic_sources.SourceGenerator(scale=entries / synthetic_sources.FULL_SIZES['vocabulary'],
+                                                      seed=seed)
+        self.words = generator.word_entries(entries)
+        self.names = generator.name_entries(entries)
+        kanji_cache = {literal: key_allocator.kanji_id(literal) for literal in generator.kanji}
+        # JLPT levels for every third word, keyed like load_jlpt_mappings does
+        vocabulary_jlpt = {}
+        for word in self.words[::3]:
+            reading = word['kana'][0]['text']
+            vocabulary_jlpt[(word['kanji'][0]['text'] if word['kanji'] else reading, reading)] = 3
+        # Radical components as in kradfile, with the look-alike characters
+        self.components = [char for word in self.words for kanji in word['kanji'] for char in kanji['text']]
+        self.components += synthetic_sources.RADICAL_LOOKALIKES * (len(self.components) // 50 + 1)
+
+        furigana = {entity: generator.furigana(entries_, 0.9)
+                    for entity, entries_ in (('vocabulary', self.words), ('proper_noun', self.names))}
+        furigana_paths = {}
+        for entity, rows in furigana.items():
+            path = str(cache_dir / f'{entity}_furigana.db')
+            cache = DiskBackedCache(path, 'furigana')
+            for row in rows:
+                cache.set((row['text'], row['reading']), row['furigana'])
+            cache.close()
+            furigana_paths[entity] = path
+
+        self.transformer = EntryTransformer({}, vocabulary_jlpt, furigana_paths)
+        self.transformer.kanji_cache = kanji_cache
+        # Relation targets resolve against the term index of the sample, like scan_sources provides it
+        for kind, entries_ in (('vocabulary', self.words), ('proper_noun', self.names)):
+            summary = SourceSummary()
+            for entry in entries_:
+                scan_entry(summary, entry, kind)
+            self.transformer.terms[kind] = summary.terms
+            if kind == 'vocabulary':
+                self.transformer.vocabulary_sense_counts = summary.sense_counts
+
+        # Both processors only connect in their stages
+        self.async_processor = AsyncJLPTDataProcessor()
+        self.parallel = ParallelJLPTDataProcessor()
+        self.parallel.vocabulary_jlpt_mapping = vocabulary_jlpt
+        self.parallel.kanji_cache = kanji_cache
+        self.parallel.tag_cache = {tag: True for tags in synthetic_sources.TAGS.values() for tag in tags}
+        self.parallel_furigana = {entity: {(row['text'], row['reading']): json.dumps(row['furigana']) for row in rows}
+                                  for entity, rows in furigana.items()}
+
+        self.out = RowBuffer()
+        self.relations: List[tuple] = []
+        self.cursor = RecordingCursor()
+        self.attributes: Dict[str, List[tuple]] = {}
+
+    def _reset(self) -> None:
+        self.out = RowBuffer()
+        self.relations = []
+        self.cursor = RecordingCursor()
+        self.attributes = {table: [] for table in SENSE_ATTRIBUTE_COLUMNS}
+
+    def benchmarks(self) -> List[Benchmark]:
+        transformer, parallel = self.transformer, self.parallel
+        vocab_id = key_allocator.vocabulary_id('0')
+        senses = [(word['id'], sense_idx, sense) for word in self.words
+                  for sense_idx, sense in enumerate(word['sense'])]
+        kanji_texts = [kanji['text'] for entry in self.words + self.names for kanji in entry['kanji']]
+        # Open the furigana caches outside the timed rounds
+        transformer._furigana_cache('vocabulary')
+        transformer._furigana_cache('proper_noun')
+
+        return [
+            Benchmark('jlpt_level[async]', self.words, transformer._get_vocab_jlpt_level),
+            Benchmark('jlpt_level[parallel]', self.words, parallel._get_vocab_jlpt_level),
+            Benchmark('furigana[async]', self.words,
+                      lambda w: transformer._process_furigana(self.out, w['id'], vocab_id, 'vocabulary', w),
+                      self._reset),
+            Benchmark('furigana[parallel]', self.words,
+                      lambda w: parallel._process_furigana(self.cursor, vocab_id, 'vocabulary', w,
+                                                           self.parallel_furigana['vocabulary']),
+                      self._reset),
+            Benchmark('senses[async]', self.words,
+                      lambda w: transformer._process_vocab_senses(self.out, w['id'], vocab_id, w),
+                      self._reset),
+            Benchmark('sense_attributes[parallel]', senses,
+                      lambda s: parallel._process_sense_attributes(
+                          self.cursor, self.attributes, key_allocator.vocabulary_sense_id(s[0], s[1]), s[2],
+                          self.relations),
+                      self._reset),
+            Benchmark('normalize_radical[async]', self.components, self.async_processor._normalize_radical_char),
+            Benchmark('normalize_radical[parallel]', self.components, parallel._normalize_radical_char),
+            Benchmark('kanji_scan', kanji_texts, lambda text: scan_kanji(text, transformer.kanji_cache, {})),
+            Benchmark('vocabulary_entry[async]', self.words,
+                      lambda w: transformer.vocabulary_entry(self.out, w), self._reset),
+            Benchmark('proper_noun_entry[async]', self.names,
+                      lambda n: transformer.proper_noun_entry(self.out, n), self._reset),
+        ]
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]]) -> None:
+    print(f"\n{'benchmark':<30} {'min µs':>10} {'baseline':>10} {'change':>8}")
+    for name, result in results.items():
+        before = baseline.get(name)
+        change = f"{(result['min_us'] / before['min_us'] - 1) * 100:+.0f}%" if before else 'new'
+        print(f"{name:<30} {result['min_us']:>10.3f} "
+              f"{before['min_us'] if before else '-':>10} {change:>8}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--entries', type=int, default=20000, help='Sampled words and names')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--filter', default='', help='Only run benchmarks whose name contains this')
+    parser.add_argument('--save', type=Path, help='Write the results as JSON')
+    parser.add_argument('--compare', type=Path, help='Compare with results saved by --save')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='jlpt-transforms-') as cache_dir:
+        print(f"Generating {args.entries:,} words and names...", flush=True)
+        suite = TransformBenchmarks(args.entries, args.seed, Path(cache_dir))
+        results = {}
+        print(f"{'benchmark':<30} {'items':>9} {'min µs':>10} {'median µs':>10} {'items/s':>12}", flush=True)
+        for benchmark in suite.benchmarks():
+            if args.filter not in benchmark.name:
+                continue
+            result = benchmark.measure(args.rounds)
+            results[benchmark.name] = result
+            print(f"{benchmark.name:<30} {result['items']:>9,} {result['min_us']:>10.3f} "
+                  f"{result['median_us']:>10.3f} {1e6 / result['min_us']:>12,.0f}", flush=True)
+        suite.transformer.close()
+
+    if args.compare:
+        compare(results, json.loads(args.compare.read_text(encoding='utf-8')))
+    if args.save:
+        args.save.write_text(json.dumps(results, indent=2) + '\n', encoding='utf-8')
+        print(f"\nResults written to {args.save}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,316 @@
+"""
+Bulk row sinks for the async data processor.
+Buffers rows per target table and writes them in a few large statements.
+"""
+
+import hashlib
+import os
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import load_metrics
+
+# Rows buffered (across all tables) before a sink flushes on its own
+BULK_FLUSH_ROWS = int(os.getenv('BULK_FLUSH_ROWS', '20000'))
+
+# Sink implementation: 'copy' (binary COPY, empty tables) or 'insert' (ON CONFLICT DO NOTHING)
+BULK_SINK = os.getenv('BULK_SINK', 'copy')
+
+# Target tables and the columns a sink writes, in foreign key dependency order.
+# Flushes always follow this order so parent rows land before their children.
+TABLE_COLUMNS: Dict[str, Tuple[str, ...]] = {
+    'kanji': ('id', 'literal', 'grade', 'stroke_count', 'frequency', 'jlpt_level_old', 'jlpt_level_new',
+              'content_hash'),
+    'kanji_codepoint': ('id', 'kanji_id', 'type', 'value'),
+    'kanji_dictionary_reference': ('id', 'kanji_id', 'type', 'value', 'morohashi_volume', 'morohashi_page'),
+    'kanji_query_code': ('id', 'kanji_id', 'type', 'value', 'skip_missclassification'),
+    'kanji_reading': ('id', 'kanji_id', 'type', 'value', 'status', 'on_type'),
+    'kanji_meaning': ('id', 'kanji_id', 'lang', 'value'),
+    'kanji_nanori': ('id', 'kanji_id', 'value'),
+    'kanji_radical': ('id', 'kanji_id', 'radical_id'),
+    'vocabulary': ('id', 'jmdict_id', 'jlpt_level_new', 'slug', 'content_hash'),
+    'vocabulary_kanji': ('id', 'vocabulary_id', 'text', 'is_common', 'is_primary'),
+    'vocabulary_kana': ('id', 'vocabulary_id', 'text', 'applies_to_kanji', 'is_common', 'is_primary'),
+    'vocabulary_sense': ('id', 'vocabulary_id', 'applies_to_kanji', 'applies_to_kana', 'info'),
+    'vocabulary_sense_tag': ('id', 'sense_id', 'tag_code', 'tag_type'),
+    'vocabulary_sense_gloss': ('id', 'sense_id', 'lang', 'text', 'gender', 'type'),
+    'vocabulary_sense_language_source': ('id', 'sense_id', 'lang', 'text', 'full', 'wasei'),
+    'vocabulary_sense_relation': ('id', 'source_sense_id', 'target_vocab_id', 'target_sense_id',
+                                  'target_term', 'target_reading', 'relation_type'),
+    'vocabulary_sense_example': ('id', 'sense_id', 'source_type', 'source_value', 'text'),
+    'vocabulary_sense_example_sentence': ('id', 'example_id', 'lang', 'text'),
+    'vocabulary_furigana': ('id', 'vocabulary_id', 'text', 'reading', 'furigana'),
+    'vocabulary_uses_kanji': ('id', 'vocabulary_id', 'kanji_id'),
+    'proper_noun': ('id', 'jmnedict_id', 'slug', 'content_hash'),
+    'proper_noun_kanji': ('id', 'proper_noun_id', 'text', 'is_primary'),
+    'proper_noun_kana': ('id', 'proper_noun_id', 'text', 'applies_to_kanji', 'is_primary'),
+    'proper_noun_translation': ('id', 'proper_noun_id'),
+    'proper_noun_translation_type': ('id', 'translation_id', 'tag_code'),
+    'proper_noun_translation_text': ('id', 'translation_id', 'lang', 'text'),
+    'proper_noun_translation_related': ('id', 'translation_id', 'related_term', 'related_reading',
+                                        'reference_proper_noun_id', 'reference_proper_noun_translation_id'),
+    'proper_noun_furigana': ('id', 'proper_noun_id', 'text', 'reading', 'furigana'),
+    'proper_noun_uses_kanji': ('id', 'proper_noun_id', 'kanji_id'),
+}
+
+# Rows pointing to other entries of the same kind: entry kind -> (table, target
+# columns). The target may be written by a later or concurrent batch, so loads
+# that check foreign keys write these columns once the stage has written every
+# entry (see EntryTransformer.defer_references and update_references).
+REFERENCE_COLUMNS: Dict[str, Tuple[str, Tuple[str, ...]]] = {
+    'vocabulary': ('vocabulary_sense_relation', ('target_vocab_id', 'target_sense_id')),
+    'proper_noun': ('proper_noun_translation_related', ('reference_proper_noun_id',)),
+}
+
+# Rows those references point to. Replacing an entry keeps them, so references
+# held by other (unchanged) entries stay valid: they are updated in place, and
+# senses the entry no longer has are deleted after the write (PRUNE_STATEMENTS).
+UPSERT_TABLES = ('vocabulary', 'vocabulary_sense', 'proper_noun')
+
+# Statements that remove the stored rows of replaced entries (delta loads).
+# They run at the start of a flush, before the new rows are written.
+# Grandchildren are deleted explicitly, so they do not depend on the session
+# firing ON DELETE CASCADE.
+REPLACE_STATEMENTS: Dict[str, str] = {
+    'kanji': 'DELETE FROM {schema}.kanji WHERE id = ANY($1::uuid[])',
+    'vocabulary': '''
+        WITH kanji AS (
+            DELETE FROM {schema}.vocabulary_kanji WHERE vocabulary_id = ANY($1::uuid[]) RETURNING id
+        ), kanji_tags AS (
+            DELETE FROM {schema}.vocabulary_kanji_tag WHERE vocabulary_kanji_id IN (SELECT id FROM kanji)
+        ), kana AS (
+            DELETE FROM {schema}.vocabulary_kana WHERE vocabulary_id = ANY($1::uuid[]) RETURNING id
+        ), kana_tags AS (
+            DELETE FROM {schema}.vocabulary_kana_tag WHERE vocabulary_kana_id IN (SELECT id FROM kana)
+        ), senses AS (
+            SELECT id FROM {schema}.vocabulary_sense WHERE vocabulary_id = ANY($1::uuid[])
+        ), sense_tags AS (
+            DELETE FROM {schema}.vocabulary_sense_tag WHERE sense_id IN (SELECT id FROM senses)
+        ), glosses AS (
+            DELETE FROM {schema}.vocabulary_sense_gloss WHERE sense_id IN (SELECT id FROM senses)
+        ), language_sources AS (
+            DELETE FROM {schema}.vocabulary_sense_language_source WHERE sense_id IN (SELECT id FROM senses)
+        ), relations AS (
+            DELETE FROM {schema}.vocabulary_sense_relation WHERE source_sense_id IN (SELECT id FROM senses)
+        ), examples AS (
+            DELETE FROM {schema}.vocabulary_sense_example WHERE sense_id IN (SELECT id FROM senses) RETURNING id
+        ), sentences AS (
+            DELETE FROM {schema}.vocabulary_sense_example_sentence WHERE example_id IN (SELECT id FROM examples)
+        ), furigana AS (
+            DELETE FROM {schema}.vocabulary_furigana WHERE vocabulary_id = ANY($1::uuid[])
+        )
+        DELETE FROM {schema}.vocabulary_uses_kanji WHERE vocabulary_id = ANY($1::uuid[])
+    ''',
+    'proper_noun': '''
+        WITH kanji AS (
+            DELETE FROM {schema}.proper_noun_kanji WHERE proper_noun_id = ANY($1::uuid[]) RETURNING id
+        ), kanji_tags AS (
+            DELETE FROM {schema}.proper_noun_kanji_tag WHERE proper_noun_kanji_id IN (SELECT id FROM kanji)
+        ), kana AS (
+            DELETE FROM {schema}.proper_noun_kana WHERE proper_noun_id = ANY($1::uuid[]) RETURNING id
+        ), kana_tags AS (
+            DELETE FROM {schema}.proper_noun_kana_tag WHERE proper_noun_kana_id IN (SELECT id FROM kana)
+        ), translations AS (
+            DELETE FROM {schema}.proper_noun_translation WHERE proper_noun_id = ANY($1::uuid[]) RETURNING id
+        ), types AS (
+            DELETE FROM {schema}.proper_noun_translation_type WHERE translation_id IN (SELECT id FROM translations)
+        ), related AS (
+            DELETE FROM {schema}.proper_noun_translation_related
+            WHERE translation_id IN (SELECT id FROM translations)
+        ), texts AS (
+            DELETE FROM {schema}.proper_noun_translation_text WHERE translation_id IN (SELECT id FROM translations)
+        ), furigana AS (
+            DELETE FROM {schema}.proper_noun_furigana WHERE proper_noun_id = ANY($1::uuid[])
+        )
+        DELETE FROM {schema}.proper_noun_uses_kanji WHERE proper_noun_id = ANY($1::uuid[])
+    ''',
+    'vocabulary_examples': '''
+        DELETE FROM {schema}.vocabulary_sense_example e USING {schema}.vocabulary_sense s
+        WHERE e.sense_id = s.id AND s.vocabulary_id = ANY($1::uuid[])
+    ''',
+}
+
+# Statements that run after the rows of replaced entries are written:
+# replacement kind -> (table, statement deleting the entries' stored rows that
+# were not written again; $1: entry ids, $2: ids of the written table rows)
+PRUNE_STATEMENTS: Dict[str, Tuple[str, str]] = {
+    'vocabulary': ('vocabulary_sense', '''
+        DELETE FROM {schema}.vocabulary_sense WHERE vocabulary_id = ANY($1::uuid[]) AND id <> ALL($2::uuid[])
+    '''),
+}
+
+
+async def update_references(conn, schema: str, kind: str, references: List[Tuple[Any, ...]]) -> None:
+    """
+    Write deferred reference columns (see REFERENCE_COLUMNS).
+
+    Args:
+        conn: asyncpg connection
+        schema: Target schema name
+        kind: Entry kind of the referencing rows
+        references: (row id, *target ids) tuples
+    """
+    if not references:
+        return
+    table, columns = REFERENCE_COLUMNS[kind]
+    assignments = ', '.join(f'{column} = u.{column}' for column in columns)
+    arrays = ', '.join('$%d::uuid[]' % (idx + 1) for idx in range(len(columns) + 1))
+    await conn.execute(f'''
+        UPDATE {schema}.{table} t SET {assignments}
+        FROM unnest({arrays}) AS u(id, {', '.join(columns)})
+        WHERE t.id = u.id
+    ''', *(list(column) for column in zip(*references)))
+    load_metrics.record_write(table, len(references), 1, load_metrics.payload_bytes(references))
+
+
+class RowBuffer:
+    """
+    Per-table row lists for the TABLE_COLUMNS tables.
+
+    Holds only plain tuples, so buffers can be filled in parser worker
+    processes and shipped back to the writers.
+    """
+
+    def __init__(self):
+        self.rows: Dict[str, List[Sequence[Any]]] = {}
+        # REPLACE_STATEMENTS key -> ids whose stored rows are removed before writing
+        self.replaced: Dict[str, List[Any]] = {}
+        self._pending = 0
+
+    def add(self, table: str, row: Sequence[Any]) -> None:
+        """Buffer a single row for a table."""
+        self.rows.setdefault(table, []).append(row)
+        self._pending += 1
+
+    def extend(self, table: str, rows: List[Sequence[Any]]) -> None:
+        """Buffer multiple rows for a table."""
+        if rows:
+            self.rows.setdefault(table, []).extend(rows)
+            self._pending += len(rows)
+
+    def replace(self, kind: str, entity_id: Any) -> None:
+        """Remove the stored rows of an entry (see REPLACE_STATEMENTS) before writing."""
+        self.replaced.setdefault(kind, []).append(entity_id)
+
+    def merge(self, other: 'RowBuffer') -> None:
+        """Buffer all rows (and replacements) of another buffer."""
+        for table, rows in other.rows.items():
+            self.extend(table, rows)
+        for kind, ids in other.replaced.items():
+            self.replaced.setdefault(kind, []).extend(ids)
+
+    def digest(self) -> bytes:
+        """Return an MD5 digest of the buffered rows (the content hash of an entry)."""
+        content = [(table, self.rows[table]) for table in TABLE_COLUMNS if table in self.rows]
+        return hashlib.md5(repr(content).encode('utf-8')).digest()
+
+    def __len__(self) -> int:
+        """Return the number of buffered rows."""
+        return self._pending
+
+
+class BulkSink(RowBuffer):
+    """
+    Per-table row buffer that is flushed in dependency order.
+
+    A sink is bound to one connection and is meant to live for one batch
+    (one transaction). Subclasses decide how buffered rows reach the database.
+    """
+
+    def __init__(self, conn, schema: str = 'jlpt', flush_threshold: int = BULK_FLUSH_ROWS):
+        """
+        Initialize the sink.
+
+        Args:
+            conn: asyncpg connection the rows are written through
+            schema: Target schema name
+            flush_threshold: Buffered row count that triggers maybe_flush()
+        """
+        super().__init__()
+        self.conn = conn
+        self.schema = schema
+        self.flush_threshold = flush_threshold
+        self.rows_written: Dict[str, int] = {}
+
+    async def maybe_flush(self) -> None:
+        """Flush if the buffered row count reached the threshold."""
+        if self._pending >= self.flush_threshold:
+            await self.flush()
+
+    async def flush(self) -> None:
+        """
+        Write all buffered rows, parents before children.
+
+        A flush replacing entries updates their UPSERT_TABLES rows in place
+        and prunes the ones that were not written again.
+        """
+        replaced, self.replaced = self.replaced, {}
+        for kind, ids in replaced.items():
+            await self.conn.execute(REPLACE_STATEMENTS[kind].format(schema=self.schema), ids)
+        prunes = [(kind, table, [row[0] for row in self.rows.get(table, ())])
+                  for kind, (table, _) in PRUNE_STATEMENTS.items() if kind in replaced]
+        if self._pending:
+            for table, columns in TABLE_COLUMNS.items():
+                rows = self.rows.pop(table, None)
+                if not rows:
+                    continue
+                if replaced and table in UPSERT_TABLES:
+                    statements = await self._upsert(table, columns, rows)
+                else:
+                    statements = await self._write(table, columns, rows)
+                self.rows_written[table] = self.rows_written.get(table, 0) + len(rows)
+                load_metrics.record_write(table, len(rows), statements, load_metrics.payload_bytes(rows))
+            self._pending = 0
+        for kind, table, kept_ids in prunes:
+            await self.conn.execute(PRUNE_STATEMENTS[kind][1].format(schema=self.schema), replaced[kind], kept_ids)
+
+    async def _upsert(self, table: str, columns: Tuple[str, ...], rows: List[Sequence[Any]]) -> int:
+        """Insert rows or update the stored rows with the same id; return the number of statements."""
+        column_list = ', '.join(f'"{c}"' for c in columns)
+        placeholders = ', '.join(f'${i}' for i in range(1, len(columns) + 1))
+        updates = ', '.join(f'"{c}" = EXCLUDED."{c}"' for c in columns[1:])
+        await self.conn.executemany(f'''
+            INSERT INTO {self.schema}.{table} ({column_list})
+            VALUES ({placeholders}) ON CONFLICT (id) DO UPDATE SET {updates}
+        ''', rows)
+        return len(rows)
+
+    async def _write(self, table: str, columns: Tuple[str, ...], rows: List[Sequence[Any]]) -> int:
+        """Write rows to a table and return the number of statements issued."""
+        raise NotImplementedError
+
+
+class CopySink(BulkSink):
+    """Writes rows with binary COPY (copy_records_to_table). Requires conflict-free rows."""
+
+    async def _write(self, table: str, columns: Tuple[str, ...], rows: List[Sequence[Any]]) -> int:
+        await self.conn.copy_records_to_table(
+            table, records=rows, columns=list(columns), schema_name=self.schema
+        )
+        return 1
+
+
+class InsertSink(BulkSink):
+    """Writes rows with executemany INSERT ... ON CONFLICT DO NOTHING. Safe on non-empty tables."""
+
+    async def _write(self, table: str, columns: Tuple[str, ...], rows: List[Sequence[Any]]) -> int:
+        column_list = ', '.join(f'"{c}"' for c in columns)
+        placeholders = ', '.join(f'${i}' for i in range(1, len(columns) + 1))
+        await self.conn.executemany(f'''
+            INSERT INTO {self.schema}.{table} ({column_list})
+            VALUES ({placeholders}) ON CONFLICT DO NOTHING
+        ''', rows)
+        return len(rows)
+
+
+SINK_TYPES = {
+    'copy': CopySink,
+    'insert': InsertSink,
+}
+
+
+def create_sink(conn, schema: str = 'jlpt', kind: Optional[str] = None) -> BulkSink:
+    """Create the configured sink implementation for a connection."""
+    kind = kind or BULK_SINK
+    if kind not in SINK_TYPES:
+        raise ValueError(f"Unknown bulk sink '{kind}' (expected one of: {', '.join(SINK_TYPES)})")
+    return SINK_TYPES[kind](conn, schema)
@@ -104,6 +104,10 @@ class DiskBackedCache:
         """Return approximate size of cache."""
         return self._size
     
+    def flush(self) -> None:
+        """Make buffered writes visible to other connections (e.g. worker processes)."""
+        self._flush()
+
     def _flush(self) -> None:
         """Flush write buffer to disk."""
         if not self._write_buffer:
@@ -0,0 +1,126 @@
+"""
+Incremental (delta) loads for the async data processor.
+
+Every kanji, vocabulary and proper noun row stores a content hash of all rows
+its source entry produces (vocabulary rows also hash their examples). A delta
+load re-parses the sources, compares the hashes and only replaces entries
+that changed: the stored entry is deleted (its child rows cascade) and the
+new rows are written. Entries missing from the source are deleted.
+Relations are rows of the entry holding them, resolved against the term index
+of the source, so an entry whose relation targets change is replaced like
+any other changed entry. Kanji-radical links are cheap and cross-cutting, so
+they are rebuilt in full.
+
+A delta load needs a database that finished a full load with content hashes.
+Anything else (an empty database, rows loaded by the parallel processor,
+indexes still dropped by a crashed load) uses the full load.
+"""
+
+import os
+import time
+from typing import Dict
+
+import psycopg2
+
+import index_manager
+
+# 'auto' (delta load when the database allows it) or 'full'
+LOAD_MODE = os.getenv('LOAD_MODE', 'auto')
+
+# Columns holding content hashes, by table
+HASH_COLUMNS = {
+    'kanji': ('content_hash',),
+    'vocabulary': ('content_hash', 'examples_hash'),
+    'proper_noun': ('content_hash',),
+}
+
+# Stored hashes of one entry kind, keyed like EntryTransformer.add_entry
+STORED_HASH_QUERIES: Dict[str, str] = {
+    'kanji': 'SELECT literal AS key, content_hash FROM {schema}.kanji',
+    'vocabulary': 'SELECT jmdict_id AS key, content_hash FROM {schema}.vocabulary',
+    'example': '''
+        SELECT jmdict_id AS key, examples_hash AS content_hash FROM {schema}.vocabulary
+        WHERE examples_hash IS NOT NULL
+    ''',
+    'proper_noun': 'SELECT jmnedict_id AS key, content_hash FROM {schema}.proper_noun',
+}
+
+# Statements deleting entries that are no longer in the source ($1: entry keys)
+DELETE_STATEMENTS: Dict[str, str] = {
+    'kanji': 'DELETE FROM {schema}.kanji WHERE literal = ANY($1::text[])',
+    'vocabulary': 'DELETE FROM {schema}.vocabulary WHERE jmdict_id = ANY($1::text[])',
+    'example': '''
+        WITH dropped AS (
+            DELETE FROM {schema}.vocabulary_sense_example e USING {schema}.vocabulary_sense s,
+                        {schema}.vocabulary v
+            WHERE e.sense_id = s.id AND s.vocabulary_id = v.id AND v.jmdict_id = ANY($1::text[])
+        )
+        UPDATE {schema}.vocabulary SET examples_hash = NULL WHERE jmdict_id = ANY($1::text[])
+    ''',
+    'proper_noun': 'DELETE FROM {schema}.proper_noun WHERE jmnedict_id = ANY($1::text[])',
+}
+
+
+def ensure_hash_columns(cursor, schema: str = 'jlpt') -> None:
+    """Add the content hash columns to databases created before they existed."""
+    for table, columns in HASH_COLUMNS.items():
+        for column in columns:
+            cursor.execute(f'ALTER TABLE {schema}.{table} ADD COLUMN IF NOT EXISTS {column} BYTEA')
+
+
+def _delta_blocker(cursor, schema: str) -> str:
+    """Return why the database cannot take a delta load ('' if it can)."""
+    if index_manager.pending_indexes(schema):
+        return "indexes from an earlier load still need rebuilding"
+    cursor.execute(f'SELECT EXISTS (SELECT 1 FROM {schema}.status)')
+    if not cursor.fetchone()[0]:
+        return "no completed load recorded"
+    for table in HASH_COLUMNS:
+        cursor.execute(f'SELECT EXISTS (SELECT 1 FROM {schema}.{table})')
+        if not cursor.fetchone()[0]:
+            return f"{table} is empty"
+        cursor.execute(f'SELECT EXISTS (SELECT 1 FROM {schema}.{table} WHERE content_hash IS NULL)')
+        if cursor.fetchone()[0]:
+            return f"{table} has rows without content hashes"
+    return ''
+
+
+def resolve_load_mode(db_params: dict, schema: str = 'jlpt',
+                      max_retries: int = 30, retry_delay: int = 2) -> str:
+    """
+    Decide between a full and a delta load (see LOAD_MODE).
+
+    Also adds missing hash columns, which both load modes write.
+
+    Returns:
+        'full' or 'delta'
+    """
+    conn = None
+    for attempt in range(max_retries):
+        try:
+            conn = psycopg2.connect(**db_params)
+            break
+        except psycopg2.OperationalError as e:
+            print(f"Attempt {attempt + 1}/{max_retries}: Database not ready yet - {e}", flush=True)
+            time.sleep(retry_delay)
+    if not conn:
+        print("Failed to connect to database, using a full load", flush=True)
+        return 'full'
+
+    try:
+        with conn.cursor() as cursor:
+            ensure_hash_columns(cursor, schema)
+            conn.commit()
+            if LOAD_MODE == 'full':
+                return 'full'
+            blocker = _delta_blocker(cursor, schema)
+    except psycopg2.Error as e:
+        conn.rollback()
+        blocker = str(e).strip()
+    finally:
+        conn.close()
+
+    if blocker:
+        print(f"Delta load not possible ({blocker}), using a full load", flush=True)
+        return 'full'
+    return 'delta'
@@ -0,0 +1,536 @@
+"""
+Entry transforms for the async data processor.
+
+Turns parsed dictionary entries into ready-to-write row tuples. The transformer
+holds only plain lookup data, so it can run in the event loop process as well
+as in parser worker processes (see parse_pool.py).
+"""
+
+import copy
+import os
+import uuid
+from typing import Any, Dict, NamedTuple, Optional, Set, Tuple
+
+try:
+    import orjson
+    def json_dumps(obj): return orjson.dumps(obj).decode()
+except ImportError:
+    import json
+    def json_dumps(obj): return json.dumps(obj)
+
+import key_allocator
+from bulk_sink import REFERENCE_COLUMNS, TABLE_COLUMNS, RowBuffer
+from cache_manager import DiskBackedCache
+from source_scan import entry_slug, resolve_term
+
+# Language code normalization
+LANGUAGE_MAP = {
+    'en': 'eng', 'de': 'ger', 'ru': 'rus', 'hu': 'hun',
+    'nl': 'dut', 'es': 'spa', 'fr': 'fre', 'sv': 'swe',
+    'sl': 'slv', 'pt': 'por', 'it': 'ita', 'ja': 'jpn'
+}
+
+# Entry kinds whose root row carries the content hash
+ROOT_TABLES = ('kanji', 'vocabulary', 'proper_noun')
+
+# REPLACE_STATEMENTS key and id function used to drop the stored rows of a changed entry
+_REPLACEMENTS = {
+    'kanji': ('kanji', key_allocator.kanji_id),
+    'vocabulary': ('vocabulary', key_allocator.vocabulary_id),
+    'proper_noun': ('proper_noun', key_allocator.proper_noun_id),
+    'example': ('vocabulary_examples', key_allocator.vocabulary_id),
+}
+
+
+def scan_kanji(text: str, kanji_cache: Dict[str, uuid.UUID], found: Dict[uuid.UUID, None]) -> None:
+    """Add the ids of the loaded kanji in a text to found (an insertion-ordered set)."""
+    for char in text:
+        kanji_id = kanji_cache.get(char)
+        if kanji_id is not None:
+            found[kanji_id] = None
+
+
+class EntryChange(NamedTuple):
+    """Outcome of EntryTransformer.add_entry for one source entry."""
+    key: str
+    content_hash: Optional[bytes]
+    changed: bool
+    # (row id, *target ids) of the deferred references of the entry (see REFERENCE_COLUMNS)
+    references: Tuple[Tuple[Any, ...], ...] = ()
+
+
+class EntryTransformer:
+    """Converts kanjidic, JMdict and JMnedict entries into rows."""
+
+    def __init__(self, kanji_jlpt_mapping: Dict[str, dict],
+                 vocabulary_jlpt_mapping: Dict[Tuple[str, str], int],
+                 furigana_paths: Optional[Dict[str, str]] = None):
+        """
+        Initialize the transformer.
+
+        Args:
+            kanji_jlpt_mapping: literal -> {'jlpt_old', 'jlpt_new'}
+            vocabulary_jlpt_mapping: (text, reading) -> JLPT level
+            furigana_paths: entity type -> DiskBackedCache file with furigana
+        """
+        self.kanji_jlpt_mapping = kanji_jlpt_mapping
+        self.vocabulary_jlpt_mapping = vocabulary_jlpt_mapping
+        self.furigana_paths = furigana_paths or {}
+
+        # Filled by the processor as stages complete
+        self.kanji_cache: Dict[str, uuid.UUID] = {}
+        # jmdict_id -> sense count of the vocabulary source (see source_scan)
+        self.vocabulary_sense_counts: Dict[str, int] = {}
+        # Entity type -> primary kanji counts of its source, for slugs (see source_scan)
+        self.primary_kanji_counts: Dict[str, Dict[str, int]] = {}
+        # Entity type -> term index of its source, for relation targets (see source_scan)
+        self.terms: Dict[str, Dict[Tuple[str, Optional[str]], str]] = {}
+
+        # Delta loads: entry kind -> {entry key: stored content hash}. Entries
+        # of a kind listed here are only emitted when they changed.
+        self.stored_hashes: Dict[str, Dict[str, bytes]] = {}
+        # Kanji literals replaced or deleted in this load; entries using them are re-linked
+        self.changed_kanji: Set[str] = set()
+        # jmdict_ids of vocabulary entries replaced in this load (their examples were dropped)
+        self.replaced_vocabulary: Set[str] = set()
+        # Loads that check foreign keys buffer references to other entries
+        # without their targets and return the targets with the EntryChange
+        self.defer_references = False
+
+        # Opened lazily per process; SQLite handles must not cross a fork
+        self._furigana_caches: Dict[str, DiskBackedCache] = {}
+        self._furigana_pid: Optional[int] = None
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state['_furigana_caches'] = {}
+        state['_furigana_pid'] = None
+        return state
+
+    def _furigana_cache(self, entity_type: str) -> Optional[DiskBackedCache]:
+        """Return this process' furigana cache for an entity type."""
+        if self._furigana_pid != os.getpid():
+            self._furigana_caches = {}
+            self._furigana_pid = os.getpid()
+        if entity_type not in self._furigana_caches:
+            path = self.furigana_paths.get(entity_type)
+            self._furigana_caches[entity_type] = DiskBackedCache(path, 'furigana') if path else None
+        return self._furigana_caches[entity_type]
+
+    def for_kind(self, kind: str) -> 'EntryTransformer':
+        """
+        Return a copy holding only the source lookups the entries of a kind use.
+
+        Parse workers get the transformer of their stage, so the term index and
+        sense counts of the other sources are not copied into them.
+        """
+        view = copy.copy(self)
+        view.terms = {kind: self.terms[kind]} if kind in self.terms else {}
+        if kind not in ('vocabulary', 'example'):
+            view.vocabulary_sense_counts = {}
+        return view
+
+    def close(self) -> None:
+        """Close the furigana caches opened by this process."""
+        if self._furigana_pid == os.getpid():
+            for cache in self._furigana_caches.values():
+                if cache is not None:
+                    cache.close()
+        self._furigana_caches = {}
+
+    # ========== Content Hashes ==========
+
+    def add_entry(self, out: RowBuffer, kind: str, entry: dict) -> Optional[EntryChange]:
+        """
+        Transform one entry of a kind and buffer its rows with their content hash.
+
+        The content hash is an MD5 digest of every row the entry produces. For
+        kanji, vocabulary and proper nouns it is stored on the root row; for
+        examples it is returned for vocabulary.examples_hash (None when the
+        entry has no examples). Resolved relation targets are rows of the
+        entry, so an entry whose references now resolve differently changes.
+
+        When stored hashes are loaded for the kind (delta loads), unchanged
+        entries are not buffered, and changed ones replace their stored rows.
+        With defer_references set, reference rows are buffered without their
+        targets, which are returned for bulk_sink.update_references.
+
+        Args:
+            out: Buffer receiving the rows
+            kind: 'kanji', 'vocabulary', 'proper_noun' or 'example'
+            entry: Parsed source entry
+
+        Returns:
+            EntryChange, or None for entries that produce no rows
+        """
+        entry_out = RowBuffer()
+        if kind == 'kanji':
+            key = (self.kanji_entry(entry_out, entry) or (None,))[0]
+        elif kind == 'vocabulary':
+            key = self.vocabulary_entry(entry_out, entry)
+        elif kind == 'proper_noun':
+            key = self.proper_noun_entry(entry_out, entry)
+        elif kind == 'example':
+            key = entry.get('id') if self.example_entry(entry_out, entry) else None
+        else:
+            raise ValueError(f"Unknown entry kind '{kind}'")
+        if not key:
+            return None
+
+        content_hash = entry_out.digest() if len(entry_out) else None
+        if kind in ROOT_TABLES:
+            root_rows = entry_out.rows[kind]
+            root_rows[0] = (*root_rows[0], content_hash)
+
+        stored = self.stored_hashes.get(kind)
+        if stored is not None:
+            if stored.get(key) == content_hash and not self._needs_replacing(kind, key, entry):
+                return EntryChange(key, content_hash, False)
+            replace_kind, entity_id = _REPLACEMENTS[kind]
+            entry_out.replace(replace_kind, entity_id(key))
+
+        references = self._defer_references(entry_out, kind) if self.defer_references else ()
+        out.merge(entry_out)
+        return EntryChange(key, content_hash, True, references)
+
+    @staticmethod
+    def _defer_references(out: RowBuffer, kind: str) -> Tuple[Tuple[Any, ...], ...]:
+        """Clear the resolved targets of an entry's reference rows and return them."""
+        if kind not in REFERENCE_COLUMNS:
+            return ()
+        table, columns = REFERENCE_COLUMNS[kind]
+        rows = out.rows.get(table)
+        if not rows:
+            return ()
+        positions = [TABLE_COLUMNS[table].index(column) for column in columns]
+        references = []
+        for idx, row in enumerate(rows):
+            targets = tuple(row[pos] for pos in positions)
+            if any(target is not None for target in targets):
+                references.append((row[0], *targets))
+                row = list(row)
+                for pos in positions:
+                    row[pos] = None
+                rows[idx] = tuple(row)
+        return tuple(references)
+
+    def _needs_replacing(self, kind: str, key: str, entry: dict) -> bool:
+        """Check whether an entry with an unchanged hash lost rows to another replacement."""
+        if kind == 'example':
+            return key in self.replaced_vocabulary
+        if kind == 'kanji' or not self.changed_kanji:
+            return False
+        # Replacing or deleting a kanji cascades to the links of entries using it
+        return any(char in self.changed_kanji
+                   for kanji in entry.get('kanji', []) for char in kanji.get('text', ''))
+
+    # ========== Kanji ==========
+
+    def kanji_entry(self, out: RowBuffer, char_data: dict) -> Optional[Tuple[str, uuid.UUID]]:
+        """
+        Buffer a kanji and its sub-items.
+
+        Returns:
+            (literal, kanji_id), or None for entries without a literal
+        """
+        character = char_data.get('literal', '')
+        if not character:
+            return None
+
+        misc = char_data.get('misc', {})
+        jlpt_old = None
+        jlpt_new = None
+        if character in self.kanji_jlpt_mapping:
+            jlpt_old = self.kanji_jlpt_mapping[character]['jlpt_old']
+            jlpt_new = self.kanji_jlpt_mapping[character]['jlpt_new']
+
+        stroke_count = misc.get('strokeCounts', [0])[0] if misc.get('strokeCounts') else 0
+
+        kanji_id = key_allocator.kanji_id(character)
+        out.add('kanji', (kanji_id, character, misc.get('grade'), stroke_count,
+                          misc.get('frequency'), jlpt_old, jlpt_new))
+        self._process_kanji_subitems(out, char_data, character, kanji_id)
+        return character, kanji_id
+
+    def _process_kanji_subitems(self, out: RowBuffer, char_data: dict, character: str,
+                                kanji_id: uuid.UUID) -> None:
+        """Buffer kanji sub-items (codepoints, readings, meanings, etc.)."""
+        derive_id = key_allocator.derive_id
+
+        # Codepoints
+        out.extend('kanji_codepoint', [(derive_id(character, idx), kanji_id, cp.get('type', ''), cp.get('value', ''))
+                                       for idx, cp in enumerate(char_data.get('codepoints', []))])
+
+        # Dictionary references
+        dict_refs = []
+        for idx, ref in enumerate(char_data.get('dictionaryReferences', [])):
+            morohashi = ref.get('morohashi') or {}
+            dict_refs.append((
+                derive_id(character, idx), kanji_id, ref.get('type', ''), ref.get('value', ''),
+                morohashi.get('volume'), morohashi.get('page')
+            ))
+        out.extend('kanji_dictionary_reference', dict_refs)
+
+        # Query codes
+        out.extend('kanji_query_code', [(derive_id(character, idx), kanji_id, qc.get('type', ''), qc.get('value', ''),
+                                         qc.get('skipMisclassification'))
+                                        for idx, qc in enumerate(char_data.get('queryCodes', []))])
+
+        # Readings and meanings (numbered across groups)
+        reading_meaning = char_data.get('readingMeaning', {})
+        if reading_meaning and 'groups' in reading_meaning:
+            reading_idx = meaning_idx = 0
+            for group in reading_meaning['groups']:
+                for r in group.get('readings', []):
+                    out.add('kanji_reading', (derive_id(character, reading_idx), kanji_id, r.get('type', ''),
+                                              r.get('value', ''), r.get('status'), r.get('onType')))
+                    reading_idx += 1
+                for m in group.get('meanings', []):
+                    out.add('kanji_meaning', (derive_id(character, meaning_idx), kanji_id,
+                                              LANGUAGE_MAP.get(m.get('lang', '')), m.get('value', '')))
+                    meaning_idx += 1
+
+        # Nanori
+        if reading_meaning and 'nanori' in reading_meaning:
+            out.extend('kanji_nanori', [(derive_id(character, idx), kanji_id, nanori)
+                                        for idx, nanori in enumerate(reading_meaning['nanori'])])
+
+    # ========== Vocabulary ==========
+
+    def _get_vocab_jlpt_level(self, word_data: dict) -> Optional[int]:
+        """Get JLPT level for vocabulary from mapping."""
+        kanji_list = word_data.get('kanji', [])
+        primary_kanji = kanji_list[0].get('text', '') if kanji_list else ''
+        kana_list = word_data.get('kana', [])
+        primary_kana = kana_list[0].get('text', '') if kana_list else ''
+
+        if primary_kanji and primary_kana:
+            jlpt = self.vocabulary_jlpt_mapping.get((primary_kanji, primary_kana))
+            if jlpt:
+                return jlpt
+        if primary_kana and not primary_kanji:
+            return self.vocabulary_jlpt_mapping.get((primary_kana, primary_kana))
+        return None
+
+    def vocabulary_entry(self, out: RowBuffer, word_data: dict) -> Optional[str]:
+        """
+        Buffer a vocabulary entry with forms, kanji links, senses, relations and furigana.
+
+        Returns:
+            The entry's jmdict_id, or None for entries without one
+        """
+        jmdict_id = word_data.get('id', '')
+        if not jmdict_id:
+            return None
+
+        vocab_id = key_allocator.vocabulary_id(jmdict_id)
+        out.add('vocabulary', (vocab_id, jmdict_id, self._get_vocab_jlpt_level(word_data),
+                               entry_slug(word_data, self.primary_kanji_counts.get('vocabulary', {}))))
+
+        self._process_vocab_forms(out, jmdict_id, vocab_id, word_data)
+        self._process_uses_kanji(out, 'vocabulary_uses_kanji', jmdict_id, vocab_id, word_data)
+        self._process_vocab_senses(out, jmdict_id, vocab_id, word_data)
+        self._process_furigana(out, jmdict_id, vocab_id, 'vocabulary', word_data)
+        return jmdict_id
+
+    def _process_vocab_forms(self, out: RowBuffer, jmdict_id: str, vocab_id: uuid.UUID,
+                             word_data: dict) -> None:
+        """Buffer kanji and kana forms for vocabulary."""
+        derive_id = key_allocator.derive_id
+
+        # Kanji forms
+        out.extend('vocabulary_kanji', [(derive_id(jmdict_id, idx), vocab_id, k.get('text', ''),
+                                         k.get('common', False), idx == 0)
+                                        for idx, k in enumerate(word_data.get('kanji', []))])
+
+        # Kana forms
+        out.extend('vocabulary_kana', [(derive_id(jmdict_id, idx), vocab_id, k.get('text', ''),
+                                        k.get('appliesToKanji', []), k.get('common', False), idx == 0)
+                                       for idx, k in enumerate(word_data.get('kana', []))])
+
+    def _process_uses_kanji(self, out: RowBuffer, table: str, entity_key: str, entity_id: uuid.UUID,
+                            entry: dict) -> None:
+        """Buffer the links of an entry to the loaded kanji in its kanji forms (deduplicated per entry)."""
+        used_kanji: Dict[uuid.UUID, None] = {}
+        for kanji in entry.get('kanji', []):
+            scan_kanji(kanji.get('text', ''), self.kanji_cache, used_kanji)
+        out.extend(table, [(key_allocator.derive_id(entity_key, idx), entity_id, kanji_id)
+                           for idx, kanji_id in enumerate(used_kanji)])
+
+    def _process_vocab_senses(self, out: RowBuffer, jmdict_id: str, vocab_id: uuid.UUID,
+                              word_data: dict) -> None:
+        """Buffer senses for vocabulary."""
+        derive_id = key_allocator.derive_id
+        for sense_idx, sense in enumerate(word_data.get('sense', [])):
+            sense_id = key_allocator.vocabulary_sense_id(jmdict_id, sense_idx)
+            out.add('vocabulary_sense', (sense_id, vocab_id, sense.get('appliesToKanji', []),
+                                         sense.get('appliesToKana', []), sense.get('info', [])))
+
+            # Tags (deduplicated - COPY has no ON CONFLICT for the unique constraint)
+            tag_batch = {}
+            for pos in sense.get('partOfSpeech', []):
+                tag_batch[(sense_id, pos, 'pos')] = None
+            for field in sense.get('field', []):
+                tag_batch[(sense_id, field, 'field')] = None
+            for dialect in sense.get('dialect', []):
+                tag_batch[(sense_id, dialect, 'dialect')] = None
+            for misc in sense.get('misc', []):
+                tag_batch[(sense_id, misc, 'misc')] = None
+            out.extend('vocabulary_sense_tag', [(derive_id(jmdict_id, sense_idx, idx),) + tag
+                                                for idx, tag in enumerate(tag_batch)])
+
+            # Glosses
+            out.extend('vocabulary_sense_gloss', [(derive_id(jmdict_id, sense_idx, idx), sense_id, g.get('lang'),
+                                                   g.get('text'), g.get('gender'), g.get('type'))
+                                                  for idx, g in enumerate(sense.get('gloss', []))])
+
+            # Language sources
+            out.extend('vocabulary_sense_language_source', [(derive_id(jmdict_id, sense_idx, idx), sense_id,
+                                                             ls.get('lang'), ls.get('text'),
+                                                             ls.get('full'), ls.get('wasei'))
+                                                            for idx, ls in enumerate(sense.get('languageSource', []))])
+
+            # Related/Antonym - resolved against the term index of the source
+            relation_idx = 0
+            for rel_type in ('related', 'antonym'):
+                for rel in sense.get(rel_type, []):
+                    if isinstance(rel, list) and len(rel) > 0:
+                        out.add('vocabulary_sense_relation',
+                                (derive_id(jmdict_id, sense_idx, relation_idx), sense_id,
+                                 *self._vocab_relation_target(rel), rel_type))
+                        relation_idx += 1
+
+    def _vocab_relation_target(self, rel: list) -> tuple:
+        """
+        Resolve a [term, reading?, sense number?] reference of a sense.
+
+        Returns:
+            (target_vocab_id, target_sense_id, term, reading); the ids are None
+            when the term (or the sense number) is not in the source
+        """
+        term = str(rel[0]) if rel[0] else None
+        reading = str(rel[1]) if len(rel) > 1 and rel[1] else None
+        sense_no = rel[2] if len(rel) > 2 else None
+        target = resolve_term(self.terms.get('vocabulary', {}), term, reading)
+        if not target:
+            return None, None, term, reading
+        # Sense ids are derived from (jmdict_id, sense index), no lookup needed
+        target_sense_id = None
+        if sense_no and 0 < sense_no <= self.vocabulary_sense_counts.get(target, 0):
+            target_sense_id = key_allocator.vocabulary_sense_id(target, sense_no - 1)
+        return key_allocator.vocabulary_id(target), target_sense_id, term, reading
+
+    def _process_furigana(self, out: RowBuffer, entity_key: str, entity_id: uuid.UUID, entity_type: str,
+                          word_data: dict) -> None:
+        """Buffer furigana data for an entity."""
+        furigana_cache = self._furigana_cache(entity_type)
+        if furigana_cache is None:
+            return
+
+        processed = set()
+        table = f"{entity_type}_furigana"
+
+        for kanji in word_data.get('kanji', []):
+            text = kanji.get('text')
+            if not text:
+                continue
+            for kana in word_data.get('kana', []):
+                reading = kana.get('reading', kana.get('text'))
+                if not reading:
+                    continue
+                applies_to = kana.get('appliesToKanji', [])
+                if applies_to and applies_to != ['*'] and text not in applies_to:
+                    continue
+                if (text, reading) in processed:
+                    continue
+
+                furi_data = furigana_cache.get((text, reading))
+                if furi_data:
+                    out.add(table, (key_allocator.derive_id(entity_key, len(processed)), entity_id,
+                                    text, reading, json_dumps(furi_data)))
+                    processed.add((text, reading))
+
+    # ========== Vocabulary Examples ==========
+
+    def example_entry(self, out: RowBuffer, word_data: dict) -> bool:
+        """
+        Buffer the examples of a vocabulary entry.
+
+        Returns:
+            True if the entry matched a loaded vocabulary entry
+        """
+        jmdict_id = word_data.get('id', '')
+        sense_count = self.vocabulary_sense_counts.get(jmdict_id)
+        if not sense_count:
+            return False
+
+        # Examples belong to the sense at the same position of the loaded entry
+        for sense_idx, sense in enumerate(word_data.get('sense', [])[:sense_count]):
+            sense_id = key_allocator.vocabulary_sense_id(jmdict_id, sense_idx)
+            for example_idx, example in enumerate(sense.get('examples', [])):
+                source_type = example.get('source', {}).get('type')
+                source_value = example.get('source', {}).get('value')
+                text = example.get('text', '')
+
+                example_id = key_allocator.derive_id(jmdict_id, sense_idx, example_idx)
+                out.add('vocabulary_sense_example', (example_id, sense_id, source_type, source_value, text))
+                out.extend('vocabulary_sense_example_sentence',
+                           [(key_allocator.derive_id(jmdict_id, sense_idx, example_idx, idx),
+                             example_id, s.get('lang'), s.get('text'))
+                            for idx, s in enumerate(example.get('sentences', []))])
+        return True
+
+    # ========== Proper Nouns ==========
+
+    def proper_noun_entry(self, out: RowBuffer, name_data: dict) -> Optional[str]:
+        """
+        Buffer a proper noun with forms, translations, relations, kanji links and furigana.
+
+        Returns:
+            The entry's jmnedict_id, or None for entries without one
+        """
+        jmnedict_id = name_data.get('id', '')
+        if not jmnedict_id:
+            return None
+        derive_id = key_allocator.derive_id
+
+        pn_id = key_allocator.proper_noun_id(jmnedict_id)
+        out.add('proper_noun', (pn_id, jmnedict_id,
+                                entry_slug(name_data, self.primary_kanji_counts.get('proper_noun', {}))))
+
+        # Forms
+        out.extend('proper_noun_kanji', [(derive_id(jmnedict_id, idx), pn_id, k.get('text', ''), idx == 0)
+                                         for idx, k in enumerate(name_data.get('kanji', []))])
+        out.extend('proper_noun_kana', [(derive_id(jmnedict_id, idx), pn_id, k.get('text', ''),
+                                         k.get('appliesToKanji', []), idx == 0)
+                                        for idx, k in enumerate(name_data.get('kana', []))])
+
+        # Translations
+        for trans_idx, trans in enumerate(name_data.get('translation', [])):
+            trans_id = key_allocator.proper_noun_translation_id(jmnedict_id, trans_idx)
+            out.add('proper_noun_translation', (trans_id, pn_id))
+
+            # Types
+            out.extend('proper_noun_translation_type', [(derive_id(jmnedict_id, trans_idx, idx), trans_id, t)
+                                                        for idx, t in enumerate(trans.get('type', []))])
+
+            # Text
+            out.extend('proper_noun_translation_text', [(derive_id(jmnedict_id, trans_idx, idx), trans_id,
+                                                         t.get('lang'), t.get('text'))
+                                                        for idx, t in enumerate(trans.get('translation', []))])
+
+            # Related - resolved against the term index of the source
+            terms = self.terms.get('proper_noun', {})
+            related_rows = []
+            for idx, rel in enumerate(rel for rel in trans.get('related', []) if isinstance(rel, list) and rel):
+                reading = rel[1] if len(rel) > 1 else None
+                target = resolve_term(terms, rel[0], reading)
+                related_rows.append((derive_id(jmnedict_id, trans_idx, idx), trans_id, rel[0], reading,
+                                     key_allocator.proper_noun_id(target) if target else None, None))
+            out.extend('proper_noun_translation_related', related_rows)
+
+        self._process_uses_kanji(out, 'proper_noun_uses_kanji', jmnedict_id, pn_id, name_data)
+
+        # Furigana
+        self._process_furigana(out, jmnedict_id, pn_id, 'proper_noun', name_data)
+        return jmnedict_id
@@ -0,0 +1,197 @@
+"""
+Secondary index management for bulk loads.
+
+Drops the non-constraint indexes of the jlpt schema before the data processor
+runs and rebuilds them afterwards in parallel sessions, so rows are not pushed
+through dozens of btree/GiST/GIN indexes one at a time during the load.
+
+Dropped definitions are persisted to INDEX_STATE_FILE, keyed by schema and
+index name, until they have been rebuilt, so a crashed run still restores them
+on the next start and a shadow load never clobbers the live schema's entries.
+"""
+
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import psycopg2
+
+# Where dropped index definitions are kept until they are rebuilt
+INDEX_STATE_FILE = Path(os.getenv('INDEX_STATE_FILE', Path(__file__).parent / '.dropped_indexes.json'))
+
+# Parallel CREATE INDEX sessions and their per-session settings
+INDEX_BUILD_WORKERS = int(os.getenv('INDEX_BUILD_WORKERS', '4'))
+INDEX_MAINTENANCE_WORK_MEM = os.getenv('INDEX_MAINTENANCE_WORK_MEM', '256MB')
+INDEX_PARALLEL_WORKERS = int(os.getenv('INDEX_PARALLEL_WORKERS', '2'))
+
+# Keep plain btree indexes on foreign key columns; the processors look rows up
+# by parent id while loading (e.g. senses of a vocabulary entry)
+INDEX_KEEP_FK_LOOKUPS = os.getenv('INDEX_KEEP_FK_LOOKUPS', '1') == '1'
+
+
+def capture_indexes(conn, schema: str = 'jlpt') -> List[Dict[str, str]]:
+    """
+    Read the droppable index definitions of a schema from pg_indexes.
+
+    Indexes that back a constraint (primary keys, UNIQUE) and unique indexes
+    are never returned; ON CONFLICT clauses depend on them.
+
+    Returns:
+        List of {'schema', 'name', 'table', 'definition', 'fk_lookup'} dicts
+    """
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT i.indexname, i.tablename, i.indexdef,
+                   ix.indpred IS NULL AND am.amname = 'btree' AND EXISTS (
+                       SELECT 1 FROM pg_constraint fk
+                       WHERE fk.contype = 'f' AND fk.conrelid = ix.indrelid
+                         AND fk.conkey = ix.indkey::int2[]
+                   ) AS fk_lookup
+            FROM pg_indexes i
+            JOIN pg_namespace n ON n.nspname = i.schemaname
+            JOIN pg_class c ON c.relname = i.indexname AND c.relnamespace = n.oid
+            JOIN pg_index ix ON ix.indexrelid = c.oid
+            JOIN pg_am am ON am.oid = c.relam
+            WHERE i.schemaname = %s
+              AND NOT ix.indisunique
+              AND NOT EXISTS (SELECT 1 FROM pg_constraint con WHERE con.conindid = c.oid)
+            ORDER BY i.tablename, i.indexname
+        """, (schema,))
+        return [
+            {'schema': schema, 'name': name, 'table': table,
+             'definition': definition, 'fk_lookup': fk_lookup}
+            for name, table, definition, fk_lookup in cursor.fetchall()
+        ]
+
+
+def _state_key(idx: Dict[str, str]) -> str:
+    """Key of an index definition in the state file ('schema.index_name')."""
+    return f"{idx['schema']}.{idx['name']}"
+
+
+def _load_state() -> Dict[str, Dict[str, str]]:
+    """Return index definitions left over from previous, unfinished runs."""
+    if INDEX_STATE_FILE.exists():
+        return json.loads(INDEX_STATE_FILE.read_text(encoding='utf-8'))
+    return {}
+
+
+def _save_state(state: Dict[str, Dict[str, str]]) -> None:
+    """Persist index definitions that still have to be rebuilt."""
+    if not state:
+        INDEX_STATE_FILE.unlink(missing_ok=True)
+        return
+    INDEX_STATE_FILE.parent.mkdir(parents=True, exist_ok=True)
+    INDEX_STATE_FILE.write_text(json.dumps(state, ensure_ascii=False, indent=2), encoding='utf-8')
+
+
+def pending_indexes(schema: str = 'jlpt') -> List[Dict[str, str]]:
+    """Return the index definitions of a schema that are pending a rebuild."""
+    return [idx for idx in _load_state().values() if idx['schema'] == schema]
+
+
+def drop_indexes(db_params: dict, schema: str = 'jlpt') -> List[Dict[str, str]]:
+    """
+    Drop the secondary indexes of a schema ahead of a bulk load.
+
+    The definitions are saved before anything is dropped and merged with any
+    definitions a previous run failed to rebuild. Pending definitions of other
+    schemas are kept as they are.
+
+    Returns:
+        All index definitions of the schema that are pending a rebuild
+    """
+    conn = psycopg2.connect(**db_params)
+    try:
+        captured = [idx for idx in capture_indexes(conn, schema)
+                    if not (INDEX_KEEP_FK_LOOKUPS and idx['fk_lookup'])]
+        state = _load_state()
+        for idx in captured:
+            state[_state_key(idx)] = idx
+        _save_state(state)
+        indexes = [idx for idx in state.values() if idx['schema'] == schema]
+
+        with conn.cursor() as cursor:
+            for idx in captured:
+                cursor.execute(f'DROP INDEX IF EXISTS "{schema}"."{idx["name"]}"')
+        conn.commit()
+        print(f"Dropped {len(captured)} secondary indexes ({len(indexes)} pending rebuild)", flush=True)
+        return indexes
+    finally:
+        conn.close()
+
+
+def _build_index(db_params: dict, idx: Dict[str, str]) -> float:
+    """Build one index in its own session and return the build time in seconds."""
+    definition = idx['definition'].replace('CREATE INDEX ', 'CREATE INDEX IF NOT EXISTS ', 1)
+    conn = psycopg2.connect(**db_params)
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SET maintenance_work_mem = %s", (INDEX_MAINTENANCE_WORK_MEM,))
+            cursor.execute("SET max_parallel_maintenance_workers = %s", (INDEX_PARALLEL_WORKERS,))
+            start = time.perf_counter()
+            cursor.execute(definition)
+            return time.perf_counter() - start
+    finally:
+        conn.close()
+
+
+def rebuild_indexes(db_params: dict, schema: str = 'jlpt') -> bool:
+    """
+    Rebuild the pending indexes of a schema in parallel sessions and report build times.
+
+    Indexes on the largest tables are started first so the long builds overlap.
+
+    Returns:
+        True if every index of the schema was rebuilt
+    """
+    indexes = pending_indexes(schema)
+    if not indexes:
+        return True
+
+    conn = psycopg2.connect(**db_params)
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT c.relname, pg_relation_size(c.oid)
+                FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+                WHERE n.nspname = %s AND c.relkind = 'r'
+            """, (schema,))
+            table_sizes = dict(cursor.fetchall())
+    finally:
+        conn.close()
+    indexes.sort(key=lambda idx: table_sizes.get(idx['table'], 0), reverse=True)
+
+    print(f"Rebuilding {len(indexes)} indexes ({INDEX_BUILD_WORKERS} sessions, "
+          f"maintenance_work_mem={INDEX_MAINTENANCE_WORK_MEM}, "
+          f"max_parallel_maintenance_workers={INDEX_PARALLEL_WORKERS})...", flush=True)
+
+    start = time.perf_counter()
+    timings: List[Tuple[Dict[str, str], float]] = []
+    failed: List[Dict[str, str]] = []
+    with ThreadPoolExecutor(max_workers=INDEX_BUILD_WORKERS) as executor:
+        futures = {executor.submit(_build_index, db_params, idx): idx for idx in indexes}
+        for future in as_completed(futures):
+            idx = futures[future]
+            try:
+                timings.append((idx, future.result()))
+            except Exception as e:
+                print(f"Failed to build index {idx['name']}: {e}", flush=True)
+                failed.append(idx)
+    elapsed = time.perf_counter() - start
+
+    print(f"\n{'Index':<55} {'Table':<35} {'Seconds':>8}", flush=True)
+    for idx, seconds in sorted(timings, key=lambda t: t[1], reverse=True):
+        print(f"{idx['name']:<55} {idx['table']:<35} {seconds:>8.2f}", flush=True)
+    print(f"Rebuilt {len(timings)} indexes in {elapsed:.2f}s wall "
+          f"({sum(seconds for _, seconds in timings):.2f}s total build time)", flush=True)
+
+    state = _load_state()
+    for idx, _ in timings:
+        state.pop(_state_key(idx), None)
+    _save_state(state)
+    return not failed
@@ -0,0 +1,102 @@
+"""
+Deterministic client-side primary keys for the data processors.
+
+Ids are derived from the natural source keys (jmdict_id, jmnedict_id, kanji
+literal) plus the position of a row inside its entry, so parents and children
+can be written without waiting on RETURNING and every reload of the same
+dictionary release produces the same ids.
+
+Layout (RFC 9562 UUIDv8, big-endian, compared byte-wise by PostgreSQL):
+
+    48 bits  entity ordinal (numeric dictionary id, codepoint or hash)
+     4 bits  version (8)
+    12 bits  index 1
+     2 bits  variant (0b10)
+    14 bits  index 2
+    48 bits  indices 3-5 (16 bits each)
+
+Rows of the same entry therefore sort by their source position, which keeps
+the `ORDER BY id` clauses in the search functions returning senses, glosses,
+readings and translations in dictionary order, exactly like uuidv7() did.
+Entity ids sort in dictionary order (jmdict/jmnedict sequence, codepoint).
+"""
+
+import hashlib
+import uuid
+from typing import Union
+
+EntityKey = Union[str, int]
+
+_ORDINAL_BITS = 48
+_INDEX_LIMITS = (1 << 12, 1 << 14, 1 << 16, 1 << 16, 1 << 16)
+_VERSION_BITS = 0x8 << 76
+_VARIANT_BITS = 0b10 << 62
+
+
+def entity_ordinal(key: EntityKey) -> int:
+    """
+    Map a natural entity key to a 48-bit ordinal.
+
+    ASCII numeric dictionary ids map to themselves, single characters to their
+    codepoint and anything else to a stable 48-bit hash.
+    """
+    if isinstance(key, int):
+        ordinal = key
+    elif key.isascii() and key.isdigit():
+        ordinal = int(key)
+    elif len(key) == 1:
+        ordinal = ord(key)
+    else:
+        ordinal = int.from_bytes(hashlib.sha1(key.encode('utf-8')).digest()[:6], 'big')
+    if not 0 <= ordinal < (1 << _ORDINAL_BITS):
+        raise ValueError(f"Entity key {key!r} does not fit into {_ORDINAL_BITS} bits")
+    return ordinal
+
+
+def derive_id(entity_key: EntityKey, *indices: int) -> uuid.UUID:
+    """
+    Derive the id of a row from its entity key and its position path.
+
+    Args:
+        entity_key: Natural key of the top-level entry (jmdict_id, literal, ...)
+        indices: Positions below the entry, e.g. (sense_index, gloss_index)
+
+    Returns:
+        Deterministic, position-ordered UUID
+    """
+    if len(indices) > len(_INDEX_LIMITS):
+        raise ValueError(f"At most {len(_INDEX_LIMITS)} indices are supported, got {len(indices)}")
+    parts = [0] * len(_INDEX_LIMITS)
+    for pos, index in enumerate(indices):
+        if not 0 <= index < _INDEX_LIMITS[pos]:
+            raise ValueError(f"Index {index} at depth {pos + 1} is out of range for {entity_key!r}")
+        parts[pos] = index
+    i1, i2, i3, i4, i5 = parts
+    value = ((entity_ordinal(entity_key) << 80) | _VERSION_BITS | (i1 << 64) | _VARIANT_BITS
+             | (i2 << 48) | (i3 << 32) | (i4 << 16) | i5)
+    return uuid.UUID(int=value)
+
+
+def kanji_id(literal: str) -> uuid.UUID:
+    """Id of a jlpt.kanji row."""
+    return derive_id(literal)
+
+
+def vocabulary_id(jmdict_id: str) -> uuid.UUID:
+    """Id of a jlpt.vocabulary row."""
+    return derive_id(jmdict_id)
+
+
+def vocabulary_sense_id(jmdict_id: str, sense_index: int) -> uuid.UUID:
+    """Id of the sense at sense_index (0-based) of a vocabulary entry."""
+    return derive_id(jmdict_id, sense_index)
+
+
+def proper_noun_id(jmnedict_id: str) -> uuid.UUID:
+    """Id of a jlpt.proper_noun row."""
+    return derive_id(jmnedict_id)
+
+
+def proper_noun_translation_id(jmnedict_id: str, translation_index: int) -> uuid.UUID:
+    """Id of the translation at translation_index (0-based) of a proper noun."""
+    return derive_id(jmnedict_id, translation_index)
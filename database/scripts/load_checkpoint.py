@@ -0,0 +1,175 @@
+"""
+Checkpoints that let a crashed full load resume instead of restarting.
+
+A full load records its progress in three small tables of the target schema:
+
+    load_run      fingerprint of the sources and settings the load started with
+    load_stage    stages that finished
+    load_batch    (stage, shard, batch) of every committed row batch
+
+Batch rows are written in the transaction that writes the batch, so the
+checkpoint always matches the data. The side results of a parsed shard
+(entry keys, example hashes) are only used when its stage ends; they are
+pickled to CHECKPOINT_DIR when the shard is parsed, so fully committed
+shards are replayed from disk instead of being parsed again.
+
+The tables are UNLOGGED: a database crash, which also empties the UNLOGGED
+child tables of the load profile, drops the checkpoint with them and the
+next run starts over.
+"""
+
+import hashlib
+import os
+import pickle
+import shutil
+from pathlib import Path
+from typing import Dict, Set, Tuple
+
+import psycopg2
+
+# Where per-shard side results are kept until the load completes
+CHECKPOINT_DIR = Path(os.getenv('CHECKPOINT_DIR', Path(__file__).parent / '.load_checkpoint'))
+
+# Set to 0 to always start full loads from scratch
+LOAD_RESUME = os.getenv('LOAD_RESUME', '1') == '1'
+
+CHECKPOINT_TABLES = {
+    'load_run': '''
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        fingerprint TEXT NOT NULL,
+        started_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+    ''',
+    'load_stage': 'stage VARCHAR(50) PRIMARY KEY',
+    'load_batch': '''
+        stage VARCHAR(50) NOT NULL,
+        shard INTEGER NOT NULL,
+        batch INTEGER NOT NULL,
+        PRIMARY KEY (stage, shard, batch)
+    ''',
+}
+
+# Settings that change how sources are split into shards and batches
+_FINGERPRINT_SETTINGS = ('BATCH_SIZE', 'PARSE_SHARD_BYTES')
+
+
+def source_fingerprint(source_dir: Path) -> str:
+    """
+    Fingerprint the source files (path, size, mtime) and the batching settings.
+
+    A checkpoint only applies to a load of the same files split the same way.
+    """
+    fingerprint = hashlib.md5()
+    for path in sorted(source_dir.rglob('*')):
+        if path.is_file():
+            stat = path.stat()
+            fingerprint.update(f'{path.relative_to(source_dir)}:{stat.st_size}:{stat.st_mtime_ns}\n'.encode())
+    for name in _FINGERPRINT_SETTINGS:
+        fingerprint.update(f'{name}={os.getenv(name, "")}\n'.encode())
+    return fingerprint.hexdigest()
+
+
+def ensure_tables(cursor, schema: str = 'jlpt') -> None:
+    """Create the checkpoint tables in databases created before they existed."""
+    for table, columns in CHECKPOINT_TABLES.items():
+        cursor.execute(f'CREATE UNLOGGED TABLE IF NOT EXISTS {schema}.{table} ({columns})')
+
+
+def can_resume(db_params: dict, fingerprint: str, schema: str = 'jlpt') -> bool:
+    """Return True if the schema holds a checkpoint of a load with this fingerprint."""
+    if not LOAD_RESUME or not CHECKPOINT_DIR.exists():
+        return False
+    conn = psycopg2.connect(**db_params)
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT to_regclass(%s)", (f'{schema}.load_run',))
+            if cursor.fetchone()[0] is None:
+                return False
+            cursor.execute(f'SELECT fingerprint FROM {schema}.load_run')
+            row = cursor.fetchone()
+    finally:
+        conn.close()
+    return row is not None and row[0] == fingerprint
+
+
+def start(db_params: dict, fingerprint: str, schema: str = 'jlpt') -> None:
+    """Reset the checkpoint for a load starting from scratch."""
+    shutil.rmtree(CHECKPOINT_DIR, ignore_errors=True)
+    CHECKPOINT_DIR.mkdir(parents=True)
+    conn = psycopg2.connect(**db_params)
+    try:
+        with conn.cursor() as cursor:
+            ensure_tables(cursor, schema)
+            cursor.execute(f'TRUNCATE {", ".join(f"{schema}.{t}" for t in CHECKPOINT_TABLES)}')
+            cursor.execute(f'INSERT INTO {schema}.load_run (id, fingerprint) VALUES (1, %s)', (fingerprint,))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def finish(db_params: dict, schema: str = 'jlpt') -> None:
+    """Drop the checkpoint of a completed load."""
+    conn = psycopg2.connect(**db_params)
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT to_regclass(%s)", (f'{schema}.load_run',))
+            if cursor.fetchone()[0] is not None:
+                cursor.execute(f'TRUNCATE {", ".join(f"{schema}.{t}" for t in CHECKPOINT_TABLES)}')
+        conn.commit()
+    finally:
+        conn.close()
+    shutil.rmtree(CHECKPOINT_DIR, ignore_errors=True)
+
+
+class LoadCheckpoint:
+    """Progress of one full load, read by the async processor on (re)start."""
+
+    def __init__(self, schema: str = 'jlpt', directory: Path = CHECKPOINT_DIR):
+        self.schema = schema
+        self.directory = directory
+        self.stages: Set[str] = set()
+        self.batches: Dict[str, Set[Tuple[int, int]]] = {}
+
+    async def load(self, conn) -> None:
+        """Read the finished stages and committed batches."""
+        self.stages = {row['stage'] for row in
+                       await conn.fetch(f'SELECT stage FROM {self.schema}.load_stage')}
+        self.batches = {}
+        for row in await conn.fetch(f'SELECT stage, shard, batch FROM {self.schema}.load_batch'):
+            self.batches.setdefault(row['stage'], set()).add((row['shard'], row['batch']))
+
+    def stage_done(self, stage: str) -> bool:
+        return stage in self.stages
+
+    def committed(self, stage: str) -> Set[Tuple[int, int]]:
+        """Return the (shard, batch) pairs of a stage that are already in the database."""
+        return self.batches.get(stage, set())
+
+    async def mark_batch(self, conn, stage: str, shard: int, batch: int) -> None:
+        """Record a batch; call inside the transaction that writes it."""
+        await conn.execute(f'''
+            INSERT INTO {self.schema}.load_batch (stage, shard, batch) VALUES ($1, $2, $3)
+            ON CONFLICT DO NOTHING
+        ''', stage, shard, batch)
+
+    async def mark_stage(self, conn, stage: str) -> None:
+        """Record a finished stage; call inside its last transaction where it has one."""
+        await conn.execute(f'''
+            INSERT INTO {self.schema}.load_stage (stage) VALUES ($1) ON CONFLICT DO NOTHING
+        ''', stage)
+        self.stages.add(stage)
+
+    def save_shard(self, stage: str, shard: int, batch_count: int, result) -> None:
+        """Keep the side results of a parsed shard (without its row batches)."""
+        path = self.directory / f'{stage}-{shard:05d}.pkl'
+        staging = path.with_suffix('.tmp')
+        with open(staging, 'wb') as f:
+            pickle.dump((batch_count, result), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(staging, path)
+
+    def saved_shards(self, stage: str) -> Dict[int, tuple]:
+        """Return {shard: (batch count, side results)} of the shards saved for a stage."""
+        saved = {}
+        for path in sorted(self.directory.glob(f'{stage}-*.pkl')):
+            with open(path, 'rb') as f:
+                saved[int(path.stem.rsplit('-', 1)[1])] = pickle.load(f)
+        return saved
@@ -0,0 +1,314 @@
+"""
+Per-stage metrics of a load, written as a JSON report and a Prometheus textfile.
+
+While run_processor collects metrics (collect()), both processors report to
+the stage that is running (see stage_graph; work outside a stage is counted
+under the enclosing run_processor phase):
+
+    wall_seconds        time from the start to the end of the stage
+    rows / statements / bytes
+                        per target table, for every bulk write
+    acquire_wait        waiting for a database connection
+    queue_wait          a producer waiting for room in the bounded batch queue
+    writer_idle         writers waiting for the next batch
+    parse               producing batches (awaiting parsed shards, transforming entries)
+    db                  database connections held by writers
+    peak RSS            of the processor and of its largest parse worker, as of the end of the stage
+
+Times are summed over concurrent writers, so they can exceed the wall time
+of a stage. Bytes are the size of the written values (UTF-8 text, 16 byte
+uuids, 8 byte numbers), not of the wire protocol.
+
+The files are written next to the .data_seeded flag, so a node_exporter
+textfile collector pointed at the state directory picks up every run.
+"""
+
+import contextvars
+import json
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
+
+import psycopg2.extensions
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Directory of the reports (default: next to the .data_seeded flag)
+METRICS_DIR = Path(os.getenv('METRICS_DIR', Path(
+    os.getenv('DATA_SEEDED_FLAG', Path(__file__).parent / '.data_seeded')).parent))
+METRICS_JSON = 'load_metrics.json'
+METRICS_PROM = 'load_metrics.prom'
+
+TIME_KINDS = ('acquire_wait', 'queue_wait', 'writer_idle', 'parse', 'db')
+
+_current_stage: contextvars.ContextVar = contextvars.ContextVar('load_metrics_stage', default='setup')
+_active: Optional['LoadMetrics'] = None
+
+# Called with (stage, kind, seconds) for every interval add_time() counts (see stage_profiler)
+time_listeners: List[Callable[[str, str, float], None]] = []
+
+# Target table of a write statement (psycopg2 cursors)
+_WRITE_TARGET = re.compile(r'^\s*(?:INSERT\s+INTO|UPDATE|DELETE\s+FROM)\s+(?:\w+\.)?(\w+)', re.IGNORECASE)
+
+
+def payload_bytes(rows: Sequence[Sequence[Any]]) -> int:
+    """Return the size of the values of written rows."""
+    return sum(_value_bytes(value) for row in rows for value in row)
+
+
+def _value_bytes(value: Any) -> int:
+    if value is None:
+        return 0
+    if isinstance(value, str):
+        return len(value.encode('utf-8'))
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return len(value)
+    if isinstance(value, uuid.UUID):
+        return 16
+    if isinstance(value, bool):
+        return 1
+    if isinstance(value, (list, tuple)):
+        return sum(_value_bytes(v) for v in value)
+    return 8
+
+
+def peak_rss_bytes() -> Dict[str, int]:
+    """Return the peak RSS so far of this process and of its largest finished child."""
+    if resource is None:
+        return {'main': 0, 'workers': 0}
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return {
+        'main': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale,
+        'workers': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale,
+    }
+
+
+class StageMetrics:
+    """Counters of one stage."""
+
+    def __init__(self):
+        self.wall_seconds = 0.0
+        self.times: Dict[str, float] = dict.fromkeys(TIME_KINDS, 0.0)
+        # table -> {'rows', 'statements', 'bytes'}
+        self.tables: Dict[str, Dict[str, int]] = {}
+        self.peak_rss: Dict[str, int] = {'main': 0, 'workers': 0}
+
+    def total(self, counter: str) -> int:
+        return sum(table[counter] for table in self.tables.values())
+
+    def to_dict(self) -> Dict[str, Any]:
+        rows = self.total('rows')
+        return {
+            'wall_seconds': round(self.wall_seconds, 3),
+            'rows': rows,
+            'rows_per_second': round(rows / self.wall_seconds, 1) if self.wall_seconds else None,
+            'statements': self.total('statements'),
+            'bytes': self.total('bytes'),
+            **{f'{kind}_seconds': round(seconds, 3) for kind, seconds in self.times.items()},
+            'peak_rss_bytes': self.peak_rss['main'],
+            'worker_peak_rss_bytes': self.peak_rss['workers'],
+            'tables': self.tables,
+        }
+
+
+class LoadMetrics:
+    """Metrics of one run_processor run, by stage."""
+
+    def __init__(self):
+        self.info: Dict[str, str] = {}
+        self.stages: Dict[str, StageMetrics] = {}
+        self.started_at = datetime.now(timezone.utc)
+        self._started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def _stage(self) -> StageMetrics:
+        name = _current_stage.get()
+        if name not in self.stages:
+            self.stages[name] = StageMetrics()
+        return self.stages[name]
+
+    def add_write(self, table: str, rows: int, statements: int, nbytes: int) -> None:
+        with self._lock:
+            counters = self._stage().tables.setdefault(table, {'rows': 0, 'statements': 0, 'bytes': 0})
+            counters['rows'] += rows
+            counters['statements'] += statements
+            counters['bytes'] += nbytes
+
+    def add_time(self, kind: str, seconds: float) -> None:
+        with self._lock:
+            self._stage().times[kind] += seconds
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        token = _current_stage.set(name)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                metrics = self._stage()
+                metrics.wall_seconds += time.perf_counter() - started
+                metrics.peak_rss = peak_rss_bytes()
+            _current_stage.reset(token)
+
+    def to_dict(self, success: bool) -> Dict[str, Any]:
+        peak_rss = peak_rss_bytes()
+        return {
+            **self.info,
+            'success': success,
+            'started_at': self.started_at.isoformat(),
+            'duration_seconds': round(time.perf_counter() - self._started, 3),
+            'peak_rss_bytes': peak_rss['main'],
+            'worker_peak_rss_bytes': peak_rss['workers'],
+            'stages': {name: stage.to_dict() for name, stage in self.stages.items()},
+        }
+
+    def prometheus(self, report: Dict[str, Any]) -> List[str]:
+        """Return the report in the Prometheus text exposition format."""
+        info = ''.join(f',{key}="{value}"' for key, value in self.info.items())
+        lines = []
+
+        def metric(name: str, kind: str, help_text: str, samples: List[tuple]) -> None:
+            lines.append(f'# HELP jlpt_load_{name} {help_text}')
+            lines.append(f'# TYPE jlpt_load_{name} {kind}')
+            for labels, value in samples:
+                label_text = (','.join(f'{key}="{val}"' for key, val in labels.items()) + info).lstrip(',')
+                lines.append(f'jlpt_load_{name}{{{label_text}}} {value}' if label_text
+                             else f'jlpt_load_{name} {value}')
+
+        stages = report['stages']
+        metric('success', 'gauge', 'Whether the last load succeeded', [({}, int(report['success']))])
+        metric('last_run_timestamp_seconds', 'gauge', 'Start of the last load',
+               [({}, int(self.started_at.timestamp()))])
+        metric('duration_seconds', 'gauge', 'Wall time of the last load', [({}, report['duration_seconds'])])
+        metric('stage_wall_seconds', 'gauge', 'Wall time of a load stage',
+               [({'stage': s}, m['wall_seconds']) for s, m in stages.items()])
+        metric('stage_time_seconds', 'gauge', 'Time of a load stage by kind (summed over writers)',
+               [({'stage': s, 'kind': kind}, m[f'{kind}_seconds'])
+                for s, m in stages.items() for kind in TIME_KINDS])
+        metric('stage_peak_rss_bytes', 'gauge', 'Peak RSS as of the end of a load stage',
+               [({'stage': s, 'process': process}, m[key]) for s, m in stages.items()
+                for process, key in (('main', 'peak_rss_bytes'), ('worker', 'worker_peak_rss_bytes'))])
+        for counter, help_text in (('rows', 'Rows written'), ('statements', 'Write statements issued'),
+                                   ('bytes', 'Bytes of written values')):
+            metric(f'stage_{counter}', 'gauge', f'{help_text} by stage and table',
+                   [({'stage': s, 'table': t}, c[counter])
+                    for s, m in stages.items() for t, c in m['tables'].items()])
+        return lines
+
+    def write(self, success: bool, directory: Path = METRICS_DIR) -> None:
+        """Write the JSON report and the Prometheus textfile (each replaced atomically)."""
+        report = self.to_dict(success)
+        directory.mkdir(parents=True, exist_ok=True)
+        for name, text in ((METRICS_JSON, json.dumps(report, indent=2)),
+                           (METRICS_PROM, '\n'.join(self.prometheus(report)) + '\n')):
+            staging = directory / f'.{name}.tmp'
+            staging.write_text(text, encoding='utf-8')
+            os.replace(staging, directory / name)
+        print(f"Load metrics written to {directory / METRICS_JSON}", flush=True)
+
+
+@contextmanager
+def collect() -> Iterator[LoadMetrics]:
+    """Collect the metrics the processors report until the block exits."""
+    global _active
+    _active = LoadMetrics()
+    try:
+        yield _active
+    finally:
+        _active = None
+
+
+def describe(**info: str) -> None:
+    """Attach labels (e.g. load='delta') to the collected metrics."""
+    if _active:
+        _active.info.update(info)
+
+
+def stage(name: str):
+    """Context manager counting the work inside it towards a stage."""
+    if _active:
+        return _active.stage(name)
+    return _noop()
+
+
+def record_write(table: str, rows: int, statements: int, nbytes: int) -> None:
+    """Count a bulk write towards the current stage."""
+    if _active:
+        _active.add_write(table, rows, statements, nbytes)
+
+
+def stage_rows(name: str, table: str) -> int:
+    """Return the rows a stage has written to a table so far (0 when not collecting)."""
+    if not _active:
+        return 0
+    with _active._lock:
+        stage_metrics = _active.stages.get(name)
+        return stage_metrics.tables.get(table, {}).get('rows', 0) if stage_metrics else 0
+
+
+def current_stage() -> str:
+    """Return the stage the calling code counts towards."""
+    return _current_stage.get()
+
+
+def add_time(kind: str, seconds: float) -> None:
+    """Count time of one of TIME_KINDS towards the current stage."""
+    if _active:
+        _active.add_time(kind, seconds)
+    for listener in time_listeners:
+        listener(_current_stage.get(), kind, seconds)
+
+
+@contextmanager
+def timed(kind: str) -> Iterator[None]:
+    """Count the time spent inside the block as one of TIME_KINDS."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_time(kind, time.perf_counter() - started)
+
+
+@contextmanager
+def _noop() -> Iterator[None]:
+    yield
+
+
+class MetricsCursor(psycopg2.extensions.cursor):
+    """psycopg2 cursor that counts write statements and their time (cursor_factory)."""
+
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            self._record(query, 1, [vars] if vars else [], started)
+
+    def executemany(self, query, vars_list):
+        vars_list = list(vars_list)
+        started = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            self._record(query, len(vars_list), vars_list, started)
+
+    def _record(self, query, statements: int, params: list, started: float) -> None:
+        if not _active:
+            return
+        add_time('db', time.perf_counter() - started)
+        target = _WRITE_TARGET.match(query.decode() if isinstance(query, bytes) else str(query))
+        if target:
+            params = [p.values() if isinstance(p, dict) else p for p in params]
+            record_write(target.group(1), max(self.rowcount, 0), statements, payload_bytes(params))
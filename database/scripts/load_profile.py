@@ -0,0 +1,166 @@
+"""
+Bulk-load session profile for the data processors.
+
+While the profile is active:
+- processor sessions run with session_replication_role = replica (no FK or
+  updated_at triggers) and synchronous_commit = off
+- the large child tables are UNLOGGED, so the load writes no WAL for them
+
+When it ends, the tables it made UNLOGGED are switched back to LOGGED
+(referenced tables first; tables created UNLOGGED, like the load checkpoint,
+stay as they are) and the schema is VACUUM (FREEZE, ANALYZE)d, so the
+freshly loaded tables start frozen and with statistics. This also runs when
+the load fails.
+"""
+
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Set
+
+import psycopg2
+
+from bulk_sink import TABLE_COLUMNS
+
+# Set to 0 to load with the regular (logged, trigger-checked) settings
+LOAD_PROFILE = os.getenv('LOAD_PROFILE', '1') == '1'
+
+# Settings applied to every processor session while the profile is active
+LOAD_SESSION_SETTINGS = {
+    'session_replication_role': 'replica',
+    'synchronous_commit': 'off',
+}
+
+# Entry tables stay logged; their children are switched to UNLOGGED
+ROOT_TABLES = ('kanji', 'vocabulary', 'proper_noun')
+UNLOGGED_TABLES = tuple(table for table in TABLE_COLUMNS if table not in ROOT_TABLES)
+
+_active_settings: Dict[str, str] = {}
+
+
+def active() -> bool:
+    """Return True while bulk_load() has the profile active (sessions skip foreign key checks)."""
+    return bool(_active_settings)
+
+
+def session_settings() -> Dict[str, str]:
+    """Return the settings new processor sessions should use (empty when inactive)."""
+    return dict(_active_settings)
+
+
+def connect_options() -> str:
+    """Return session_settings() as a libpq options string for psycopg2."""
+    return ' '.join(f'-c {name}={value}' for name, value in _active_settings.items())
+
+
+def _fk_references(cursor, schema: str) -> Dict[str, Set[str]]:
+    """Map each table to the tables it references through foreign keys."""
+    cursor.execute("""
+        SELECT src.relname, dst.relname
+        FROM pg_constraint con
+        JOIN pg_class src ON src.oid = con.conrelid
+        JOIN pg_class dst ON dst.oid = con.confrelid
+        JOIN pg_namespace n ON n.oid = src.relnamespace
+        WHERE con.contype = 'f' AND n.nspname = %s AND src.oid <> dst.oid
+    """, (schema,))
+    references: Dict[str, Set[str]] = {}
+    for src, dst in cursor.fetchall():
+        references.setdefault(src, set()).add(dst)
+    return references
+
+
+def _referencing_first(tables: Iterable[str], references: Dict[str, Set[str]]) -> List[str]:
+    """Order tables so every table comes before the tables it references."""
+    tables = set(tables)
+    ordered: List[str] = []
+    visited: Set[str] = set()
+
+    def visit(table: str) -> None:
+        if table in visited:
+            return
+        visited.add(table)
+        for src, dsts in references.items():
+            if table in dsts and src in tables:
+                visit(src)
+        ordered.append(table)
+
+    for table in sorted(tables):
+        visit(table)
+    return ordered
+
+
+def _set_unlogged(cursor, schema: str, tables: Iterable[str]) -> List[str]:
+    """
+    Switch tables to UNLOGGED, including every table that references them.
+
+    A permanent table may not reference an unlogged one, so referencing
+    tables are switched first.
+
+    Returns:
+        The switched tables, referencing tables first; tables left UNLOGGED by
+        an interrupted load are included so they are restored as well
+    """
+    references = _fk_references(cursor, schema)
+    closure = set(tables)
+    changed = True
+    while changed:
+        changed = False
+        for src, dsts in references.items():
+            if src not in closure and dsts & closure:
+                closure.add(src)
+                changed = True
+
+    ordered = _referencing_first(closure, references)
+    for table in ordered:
+        cursor.execute(f'ALTER TABLE {schema}.{table} SET UNLOGGED')
+    return ordered
+
+
+def _set_logged(cursor, schema: str, tables: List[str]) -> List[str]:
+    """Switch the tables _set_unlogged returned back to LOGGED, referenced tables first."""
+    ordered = list(reversed(tables))
+    for table in ordered:
+        cursor.execute(f'ALTER TABLE {schema}.{table} SET LOGGED')
+    return ordered
+
+
+@contextmanager
+def bulk_load(db_params: dict, schema: str = 'jlpt') -> Iterator[None]:
+    """
+    Activate the bulk-load profile for the duration of a load.
+
+    Expects the target tables to be empty (run after cleaning the database).
+    """
+    if not LOAD_PROFILE:
+        yield
+        return
+
+    conn = psycopg2.connect(**db_params)
+    conn.autocommit = True
+    unlogged: List[str] = []
+    try:
+        with conn.cursor() as cursor:
+            unlogged = _set_unlogged(cursor, schema, UNLOGGED_TABLES)
+        print(f"Load profile: {len(unlogged)} tables UNLOGGED, session settings "
+              f"{', '.join(f'{k}={v}' for k, v in LOAD_SESSION_SETTINGS.items())}", flush=True)
+        _active_settings.update(LOAD_SESSION_SETTINGS)
+        yield
+    finally:
+        _active_settings.clear()
+        try:
+            start = time.perf_counter()
+            with conn.cursor() as cursor:
+                logged = _set_logged(cursor, schema, unlogged)
+                print(f"Load profile: {len(logged)} tables LOGGED again "
+                      f"({time.perf_counter() - start:.2f}s)", flush=True)
+                start = time.perf_counter()
+                cursor.execute("""
+                    SELECT c.relname FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+                    WHERE n.nspname = %s AND c.relkind = 'r'
+                """, (schema,))
+                for (table,) in cursor.fetchall():
+                    cursor.execute(f'VACUUM (FREEZE, ANALYZE) {schema}.{table}')
+                print(f"Load profile: VACUUM (FREEZE, ANALYZE) done "
+                      f"({time.perf_counter() - start:.2f}s)", flush=True)
+        finally:
+            conn.close()
@@ -0,0 +1,315 @@
+"""
+NDJSON shards for the jmdict-simplified sources.
+
+The jmdict-simplified releases are single JSON documents, so reading them
+means a sequential scan of the whole file. After a sync, convert_sources
+rewrites the large sources once into newline-delimited JSON shards next to
+them:
+
+    vocabulary/source.shards/
+        manifest.json     source checksum, header keys and shard list
+        00000.ndjson      one entry per line
+        00000.idx         byte offset of every line (little-endian uint64)
+
+Entries can then be parsed one line at a time, fetched by position and split
+across workers at line boundaries. The conversion is skipped while the
+source checksum matches the manifest, so it runs once per dictionary release.
+
+Only the standard library is used by the converter, it runs in the
+jmdict-processor container.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import sys
+from array import array
+from bisect import bisect_right
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from source_header import DocumentScanner
+
+try:
+    import orjson
+    def loads(data): return orjson.loads(data)
+except ImportError:
+    def loads(data): return json.loads(data)
+
+# Approximate size of one NDJSON shard file
+NDJSON_SHARD_BYTES = int(os.getenv('NDJSON_SHARD_BYTES', str(64 * 1024 * 1024)))
+
+# Sources converted to shards: path relative to the source dir -> entry array key.
+# Only the sources the parse pool reads; the kanji stage streams its JSON file.
+SHARD_SOURCES = {
+    "vocabulary/source.json": "words",
+    "vocabulary/vocabularyWithExamples/source.json": "words",
+    "names/source.json": "words",
+}
+
+SHARD_DIR_SUFFIX = ".shards"
+MANIFEST_NAME = "manifest.json"
+FORMAT_VERSION = 1
+
+
+def file_checksum(path: Path) -> str:
+    """Return the MD5 hex digest of a file."""
+    file_hash = hashlib.md5()
+    with open(path, 'rb') as f:
+        while chunk := f.read(1024 * 1024):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+
+def shard_dir(source_path: Path) -> Path:
+    """Return the shard directory of a source file (source.json -> source.shards)."""
+    return source_path.with_name(source_path.stem + SHARD_DIR_SUFFIX)
+
+
+# ========== Conversion ==========
+
+class _ShardWriter:
+    """Writes NDJSON lines into size-limited shard files with offset indexes."""
+
+    def __init__(self, directory: Path, shard_bytes: int):
+        self.directory = directory
+        self.shard_bytes = shard_bytes
+        self.shards: List[Dict[str, Any]] = []
+        self._file = None
+        self._offsets = array('Q')
+        self._offset = 0
+
+    def write(self, line: bytes) -> None:
+        if self._file is None or self._offset >= self.shard_bytes:
+            self._close_shard()
+            name = f"{len(self.shards):05d}"
+            self.shards.append({"file": f"{name}.ndjson", "index": f"{name}.idx"})
+            self._file = open(self.directory / f"{name}.ndjson", 'wb')
+        self._offsets.append(self._offset)
+        self._file.write(line)
+        self._file.write(b'\n')
+        self._offset += len(line) + 1
+
+    def _close_shard(self) -> None:
+        if self._file is None:
+            return
+        self._file.close()
+        shard = self.shards[-1]
+        shard["entries"] = len(self._offsets)
+        shard["bytes"] = self._offset
+        if sys.byteorder == 'big':
+            self._offsets.byteswap()
+        with open(self.directory / shard["index"], 'wb') as f:
+            self._offsets.tofile(f)
+        self._file = None
+        self._offsets = array('Q')
+        self._offset = 0
+
+    def close(self) -> List[Dict[str, Any]]:
+        self._close_shard()
+        return self.shards
+
+
+def _write_shards(source_path: Path, array_key: str, directory: Path,
+                  shard_bytes: int) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """
+    Stream a source document into shard files.
+
+    Returns:
+        (header, shards): the document's other top-level keys and the shard list
+    """
+    header: Dict[str, Any] = {}
+    writer = _ShardWriter(directory, shard_bytes)
+    with open(source_path, 'r', encoding='utf-8') as f:
+        scanner = DocumentScanner(f)
+        scanner.expect('{')
+        while scanner.peek(' \t\r\n,') not in ('}', ''):
+            key, _ = scanner.decode()
+            scanner.expect(':')
+            if key != array_key or scanner.peek() != '[':
+                header[key], _ = scanner.decode()
+                continue
+
+            scanner.expect('[')
+            while scanner.peek(' \t\r\n,') not in (']', ''):
+                _, text = scanner.decode()
+                # Newlines can only be whitespace between tokens in JSON text
+                if '\n' in text or '\r' in text:
+                    text = text.replace('\r', ' ').replace('\n', ' ')
+                writer.write(text.encode('utf-8'))
+            scanner.expect(']')
+    return header, writer.close()
+
+
+def convert_source(source_path: Path, array_key: str, checksum: Optional[str] = None,
+                   shard_bytes: int = NDJSON_SHARD_BYTES) -> bool:
+    """
+    Convert one source document to NDJSON shards unless they are up to date.
+
+    Args:
+        source_path: jmdict-simplified JSON file
+        array_key: Top-level key of the entry array (e.g. 'words')
+        checksum: MD5 of the source if already known
+        shard_bytes: Approximate size of one shard file
+
+    Returns:
+        True if the shards were (re)written, False if they were up to date
+    """
+    checksum = checksum or file_checksum(source_path)
+    target = shard_dir(source_path)
+    manifest_path = target / MANIFEST_NAME
+    stat = source_path.stat()
+
+    if manifest_path.exists():
+        try:
+            manifest = json.loads(manifest_path.read_text(encoding='utf-8'))
+        except (json.JSONDecodeError, IOError):
+            manifest = {}
+        if manifest.get("checksum") == checksum and manifest.get("version") == FORMAT_VERSION:
+            # Same content; only refresh the stat fields readers validate against
+            if (manifest.get("size"), manifest.get("mtime_ns")) != (stat.st_size, stat.st_mtime_ns):
+                manifest["size"], manifest["mtime_ns"] = stat.st_size, stat.st_mtime_ns
+                manifest_path.write_text(json.dumps(manifest, ensure_ascii=False), encoding='utf-8')
+            return False
+
+    staging = target.with_name(target.name + ".tmp")
+    shutil.rmtree(staging, ignore_errors=True)
+    staging.mkdir(parents=True)
+
+    header, shards = _write_shards(source_path, array_key, staging, shard_bytes)
+    manifest = {
+        "version": FORMAT_VERSION,
+        "source": source_path.name,
+        "checksum": checksum,
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "array_key": array_key,
+        "entries": sum(shard["entries"] for shard in shards),
+        "header": header,
+        "shards": shards,
+    }
+    # The manifest is written last; a directory without one is never used
+    (staging / MANIFEST_NAME).write_text(json.dumps(manifest, ensure_ascii=False), encoding='utf-8')
+
+    shutil.rmtree(target, ignore_errors=True)
+    os.replace(staging, target)
+    return True
+
+
+def convert_sources(source_dir: Path, checksums: Optional[Dict[str, str]] = None) -> int:
+    """
+    Convert every source in SHARD_SOURCES that exists under source_dir.
+
+    Args:
+        source_dir: Root of the source files
+        checksums: Known MD5 checksums by path relative to source_dir, so
+            sources that were just hashed are not read twice
+
+    Returns:
+        Number of sources that were converted (0 if all were up to date)
+    """
+    print("Converting sources to NDJSON shards...", flush=True)
+    converted = 0
+    for rel_path, array_key in SHARD_SOURCES.items():
+        source_path = source_dir / rel_path
+        if not source_path.exists():
+            continue
+        if convert_source(source_path, array_key, (checksums or {}).get(rel_path)):
+            manifest = load_manifest(source_path)
+            print(f"  {rel_path}: {manifest['entries']} entries in "
+                  f"{len(manifest['shards'])} shards", flush=True)
+            converted += 1
+        else:
+            print(f"  {rel_path}: shards up to date", flush=True)
+    return converted
+
+
+# ========== Reading ==========
+
+def load_manifest(source_path: Path) -> Optional[Dict[str, Any]]:
+    """
+    Return the shard manifest of a source, or None if there are no usable shards.
+
+    Shards are only used while the source file has the size and modification
+    time recorded at conversion time.
+    """
+    manifest_path = shard_dir(source_path) / MANIFEST_NAME
+    try:
+        manifest = json.loads(manifest_path.read_text(encoding='utf-8'))
+        stat = source_path.stat()
+    except (OSError, json.JSONDecodeError):
+        return None
+    if manifest.get("version") != FORMAT_VERSION:
+        return None
+    if (manifest.get("size"), manifest.get("mtime_ns")) != (stat.st_size, stat.st_mtime_ns):
+        return None
+    return manifest
+
+
+def read_offsets(index_path: Path) -> array:
+    """Read the line offsets of one shard."""
+    offsets = array('Q')
+    offsets.frombytes(index_path.read_bytes())
+    if sys.byteorder == 'big':
+        offsets.byteswap()
+    return offsets
+
+
+def line_ranges(source_path: Path, manifest: Dict[str, Any],
+                range_bytes: int) -> List[Tuple[Path, int, int]]:
+    """
+    Split the shards of a source into byte ranges of about range_bytes.
+
+    Every range starts and ends at a line boundary.
+
+    Returns:
+        List of (shard file, start, end)
+    """
+    directory = shard_dir(source_path)
+    ranges = []
+    for shard in manifest["shards"]:
+        path = directory / shard["file"]
+        offsets = read_offsets(directory / shard["index"])
+        start = 0
+        for offset in offsets:
+            if offset - start >= range_bytes:
+                ranges.append((path, start, offset))
+                start = offset
+        if start < shard["bytes"]:
+            ranges.append((path, start, shard["bytes"]))
+    return ranges
+
+
+def iter_lines(path: Path, start: int, end: int) -> Iterator[Any]:
+    """Yield the parsed entries of a byte range of one shard file."""
+    with open(path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    for line in data.splitlines():
+        if line:
+            yield loads(line)
+
+
+def fetch_entry(source_path: Path, manifest: Dict[str, Any], position: int) -> Any:
+    """
+    Fetch a single entry by its position in the source array.
+
+    Reads only the index of the shard that holds it and one line.
+    """
+    counts = []
+    total = 0
+    for shard in manifest["shards"]:
+        total += shard["entries"]
+        counts.append(total)
+    if not 0 <= position < total:
+        raise IndexError(f"Entry {position} out of range ({total} entries)")
+
+    shard_no = bisect_right(counts, position)
+    shard = manifest["shards"][shard_no]
+    first = counts[shard_no - 1] if shard_no else 0
+    directory = shard_dir(source_path)
+    offset = read_offsets(directory / shard["index"])[position - first]
+    with open(directory / shard["file"], 'rb') as f:
+        f.seek(offset)
+        return loads(f.readline())
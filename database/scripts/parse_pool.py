@@ -0,0 +1,390 @@
+"""
+Multi-process parse stage for the async data processor.
+
+Splits a jmdict-simplified source file into byte-range shards at entry
+boundaries (or at line boundaries of its NDJSON shards, see ndjson_shards),
+parses and transforms each shard into row batches in a
+ProcessPoolExecutor and hands the batches back to the async writers.
+Parsing and transforms are CPU-bound, so this moves them off the event loop
+and past the GIL.
+
+For the shard kinds in WORKER_WRITE_KINDS the workers write their batches
+themselves, each over its own connection, and only hand back the side
+results: the rows carry pre-assigned ids (key_allocator), so no worker
+waits on another, and the stage's writes scale with the worker count
+instead of funnelling through the event loop.
+"""
+
+import asyncio
+import functools
+import json
+import multiprocessing.util
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import (AsyncIterator, Callable, Dict, FrozenSet, Iterator, List, NamedTuple, Optional, Set,
+                    Tuple)
+
+import asyncpg
+
+import load_metrics
+import ndjson_shards
+import stage_profiler
+from bulk_sink import RowBuffer, create_sink
+from load_checkpoint import LoadCheckpoint
+from entry_transform import EntryTransformer
+from source_scan import SourceSummary, scan_entry
+
+# Target shard size; more shards than workers keeps them evenly busy
+PARSE_SHARD_BYTES = int(os.getenv('PARSE_SHARD_BYTES', str(4 * 1024 * 1024)))
+
+_WHITESPACE = re.compile(r'[\s,]*')
+_DECODER = json.JSONDecoder()
+
+
+def available_cpus() -> int:
+    """Return the CPUs this process may use, honouring the cgroup (docker cpus) limit."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    try:
+        quota, period = Path('/sys/fs/cgroup/cpu.max').read_text().split()
+        if quota != 'max':
+            cpus = min(cpus, max(1, int(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+
+# Parser processes (default: the container's CPU limit)
+PARSE_WORKERS = int(os.getenv('PARSE_WORKERS', '0')) or available_cpus()
+
+# Shard kinds whose parse workers write their batches over their own connections
+WORKER_WRITE_KINDS = {kind.strip() for kind in os.getenv('WORKER_WRITE_KINDS', 'proper_noun').split(',')
+                      if kind.strip()}
+
+
+class ShardResult(NamedTuple):
+    """Rows and side results of one parsed shard."""
+    entries: int
+    batches: List[RowBuffer]
+    # Keys of all entries in the shard and of those that were written (see EntryTransformer.add_entry)
+    keys: List[str]
+    changed: List[str]
+    # (key, content hash or None) of the written example entries
+    example_hashes: List[Tuple[str, Optional[bytes]]]
+    # Deferred references of the written entries (see EntryTransformer.defer_references)
+    references: List[tuple]
+    # Row batches of the shard, also when a worker wrote them (and batches is empty)
+    batch_count: int = 0
+    # Per-table write counters (load_metrics) and connection time of a worker that wrote the batches
+    written: Optional[Dict[str, Dict[str, int]]] = None
+    db_seconds: float = 0.0
+
+
+def find_shards(path: Path, array_key: str, entry_key: str,
+                shard_bytes: int = PARSE_SHARD_BYTES) -> List[Tuple[int, int]]:
+    """
+    Split the top-level array of a JSON document into byte ranges.
+
+    Every range starts at the '{' of an entry (an object whose first key is
+    entry_key, directly after '[' or ',') and ends where the next range starts.
+
+    Args:
+        path: Source JSON file
+        array_key: Top-level key of the entry array (e.g. 'words')
+        entry_key: First key of every entry object (e.g. 'id')
+        shard_bytes: Approximate shard size
+
+    Returns:
+        List of (start, end) byte offsets
+    """
+    array_start = re.compile(rb'"' + array_key.encode() + rb'"\s*:\s*\[')
+    boundary = re.compile(rb'[\[,]\s*(\{\s*"' + entry_key.encode() + rb'"\s*:)')
+    size = path.stat().st_size
+    window = 1024 * 1024
+
+    def next_boundary(f, offset: int) -> Optional[int]:
+        while offset < size:
+            f.seek(offset)
+            chunk = f.read(window + 64)
+            match = boundary.search(chunk)
+            if match:
+                return offset + match.start(1)
+            offset += window
+        return None
+
+    with open(path, 'rb') as f:
+        offset = 0
+        match = None
+        while offset < size and not match:
+            f.seek(offset)
+            match = array_start.search(f.read(window + len(array_key) + 8))
+            if not match:
+                offset += window
+        if not match:
+            return []
+
+        starts = []
+        position = next_boundary(f, offset + match.end() - 1)
+        while position is not None:
+            starts.append(position)
+            position = next_boundary(f, position + shard_bytes)
+
+    return list(zip(starts, starts[1:] + [size]))
+
+
+def iter_entries(path: Path, start: int, end: int) -> Iterator[dict]:
+    """Yield the entry objects of one shard."""
+    with open(path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start).decode('utf-8')
+    pos = 0
+    while True:
+        pos = _WHITESPACE.match(data, pos).end()
+        if pos >= len(data) or data[pos] != '{':
+            return
+        entry, pos = _DECODER.raw_decode(data, pos)
+        yield entry
+
+
+# ========== Worker side ==========
+
+_transformer: Optional[EntryTransformer] = None
+# Connection settings of a writing pool (see ParsePool) and the worker's connection
+_writer: Optional[dict] = None
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_conn: Optional[asyncpg.Connection] = None
+
+
+def _init_worker(transformer: EntryTransformer, writer: Optional[dict] = None) -> None:
+    """Install the stage's transformer (and connection settings) in a worker process."""
+    global _transformer, _writer
+    _transformer = transformer
+    _writer = writer
+
+
+def _connection() -> asyncpg.Connection:
+    """Return the worker's connection, opened on first use and closed when the worker exits."""
+    global _loop, _conn
+    if _conn is None:
+        _loop = asyncio.new_event_loop()
+        _conn = _loop.run_until_complete(asyncpg.connect(**_writer['connect']))
+        multiprocessing.util.Finalize(None, _close_connection, exitpriority=10)
+    return _conn
+
+
+def _close_connection() -> None:
+    global _conn
+    if _conn is not None:
+        _loop.run_until_complete(_conn.close())
+        _loop.close()
+        _conn = None
+
+
+def _parse_shard(path: Path, start: int, end: int, kind: str, batch_size: int) -> ShardResult:
+    """Parse and transform one shard into row batches of batch_size entries."""
+    entries_in = ndjson_shards.iter_lines if path.suffix == '.ndjson' else iter_entries
+    transformer = _transformer
+    keys: List[str] = []
+    changed: List[str] = []
+    example_hashes: List[Tuple[str, bytes]] = []
+    references: List[tuple] = []
+
+    if kind not in ('vocabulary', 'proper_noun', 'example'):
+        raise ValueError(f"Unknown shard kind '{kind}'")
+
+    batches: List[RowBuffer] = []
+    out = RowBuffer()
+    entries = 0
+    in_batch = 0
+    for entry in entries_in(path, start, end):
+        change = transformer.add_entry(out, kind, entry)
+        if change:
+            keys.append(change.key)
+            if change.changed:
+                changed.append(change.key)
+                if kind == 'example':
+                    example_hashes.append((change.key, change.content_hash))
+                references.extend(change.references)
+        entries += 1
+        in_batch += 1
+        if in_batch >= batch_size:
+            if len(out) or out.replaced:
+                batches.append(out)
+            out = RowBuffer()
+            in_batch = 0
+    if len(out) or out.replaced:
+        batches.append(out)
+
+    return ShardResult(entries, batches, keys, changed, example_hashes, references,
+                       batch_count=len(batches))
+
+
+async def _write_batches(conn: asyncpg.Connection, kind: str, shard_no: int, batches: List[RowBuffer],
+                         committed: FrozenSet[int]) -> None:
+    """Write each batch in its own transaction, like AsyncJLPTDataProcessor.write_rows."""
+    schema = _writer['schema']
+    checkpoint = LoadCheckpoint(schema) if _writer['checkpoint'] else None
+    for batch_no, rows in enumerate(batches):
+        if batch_no in committed:
+            continue
+        async with conn.transaction():
+            sink = create_sink(conn, schema)
+            sink.merge(rows)
+            await sink.flush()
+            if checkpoint:
+                await checkpoint.mark_batch(conn, kind, shard_no, batch_no)
+
+
+def _write_shard(path: Path, start: int, end: int, kind: str, batch_size: int,
+                 shard_no: int, committed: FrozenSet[int]) -> ShardResult:
+    """
+    Parse one shard and write its batches over the worker's connection.
+
+    Batches in committed (already in the database) are parsed for their side
+    results but not written again.
+    """
+    result = _parse_shard(path, start, end, kind, batch_size)
+    conn = _connection()
+    started = time.perf_counter()
+    # The sinks report their writes to load_metrics; collect them here for the event loop side
+    with load_metrics.collect() as metrics:
+        _loop.run_until_complete(_write_batches(conn, kind, shard_no, result.batches, committed))
+    stage = metrics.stages.get(load_metrics.current_stage())
+    return result._replace(batches=[], written=stage.tables if stage else {},
+                           db_seconds=time.perf_counter() - started)
+
+
+def _scan_shard(path: Path, start: int, end: int, kind: str) -> SourceSummary:
+    """Summarize one shard for the pre-pass."""
+    entries_in = ndjson_shards.iter_lines if path.suffix == '.ndjson' else iter_entries
+    summary = SourceSummary()
+    for entry in entries_in(path, start, end):
+        scan_entry(summary, entry, kind)
+    return summary
+
+
+# ========== Event loop side ==========
+
+class ParsePool:
+    """Process pool that turns source shards into row batches for one stage."""
+
+    def __init__(self, transformer: EntryTransformer, workers: int = PARSE_WORKERS,
+                 writer: Optional[dict] = None):
+        """
+        Initialize the pool.
+
+        Args:
+            transformer: Transformer (with the stage's lookup data) copied into every worker
+            workers: Number of parser processes
+            writer: When given, the workers write the batches parse() produces themselves:
+                {'connect': asyncpg.connect() arguments, 'schema': target schema,
+                 'checkpoint': whether to record committed batches}
+        """
+        self.workers = max(1, workers)
+        self.writes = writer is not None
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers, initializer=_init_worker, initargs=(transformer, writer)
+        )
+
+    def close(self) -> None:
+        """Shut the worker processes down."""
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    async def _map_shards(self, path: Path, array_key: str, entry_key: str,
+                          fn, *args, skip: Optional[Set[int]] = None,
+                          shard_args: Optional[Callable[[int], tuple]] = None
+                          ) -> AsyncIterator[Tuple[int, object]]:
+        """
+        Run fn(shard_path, start, end, *args) for every shard of a source.
+
+        Yields (shard number, result) as shards complete. At most two shards
+        per worker are in flight, so finished results cannot pile up faster
+        than the caller consumes them. Shard numbers in skip are not run;
+        shard_args(shard number) returns further arguments for a shard.
+        """
+        loop = asyncio.get_running_loop()
+        stage = load_metrics.current_stage()
+        if stage_profiler.profiling(stage):
+            fn = functools.partial(stage_profiler.worker_call, stage, fn)
+        manifest = ndjson_shards.load_manifest(path)
+        if manifest and manifest['array_key'] == array_key:
+            shards = await loop.run_in_executor(None, ndjson_shards.line_ranges,
+                                                path, manifest, PARSE_SHARD_BYTES)
+        else:
+            shards = [(path, start, end) for start, end in
+                      await loop.run_in_executor(None, find_shards, path, array_key, entry_key)]
+        todo = [shard_no for shard_no in range(len(shards)) if not skip or shard_no not in skip]
+        pending = {}
+        next_shard = 0
+        try:
+            while next_shard < len(todo) or pending:
+                while next_shard < len(todo) and len(pending) < self.workers * 2:
+                    shard_path, start, end = shards[todo[next_shard]]
+                    extra = shard_args(todo[next_shard]) if shard_args else ()
+                    future = loop.run_in_executor(self._executor, fn, shard_path, start, end, *args, *extra)
+                    pending[future] = todo[next_shard]
+                    next_shard += 1
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    yield pending.pop(future), future.result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+    async def parse(self, path: Path, array_key: str, kind: str, batch_size: int,
+                    entry_key: str = 'id', skip: Optional[Set[int]] = None,
+                    committed: Optional[Set[Tuple[int, int]]] = None
+                    ) -> AsyncIterator[Tuple[int, ShardResult]]:
+        """
+        Yield (shard number, parsed shard) as shards complete.
+
+        Shard numbers are stable for the same source file and settings, so
+        shards listed in skip (already loaded) can be left out. A writing
+        pool yields the shards with their batches written, leaving out the
+        (shard, batch) pairs in committed.
+        """
+        if self.writes:
+            committed = committed or set()
+
+            def shard_args(shard_no: int) -> tuple:
+                return (shard_no, frozenset(batch for shard, batch in committed if shard == shard_no))
+
+            shards = self._map_shards(path, array_key, entry_key, _write_shard, kind, batch_size,
+                                      skip=skip, shard_args=shard_args)
+        else:
+            shards = self._map_shards(path, array_key, entry_key, _parse_shard, kind, batch_size, skip=skip)
+        async for shard_no, result in shards:
+            yield shard_no, result
+
+    async def scan(self, path: Path, array_key: str, kind: str,
+                   entry_key: str = 'id') -> SourceSummary:
+        """
+        Summarize a source in one pass (see source_scan).
+
+        Shard summaries are merged in file order, so first-seen orders match
+        a sequential scan. Tag descriptions are taken from the NDJSON
+        manifest when the source has one.
+        """
+        parts = {}
+        async for shard_no, summary in self._map_shards(path, array_key, entry_key,
+                                                        _scan_shard, kind):
+            parts[shard_no] = summary
+
+        summary = SourceSummary()
+        for shard_no in sorted(parts):
+            summary.merge(parts[shard_no])
+        manifest = ndjson_shards.load_manifest(path)
+        if manifest:
+            summary.tag_descriptions.update(manifest['header'].get('tags', {}))
+        return summary
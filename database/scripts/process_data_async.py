@@ -4,38 +4,42 @@
 import os
 import sys
 import asyncio
+import concurrent.futures
+import contextlib
+import contextvars
+import json
 import tempfile
+import threading
+import time
+import uuid
 from pathlib import Path
-from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
-from collections import defaultdict
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
 
 import ijson
 import asyncpg
 
-try:
-    import orjson
-    def json_dumps(obj): return orjson.dumps(obj).decode()
-    def json_loads(data): return orjson.loads(data)
-except ImportError:
-    import json
-    def json_dumps(obj): return json.dumps(obj)
-    def json_loads(data): return json.loads(data)
-
+import delta_load
+import key_allocator
+import load_metrics
+import load_profile
+from load_checkpoint import LoadCheckpoint
+import ndjson_shards
+import radical_groups
+from bulk_sink import RowBuffer, create_sink, update_references
 from cache_manager import DiskBackedCache
-from spillable_list import SpillableList
+from entry_transform import EntryTransformer
+from parse_pool import PARSE_WORKERS, WORKER_WRITE_KINDS, ParsePool, ShardResult
+from source_header import read_header
+from source_scan import SourceSummary
+import sql_profiler
+import stage_profiler
+from stage_graph import StageGraph
 
 # Configuration
 BATCH_SIZE = int(os.getenv('BATCH_SIZE', '2000'))
 MAX_CONCURRENT = int(os.getenv('MAX_CONCURRENT', '8'))
 CACHE_DIR = os.getenv('CACHE_DIR', tempfile.gettempdir())
 
-# Language code normalization
-LANGUAGE_MAP = {
-    'en': 'eng', 'de': 'ger', 'ru': 'rus', 'hu': 'hun',
-    'nl': 'dut', 'es': 'spa', 'fr': 'fre', 'sv': 'swe',
-    'sl': 'slv', 'pt': 'por', 'it': 'ita', 'ja': 'jpn'
-}
-
 
 def safe_print(text: str) -> None:
     """Safely print text that may contain Unicode characters."""
@@ -45,55 +49,98 @@ def safe_print(text: str) -> None:
         print(str(text).encode('ascii', 'replace').decode('ascii'), flush=True)
 
 
+class MeteredQueue(asyncio.Queue):
+    """Bounded batch queue that counts the time spent waiting on it (see load_metrics)."""
+    
+    async def put(self, item: Any) -> None:
+        with load_metrics.timed('queue_wait'):
+            await super().put(item)
+    
+    async def get(self) -> Any:
+        with load_metrics.timed('writer_idle'):
+            return await super().get()
+
+
 class AsyncJLPTDataProcessor:
     """Async data processor with memory and speed optimizations."""
     
-    def __init__(self):
+    def __init__(self, delta: bool = False, schema: str = 'jlpt',
+                 checkpoint: Optional[LoadCheckpoint] = None):
+        """
+        Initialize the processor.
+
+        Args:
+            delta: Apply only changed entries to a loaded database (see delta_load)
+            schema: Schema the data is loaded into (see shadow_schema)
+            checkpoint: Progress of the load to record and resume from (see load_checkpoint)
+        """
         self.script_dir = Path(__file__).parent
         self.project_root = self.script_dir.parent
-        self.source_dir = self.project_root / "source"
+        self.source_dir = Path(os.getenv('JMDICT_SOURCE_DIR', self.project_root / "source"))
         
         # Database pool
         self.pool: Optional[asyncpg.Pool] = None
+        self.schema = schema
+        self.checkpoint = checkpoint
         
         # JLPT mappings (kept in memory - small enough)
         self.kanji_jlpt_mapping: Dict[str, dict] = {}
         self.vocabulary_jlpt_mapping: Dict[Tuple[str, str], int] = {}
         
         # ID caches (kept in memory for fast lookup)
-        self.kanji_cache: Dict[str, int] = {}
+        self.kanji_cache: Dict[str, uuid.UUID] = {}
         self.radical_cache: Dict[str, int] = {}
-        self.vocabulary_cache: Dict[str, int] = {}
+        self.vocabulary_cache: Dict[str, uuid.UUID] = {}
         self.tag_cache: set = set()
         
         # Disk-backed caches for large data
         self.vocab_furigana_cache: Optional[DiskBackedCache] = None
         self.proper_noun_furigana_cache: Optional[DiskBackedCache] = None
         
-        # Spillable lists for pending relations
-        self.pending_vocab_relations = SpillableList(threshold=50000)
-        self.pending_proper_noun_relations = SpillableList(threshold=50000)
-        
-        # Tag descriptions
-        self._tag_descriptions: Dict[str, str] = {}
-        
-        # Semaphore for concurrent batch processing
-        self.semaphore = asyncio.Semaphore(MAX_CONCURRENT)
+        # Pre-pass summaries of the words sources, by kind
+        self.source_summaries: Dict[str, SourceSummary] = {}
+        
+        # Entry -> row transforms (created once the mappings are loaded)
+        self.transformer: Optional[EntryTransformer] = None
+        
+        # Delta loads: entry kind -> {'inserted', 'updated', 'deleted', 'unchanged'} counts
+        self.delta = delta
+        self.delta_stats: Dict[str, Dict[str, int]] = {}
+
+    def connect_settings(self) -> Dict[str, Any]:
+        """Return the asyncpg connection arguments of the processor's sessions."""
+        return {
+            'host': os.getenv('POSTGRES_HOST', 'localhost'),
+            'port': int(os.getenv('POSTGRES_PORT', '5432')),
+            'database': os.getenv('POSTGRES_DB', 'jlptreference'),
+            'user': os.getenv('POSTGRES_USER', 'jlptuser'),
+            'password': os.getenv('POSTGRES_PASSWORD', 'jlptpassword'),
+            'command_timeout': 300,
+            'server_settings': {**load_profile.session_settings(), **sql_profiler.session_settings()},
+        }
 
     async def init_pool(self) -> None:
         """Initialize the asyncpg connection pool."""
         self.pool = await asyncpg.create_pool(
-            host=os.getenv('POSTGRES_HOST', 'localhost'),
-            port=int(os.getenv('POSTGRES_PORT', '5432')),
-            database=os.getenv('POSTGRES_DB', 'jlptreference'),
-            user=os.getenv('POSTGRES_USER', 'jlptuser'),
-            password=os.getenv('POSTGRES_PASSWORD', 'jlptpassword'),
+            **self.connect_settings(),
             min_size=2,
             max_size=MAX_CONCURRENT + 2,
-            command_timeout=300
+            connection_class=sql_profiler.connection_class()
         )
         safe_print(f"Database pool initialized (size: 2-{MAX_CONCURRENT + 2})")
 
+    @contextlib.asynccontextmanager
+    async def acquire(self) -> AsyncIterator[asyncpg.Connection]:
+        """Acquire a pool connection, counting the wait and the time it is held (see load_metrics)."""
+        started = time.perf_counter()
+        async with self.pool.acquire() as conn:
+            acquired = time.perf_counter()
+            load_metrics.add_time('acquire_wait', acquired - started)
+            try:
+                yield conn
+            finally:
+                load_metrics.add_time('db', time.perf_counter() - acquired)
+
     async def close_pool(self) -> None:
         """Close the connection pool."""
         if self.pool:
@@ -101,33 +148,92 @@ class AsyncJLPTDataProcessor:
     
     def _normalize_radical_char(self, char: str) -> str:
         """Normalize look-alike radical characters."""
-        norm_map = {
-            '｜': '丨', '|': '丨', 'ノ': '丿', 'ハ': '八',
-            'ト': '卜', 'ヨ': '彐', 'ユ': '彐', 'マ': '龴', 'ム': '厶'
-        }
-        return norm_map.get(char, char)
+        return radical_groups.normalize(char)
 
-    # ========== Streaming Batch Generator ==========
+    # ========== Batch Pipeline ==========
     
-    def stream_batches(self, file_path: Path, json_path: str) -> AsyncIterator[List[dict]]:
+    async def stream_batches(self, file_path: Path, json_path: str, queue: asyncio.Queue) -> int:
         """
-        Generator that streams batches from JSON file without buffering all.
+        Parse a JSON file in a thread and put (batch number, batch) items of
+        BATCH_SIZE entries on a bounded queue.
+        
+        The parser thread blocks while the queue is full, so no more than the
+        queued batches are ever held in memory.
         
-        This is the key memory optimization - we never hold more than
-        BATCH_SIZE items in memory at once.
+        Returns:
+            Number of parsed items
         """
-        async def _generator():
+        loop = asyncio.get_running_loop()
+        stop = threading.Event()
+        
+        def put(batch_no: int, batch: List[dict]) -> bool:
+            future = asyncio.run_coroutine_threadsafe(queue.put((batch_no, batch)), loop)
+            while True:
+                try:
+                    future.result(timeout=0.5)
+                    return True
+                except concurrent.futures.TimeoutError:
+                    if stop.is_set():
+                        future.cancel()
+                        return False
+        
+        def parse() -> int:
+            count = 0
+            batch_no = 0
             with open(file_path, 'rb') as f:
-                items = ijson.items(f, json_path)
                 batch = []
-                for item in items:
+                for item in ijson.items(f, json_path):
                     batch.append(item)
+                    count += 1
                     if len(batch) >= BATCH_SIZE:
-                        yield batch
+                        if not put(batch_no, batch):
+                            return count
                         batch = []
+                        batch_no += 1
                 if batch:
-                    yield batch
-        return _generator()
+                    put(batch_no, batch)
+            return count
+        
+        try:
+            # The parser thread reports queue waits to the calling stage
+            return await loop.run_in_executor(None, contextvars.copy_context().run, parse)
+        finally:
+            stop.set()
+    
+    async def run_pipeline(self, produce: Callable[[asyncio.Queue], Awaitable[Any]],
+                           write: Callable[[Any], Awaitable[Any]]) -> None:
+        """
+        Connect a producer to MAX_CONCURRENT writer coroutines through a bounded queue.
+        
+        At most MAX_CONCURRENT batches wait in the queue and one is held by
+        each writer, so peak memory is about 2 x MAX_CONCURRENT x BATCH_SIZE
+        entries regardless of the source size.
+        
+        Args:
+            produce: Coroutine function that puts batches on the queue until the source is exhausted
+            write: Coroutine function that stores one batch
+        """
+        queue: asyncio.Queue = MeteredQueue(maxsize=MAX_CONCURRENT)
+        
+        async def producer() -> None:
+            await produce(queue)
+            for _ in range(MAX_CONCURRENT):
+                await queue.put(None)
+        
+        async def writer() -> None:
+            while (batch := await queue.get()) is not None:
+                await write(batch)
+        
+        tasks = [asyncio.create_task(producer())]
+        tasks += [asyncio.create_task(writer()) for _ in range(MAX_CONCURRENT)]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            # A failed writer must not leave the producer blocked on a full queue
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
 
     # ========== JLPT Mappings (small, kept in memory) ==========
     
@@ -205,210 +311,309 @@ class AsyncJLPTDataProcessor:
                         count += 1
             safe_print(f"Loaded {count} proper noun furigana entries to disk cache")
 
-    # ========== Tag Pre-population ==========
+    def create_transformer(self) -> None:
+        """Create the entry transformer from the loaded mappings and caches."""
+        furigana_paths = {}
+        for entity_type, cache in (('vocabulary', self.vocab_furigana_cache),
+                                   ('proper_noun', self.proper_noun_furigana_cache)):
+            if cache:
+                cache.flush()
+                furigana_paths[entity_type] = cache.db_path
+        
+        self.transformer = EntryTransformer(self.kanji_jlpt_mapping, self.vocabulary_jlpt_mapping,
+                                            furigana_paths)
+        # Shared with the processor so lookups see entries as they are loaded
+        self.transformer.kanji_cache = self.kanji_cache
+        # Without the bulk-load profile foreign keys are checked, and relation
+        # targets may be written by a later batch
+        self.transformer.defer_references = not load_profile.active()
+
+    # ========== Source Pre-pass ==========
     
-    def _load_tag_descriptions(self) -> None:
-        """Load tag descriptions from JSON source files."""
-        json_files = [
-            self.source_dir / 'vocabulary' / 'source.json',
-            self.source_dir / 'vocabulary' / 'vocabularyWithExamples' / 'source.json',
-            self.source_dir / 'names' / 'source.json'
+    def _words_sources(self) -> List[Tuple[str, Path]]:
+        """Return (kind, path) of the jmdict-simplified words sources."""
+        return [
+            ('vocabulary', self.source_dir / 'vocabulary' / 'source.json'),
+            ('example', self.source_dir / 'vocabulary' / 'vocabularyWithExamples' / 'source.json'),
+            ('proper_noun', self.source_dir / 'names' / 'source.json'),
         ]
+    
+    def _load_tag_descriptions(self, json_file: Path) -> Dict[str, str]:
+        """Load tag descriptions from the header of a JSON source file."""
+        try:
+            return read_header(json_file, ('tags',)).get('tags', {})
+        except Exception as e:
+            safe_print(f"Error loading tags from {json_file}: {e}")
+            return {}
+    
+    async def scan_sources(self) -> None:
+        """
+        Summarize every words source in a single pass before loading.
         
-        for json_file in json_files:
-            if json_file.exists():
-                try:
-                    with open(json_file, 'rb') as f:
-                        for tag_code, description in ijson.kvitems(f, 'tags'):
-                            self._tag_descriptions[tag_code] = description
-                except Exception as e:
-                    safe_print(f"Error loading tags from {json_file}: {e}")
-        
-        safe_print(f"Loaded {len(self._tag_descriptions)} tag descriptions")
+        The summaries provide the tags to pre-populate, the primary kanji
+        counts the transformer derives slugs from, the term index and sense
+        counts it resolves relations against and the entry totals for
+        progress output. The examples file is not scanned; its entry count and
+        tag descriptions come from the NDJSON manifest when there is one.
+        """
+        safe_print("Scanning sources...")
+        with ParsePool(self.transformer) as parse_pool:
+            for kind, path in self._words_sources():
+                if not path.exists():
+                    continue
+                if kind == 'example':
+                    # Examples only add descriptions and a total; both are in the manifest
+                    summary = SourceSummary()
+                    manifest = ndjson_shards.load_manifest(path)
+                    if manifest:
+                        summary.entries = manifest['entries']
+                        summary.tag_descriptions = dict(manifest['header'].get('tags', {}))
+                else:
+                    summary = await parse_pool.scan(path, 'words', kind)
+                if not summary.tag_descriptions:
+                    summary.tag_descriptions = self._load_tag_descriptions(path)
+                self.source_summaries[kind] = summary
+                safe_print(f"  {path.relative_to(self.source_dir)}: {summary.entries} entries, "
+                           f"{len(summary.tags)} tags")
+        
+        entry_kinds = [kind for kind in ('vocabulary', 'proper_noun') if kind in self.source_summaries]
+        self.transformer.primary_kanji_counts = {
+            kind: self.source_summaries[kind].primary_kanji_counts for kind in entry_kinds
+        }
+        self.transformer.terms = {kind: self.source_summaries[kind].terms for kind in entry_kinds}
+        if 'vocabulary' in self.source_summaries:
+            self.transformer.vocabulary_sense_counts = self.source_summaries['vocabulary'].sense_counts
 
     async def pre_populate_tags(self) -> None:
         """Pre-populate all tags to avoid race conditions."""
         safe_print("Pre-populating tag table...")
         
-        self._load_tag_descriptions()
-        # Use dict to track categories and sources per tag
-        # {tag_code: {'categories': set(), 'sources': set()}}
-        all_tags: Dict[str, Dict[str, set]] = {}
-        
-        def add_tag(tag: str, category: str, source: str) -> None:
-            if tag not in all_tags:
-                all_tags[tag] = {'categories': set(), 'sources': set()}
-            all_tags[tag]['categories'].add(category)
-            all_tags[tag]['sources'].add(source)
-        
-        # Scan vocabulary file
-        vocab_path = self.source_dir / "vocabulary" / "source.json"
-        if vocab_path.exists():
-            with open(vocab_path, 'rb') as f:
-                for word in ijson.items(f, 'words.item'):
-                    for kanji in word.get('kanji', []):
-                        for tag in kanji.get('tags', []):
-                            add_tag(tag, 'kanji', 'vocabulary')
-                    for kana in word.get('kana', []):
-                        for tag in kana.get('tags', []):
-                            add_tag(tag, 'kana', 'vocabulary')
-                    for sense in word.get('sense', []):
-                        for tag in sense.get('partOfSpeech', []):
-                            add_tag(tag, 'part_of_speech', 'vocabulary')
-                        for tag in sense.get('field', []):
-                            add_tag(tag, 'field', 'vocabulary')
-                        for tag in sense.get('dialect', []):
-                            add_tag(tag, 'dialect', 'vocabulary')
-                        for tag in sense.get('misc', []):
-                            add_tag(tag, 'misc', 'vocabulary')
-        
-        # Scan names file
-        names_path = self.source_dir / "names" / "source.json"
-        if names_path.exists():
-            with open(names_path, 'rb') as f:
-                for name in ijson.items(f, 'words.item'):
-                    for kanji in name.get('kanji', []):
-                        for tag in kanji.get('tags', []):
-                            add_tag(tag, 'proper_noun', 'proper-noun')
-                    for kana in name.get('kana', []):
-                        for tag in kana.get('tags', []):
-                            add_tag(tag, 'proper_noun', 'proper-noun')
-                    for trans in name.get('translation', []):
-                        for tag in trans.get('type', []):
-                            add_tag(tag, 'translation_type', 'proper-noun')
-        
-        safe_print(f"Found {len(all_tags)} unique tags")
+        descriptions: Dict[str, str] = {}
+        all_tags = SourceSummary()
+        for summary in self.source_summaries.values():
+            descriptions.update(summary.tag_descriptions)
+            all_tags.merge(summary)
+        safe_print(f"Loaded {len(descriptions)} tag descriptions")
+        safe_print(f"Found {len(all_tags.tags)} unique tags")
         
         # Insert all tags with source array
-        async with self.pool.acquire() as conn:
+        async with self.acquire() as conn:
             records = [
-                (code, self._tag_descriptions.get(code, f'{list(data["categories"])[0]} tag'), 
-                 list(data['categories'])[0], list(data['sources']))
-                for code, data in all_tags.items()
+                (code, descriptions.get(code, f'{next(iter(categories))} tag'),
+                 next(iter(categories)), list(sources))
+                for code, (categories, sources) in all_tags.tags.items()
             ]
-            await conn.executemany('''
-                INSERT INTO jlpt.tag (code, description, category, source)
+            await conn.executemany(f'''
+                INSERT INTO {self.schema}.tag (code, description, category, source)
                 VALUES ($1, $2, $3, $4)
                 ON CONFLICT (code) DO UPDATE SET source = EXCLUDED.source
             ''', records)
             
-            self.tag_cache = set(all_tags.keys())
+            self.tag_cache = set(all_tags.tags)
         
         safe_print("Tag pre-population complete")
 
-    # ========== Kanji Processing ==========
+    # ========== Row Writing ==========
     
-    async def process_kanji_batch(self, batch: List[dict]) -> int:
-        """Process a batch of kanji with optimized inserts."""
-        async with self.semaphore:
-            async with self.pool.acquire() as conn:
-                async with conn.transaction():
-                    for char_data in batch:
-                        character = char_data.get('literal', '')
-                        if not character:
-                            continue
-                        
-                        misc = char_data.get('misc', {})
-                        jlpt_old = None
-                        jlpt_new = None
-                        if character in self.kanji_jlpt_mapping:
-                            jlpt_old = self.kanji_jlpt_mapping[character]['jlpt_old']
-                            jlpt_new = self.kanji_jlpt_mapping[character]['jlpt_new']
-                        
-                        stroke_count = misc.get('strokeCounts', [0])[0] if misc.get('strokeCounts') else 0
-                        
-                        # Insert kanji
-                        kanji_id = await conn.fetchval('''
-                            INSERT INTO jlpt.kanji (
-                                literal, grade, stroke_count, frequency, jlpt_level_old, jlpt_level_new
-                            ) VALUES ($1, $2, $3, $4, $5, $6)
-                            ON CONFLICT (literal) DO UPDATE SET
-                                grade = EXCLUDED.grade, stroke_count = EXCLUDED.stroke_count,
-                                frequency = EXCLUDED.frequency, jlpt_level_old = EXCLUDED.jlpt_level_old,
-                                jlpt_level_new = EXCLUDED.jlpt_level_new, updated_at = CURRENT_TIMESTAMP
-                            RETURNING id
-                        ''', character, misc.get('grade'), stroke_count, 
-                            misc.get('frequency'), jlpt_old, jlpt_new)
-                        
-                        self.kanji_cache[character] = kanji_id
-                        
-                        # Process sub-items
-                        await self._process_kanji_subitems(conn, char_data, kanji_id)
-                
-                return len(batch)
+    async def write_rows(self, rows: RowBuffer, batch_key: Optional[Tuple[str, int, int]] = None) -> int:
+        """
+        Write one batch of transformed rows in its own transaction.
+        
+        Args:
+            rows: Transformed rows
+            batch_key: (stage, shard, batch) recorded with the rows when checkpointing
+        """
+        async with self.acquire() as conn:
+            async with conn.transaction():
+                sink = create_sink(conn, self.schema)
+                sink.merge(rows)
+                await sink.flush()
+                if self.checkpoint and batch_key:
+                    await self.checkpoint.mark_batch(conn, *batch_key)
+            return len(rows)
     
-    async def _process_kanji_subitems(self, conn, char_data: dict, kanji_id: int) -> None:
-        """Process kanji sub-items (codepoints, readings, meanings, etc.)."""
-        # Codepoints
-        codepoints = [(kanji_id, cp.get('type', ''), cp.get('value', ''))
-                      for cp in char_data.get('codepoints', [])]
-        if codepoints:
-            await conn.executemany('''
-                INSERT INTO jlpt.kanji_codepoint (kanji_id, type, value)
-                VALUES ($1, $2, $3) ON CONFLICT DO NOTHING
-            ''', codepoints)
-        
-        # Dictionary references
-        dict_refs = []
-        for ref in char_data.get('dictionaryReferences', []):
-            morohashi = ref.get('morohashi') or {}
-            dict_refs.append((
-                kanji_id, ref.get('type', ''), ref.get('value', ''),
-                morohashi.get('volume'), morohashi.get('page')
-            ))
-        if dict_refs:
-            await conn.executemany('''
-                INSERT INTO jlpt.kanji_dictionary_reference (
-                    kanji_id, type, value, morohashi_volume, morohashi_page
-                ) VALUES ($1, $2, $3, $4, $5) ON CONFLICT DO NOTHING
-            ''', dict_refs)
-        
-        # Query codes
-        query_codes = [(kanji_id, qc.get('type', ''), qc.get('value', ''), 
-                        qc.get('skipMisclassification'))
-                       for qc in char_data.get('queryCodes', [])]
-        if query_codes:
-            await conn.executemany('''
-                INSERT INTO jlpt.kanji_query_code (kanji_id, type, value, skip_missclassification)
-                VALUES ($1, $2, $3, $4) ON CONFLICT DO NOTHING
-            ''', query_codes)
-        
-        # Readings and meanings
-        reading_meaning = char_data.get('readingMeaning', {})
-        if reading_meaning and 'groups' in reading_meaning:
-            readings = []
-            meanings = []
-            for group in reading_meaning['groups']:
-                for r in group.get('readings', []):
-                    readings.append((kanji_id, r.get('type', ''), r.get('value', ''),
-                                    r.get('status'), r.get('onType')))
-                for m in group.get('meanings', []):
-                    meanings.append((kanji_id, LANGUAGE_MAP.get(m.get('lang', '')), m.get('value', '')))
-            
-            if readings:
-                await conn.executemany('''
-                    INSERT INTO jlpt.kanji_reading (kanji_id, type, value, status, on_type)
-                    VALUES ($1, $2, $3, $4, $5) ON CONFLICT DO NOTHING
-                ''', readings)
-            if meanings:
-                await conn.executemany('''
-                    INSERT INTO jlpt.kanji_meaning (kanji_id, lang, value)
-                    VALUES ($1, $2, $3) ON CONFLICT DO NOTHING
-                ''', meanings)
-        
-        # Nanori
-        if reading_meaning and 'nanori' in reading_meaning:
-            nanoris = []
-            for nanori in reading_meaning['nanori']:
-                nanoris.append((kanji_id, nanori))
-            if nanoris:
-                await conn.executemany('''
-                    INSERT INTO jlpt.kanji_nanori (kanji_id, value)
-                    VALUES ($1, $2) ON CONFLICT DO NOTHING
-                ''', nanoris)
+    # ========== Checkpoints ==========
+    
+    def stage_done(self, stage: str) -> bool:
+        """Return True (and say so) if a resumed load already finished a stage."""
+        if self.checkpoint and self.checkpoint.stage_done(stage):
+            safe_print(f"Stage '{stage}' already loaded, skipping")
+            return True
+        return False
+    
+    async def mark_stage(self, stage: str, conn=None) -> None:
+        """Record a finished stage, in conn's transaction if given."""
+        if not self.checkpoint:
+            return
+        if conn is not None:
+            await self.checkpoint.mark_stage(conn, stage)
+            return
+        async with self.acquire() as conn:
+            await self.checkpoint.mark_stage(conn, stage)
+    
+    # ========== Delta Loads ==========
+    
+    async def load_stored_hashes(self, kind: str) -> Dict[str, bytes]:
+        """
+        Hand the stored content hashes of an entry kind to the transformer.
+        
+        Does nothing for full loads, which write every entry.
+        """
+        if not self.delta:
+            return {}
+        async with self.acquire() as conn:
+            rows = await conn.fetch(delta_load.STORED_HASH_QUERIES[kind].format(schema=self.schema))
+        stored = {row['key']: row['content_hash'] for row in rows}
+        self.transformer.stored_hashes[kind] = stored
+        return stored
+    
+    async def finish_delta(self, kind: str, seen: set, changed: List[str]) -> List[str]:
+        """
+        Delete the stored entries of a kind that are no longer in the source.
+        
+        Args:
+            kind: Entry kind (see delta_load.STORED_HASH_QUERIES)
+            seen: Keys of every entry in the source
+            changed: Keys of the entries that were written
+        
+        Returns:
+            Keys of the deleted entries
+        """
+        stored = self.transformer.stored_hashes.pop(kind, None)
+        if stored is None:
+            return []
+        deleted = [key for key in stored if key not in seen]
+        if deleted:
+            async with self.acquire() as conn:
+                await conn.execute(delta_load.DELETE_STATEMENTS[kind].format(schema=self.schema), deleted)
+        
+        updated = sum(1 for key in changed if key in stored)
+        self.delta_stats[kind] = {
+            'inserted': len(changed) - updated,
+            'updated': updated,
+            'deleted': len(deleted),
+            'unchanged': len(seen) - len(changed),
+        }
+        return deleted
+    
+    async def _write_parsed_source(self, path: Path, kind: str, label: str,
+                                   on_result=None) -> int:
+        """
+        Parse a words source in worker processes and write its row batches.
+        
+        Args:
+            path: jmdict-simplified source file
+            kind: Shard kind handled by the workers ('vocabulary', 'example', 'proper_noun')
+            label: Name used in progress output
+            on_result: Optional callback receiving every ShardResult
+        
+        Returns:
+            Number of parsed entries
+        """
+        await self.load_stored_hashes(kind)
+        seen = set()
+        changed: List[str] = []
+        references: List[tuple] = []
+        summary = self.source_summaries.get(kind)
+        total = summary.entries if summary else 0
+        started = time.perf_counter()
+        completed = 0
+        
+        def take(result: ShardResult) -> None:
+            nonlocal completed
+            if on_result:
+                on_result(result)
+            seen.update(result.keys)
+            changed.extend(result.changed)
+            references.extend(result.references)
+            completed += result.entries
+        
+        # Shards whose batches are all committed are replayed from their saved side results
+        committed = self.checkpoint.committed(kind) if self.checkpoint else set()
+        replayed = set()
+        if self.checkpoint:
+            for shard_no, (batch_count, result) in self.checkpoint.saved_shards(kind).items():
+                if all((shard_no, batch_no) in committed for batch_no in range(batch_count)):
+                    take(result)
+                    replayed.add(shard_no)
+            if replayed:
+                safe_print(f"{label}: resuming after {len(replayed)} loaded shards ({completed} entries)")
+        
+        # Parse workers write these kinds themselves, each over its own connection
+        writer = None
+        if kind in WORKER_WRITE_KINDS:
+            writer = {'connect': self.connect_settings(), 'schema': self.schema,
+                      'checkpoint': self.checkpoint is not None}
+        
+        async def produce(queue: asyncio.Queue) -> None:
+            with ParsePool(self.transformer.for_kind(kind), writer=writer) as parse_pool:
+                waiting = time.perf_counter()
+                async for shard_no, result in parse_pool.parse(path, 'words', kind, BATCH_SIZE,
+                                                               skip=replayed, committed=committed):
+                    load_metrics.add_time('parse', time.perf_counter() - waiting)
+                    if self.checkpoint:
+                        self.checkpoint.save_shard(kind, shard_no, result.batch_count,
+                                                   result._replace(batches=[]))
+                    if result.written is not None:
+                        for table, counters in result.written.items():
+                            load_metrics.record_write(table, counters['rows'], counters['statements'],
+                                                      counters['bytes'])
+                        load_metrics.add_time('db', result.db_seconds)
+                    take(result)
+                    for batch_no, rows in enumerate(result.batches):
+                        if (shard_no, batch_no) not in committed:
+                            await queue.put((rows, (kind, shard_no, batch_no)))
+                    if total:
+                        elapsed = time.perf_counter() - started
+                        eta = elapsed / completed * (total - completed) if completed else 0
+                        safe_print(f"{label} progress: {completed}/{total} "
+                                   f"({completed * 100 // total}%, ETA {eta:.0f}s)")
+                    else:
+                        safe_print(f"{label} progress: {completed}")
+                    waiting = time.perf_counter()
+        
+        async def write(item: Tuple[RowBuffer, Tuple[str, int, int]]) -> None:
+            await self.write_rows(*item)
+        
+        await self.run_pipeline(produce, write)
+        if references:
+            # Every target is written now (see EntryTransformer.defer_references)
+            async with self.acquire() as conn:
+                await update_references(conn, self.schema, kind, references)
+            safe_print(f"{label}: wrote {len(references)} deferred references")
+        deleted = await self.finish_delta(kind, seen, changed)
+        if kind == 'vocabulary':
+            self.transformer.replaced_vocabulary = set(changed) | set(deleted)
+        return completed
+
+    # ========== Kanji Processing ==========
+    
+    async def process_kanji_batch(self, batch_no: int, batch: List[dict],
+                                  seen: set, changed: List[str]) -> int:
+        """
+        Process a batch of kanji with optimized inserts.
+        
+        Args:
+            batch_no: Position of the batch in the source
+            batch: Parsed kanji entries
+            seen: Receives the literals of all entries
+            changed: Receives the literals of the written entries
+        """
+        rows = RowBuffer()
+        with load_metrics.timed('parse'):
+            for char_data in batch:
+                change = self.transformer.add_entry(rows, 'kanji', char_data)
+                if change:
+                    self.kanji_cache[change.key] = key_allocator.kanji_id(change.key)
+                    seen.add(change.key)
+                    if change.changed:
+                        changed.append(change.key)
+        if not self.checkpoint or (0, batch_no) not in self.checkpoint.committed('kanji'):
+            await self.write_rows(rows, ('kanji', 0, batch_no))
+        return len(batch)
 
     async def process_kanji_data(self) -> None:
-        """Process all kanji data with streaming and bounded concurrency."""
+        """Process all kanji data through the bounded batch pipeline."""
         safe_print(f"Processing kanji data (batch={BATCH_SIZE}, concurrent={MAX_CONCURRENT})...")
         
         kanji_path = self.source_dir / "kanji" / "source.json"
@@ -416,274 +621,56 @@ class AsyncJLPTDataProcessor:
             safe_print(f"Kanji source not found: {kanji_path}")
             return
         
-        tasks = []
-        total = 0
+        if self.stage_done('kanji'):
+            async with self.acquire() as conn:
+                rows = await conn.fetch(f"SELECT literal, id FROM {self.schema}.kanji")
+            self.kanji_cache.update((row['literal'], row['id']) for row in rows)
+            return
+        
+        await self.load_stored_hashes('kanji')
+        seen = set()
+        changed: List[str] = []
         completed = 0
         
-        # Stream batches without buffering all
-        with open(kanji_path, 'rb') as f:
-            batch = []
-            for char_data in ijson.items(f, 'characters.item'):
-                batch.append(char_data)
-                total += 1
-                if len(batch) >= BATCH_SIZE:
-                    tasks.append(asyncio.create_task(self.process_kanji_batch(batch)))
-                    batch = []
-            if batch:
-                tasks.append(asyncio.create_task(self.process_kanji_batch(batch)))
-        
-        # Process with progress reporting
-        for coro in asyncio.as_completed(tasks):
-            count = await coro
+        async def produce(queue: asyncio.Queue) -> None:
+            await self.stream_batches(kanji_path, 'characters.item', queue)
+        
+        async def write(item: Tuple[int, List[dict]]) -> None:
+            nonlocal completed
+            count = await self.process_kanji_batch(*item, seen, changed)
             completed += count
-            if completed % 1000 == 0:
-                safe_print(f"Kanji progress: {completed}/{total}")
+            safe_print(f"Kanji progress: {completed}")
+        
+        await self.run_pipeline(produce, write)
+        await self.mark_stage('kanji')
+        deleted = await self.finish_delta('kanji', seen, changed)
+        # Replacing a kanji drops the links other entries hold to it
+        self.transformer.changed_kanji = set(changed) | set(deleted) if self.delta else set()
         
         safe_print(f"Kanji processing complete: {len(self.kanji_cache)} entries")
 
     # ========== Vocabulary Processing ==========
     
-    def _get_vocab_jlpt_level(self, word_data: dict) -> Optional[int]:
-        """Get JLPT level for vocabulary from mapping."""
-        kanji_list = word_data.get('kanji', [])
-        primary_kanji = kanji_list[0].get('text', '') if kanji_list else ''
-        kana_list = word_data.get('kana', [])
-        primary_kana = kana_list[0].get('text', '') if kana_list else ''
-        
-        if primary_kanji and primary_kana:
-            jlpt = self.vocabulary_jlpt_mapping.get((primary_kanji, primary_kana))
-            if jlpt:
-                return jlpt
-        if primary_kana and not primary_kanji:
-            return self.vocabulary_jlpt_mapping.get((primary_kana, primary_kana))
-        return None
-
-    async def process_vocabulary_batch(self, batch: List[dict]) -> Tuple[int, List]:
-        """Process a batch of vocabulary."""
-        local_relations = []
-        
-        async with self.semaphore:
-            async with self.pool.acquire() as conn:
-                async with conn.transaction():
-                    for word_data in batch:
-                        jmdict_id = word_data.get('id', '')
-                        if not jmdict_id:
-                            continue
-                        
-                        jlpt_new = self._get_vocab_jlpt_level(word_data)
-                        
-                        vocab_id = await conn.fetchval('''
-                            INSERT INTO jlpt.vocabulary (jmdict_id, jlpt_level_new)
-                            VALUES ($1, $2)
-                            ON CONFLICT (jmdict_id) DO UPDATE SET
-                                jlpt_level_new = EXCLUDED.jlpt_level_new,
-                                updated_at = CURRENT_TIMESTAMP
-                            RETURNING id
-                        ''', jmdict_id, jlpt_new)
-                        
-                        self.vocabulary_cache[jmdict_id] = vocab_id
-                        
-                        await self._process_vocab_forms(conn, vocab_id, word_data)
-                        await self._process_vocab_senses(conn, vocab_id, word_data, local_relations)
-                        await self._process_furigana(conn, vocab_id, 'vocabulary', word_data, 
-                                                      self.vocab_furigana_cache)
-                
-                return len(batch), local_relations
-    
-    async def _process_vocab_forms(self, conn, vocab_id: int, word_data: dict) -> None:
-        """Process kanji and kana forms for vocabulary."""
-        # Kanji forms
-        kanji_batch = [(vocab_id, k.get('text', ''), k.get('common', False), idx == 0)
-                       for idx, k in enumerate(word_data.get('kanji', []))]
-        if kanji_batch:
-            await conn.executemany('''
-                INSERT INTO jlpt.vocabulary_kanji (vocabulary_id, text, is_common, is_primary)
-                VALUES ($1, $2, $3, $4) ON CONFLICT DO NOTHING
-            ''', kanji_batch)
-        
-        # Kana forms
-        kana_batch = [(vocab_id, k.get('text', ''), k.get('appliesToKanji', []),
-                       k.get('common', False), idx == 0)
-                      for idx, k in enumerate(word_data.get('kana', []))]
-        if kana_batch:
-            await conn.executemany('''
-                INSERT INTO jlpt.vocabulary_kana (vocabulary_id, text, applies_to_kanji, is_common, is_primary)
-                VALUES ($1, $2, $3, $4, $5) ON CONFLICT DO NOTHING
-            ''', kana_batch)
-
-    async def _process_vocab_senses(self, conn, vocab_id: int, word_data: dict, 
-                                     local_relations: List) -> None:
-        """Process senses for vocabulary."""
-        for sense in word_data.get('sense', []):
-            sense_id = await conn.fetchval('''
-                INSERT INTO jlpt.vocabulary_sense (vocabulary_id, applies_to_kanji, applies_to_kana, info)
-                VALUES ($1, $2, $3, $4) RETURNING id
-            ''', vocab_id, sense.get('appliesToKanji', []), 
-                sense.get('appliesToKana', []), sense.get('info', []))
-            
-            # Tags
-            tag_batch = []
-            for pos in sense.get('partOfSpeech', []):
-                tag_batch.append((sense_id, pos, 'pos'))
-            for field in sense.get('field', []):
-                tag_batch.append((sense_id, field, 'field'))
-            for dialect in sense.get('dialect', []):
-                tag_batch.append((sense_id, dialect, 'dialect'))
-            for misc in sense.get('misc', []):
-                tag_batch.append((sense_id, misc, 'misc'))
-            
-            if tag_batch:
-                await conn.executemany('''
-                    INSERT INTO jlpt.vocabulary_sense_tag (sense_id, tag_code, tag_type)
-                    VALUES ($1, $2, $3) ON CONFLICT DO NOTHING
-                ''', tag_batch)
-            
-            # Glosses
-            glosses = [(sense_id, g.get('lang'), g.get('text'), g.get('gender'), g.get('type'))
-                       for g in sense.get('gloss', [])]
-            if glosses:
-                await conn.executemany('''
-                    INSERT INTO jlpt.vocabulary_sense_gloss (sense_id, lang, text, gender, type)
-                    VALUES ($1, $2, $3, $4, $5) ON CONFLICT DO NOTHING
-                ''', glosses)
-            
-            # Language sources
-            lang_sources = [(sense_id, ls.get('lang'), ls.get('text'), ls.get('full'), ls.get('wasei'))
-                           for ls in sense.get('languageSource', [])]
-            if lang_sources:
-                await conn.executemany('''
-                    INSERT INTO jlpt.vocabulary_sense_language_source (sense_id, lang, text, "full", wasei)
-                    VALUES ($1, $2, $3, $4, $5) ON CONFLICT DO NOTHING
-                ''', lang_sources)
-            
-            # Related/Antonym - collect for later resolution
-            for rel in sense.get('related', []):
-                if isinstance(rel, list) and len(rel) > 0:
-                    local_relations.append((sense_id, rel[0], rel[1] if len(rel) > 1 else None,
-                                           rel[2] if len(rel) > 2 else None, 'related'))
-            for ant in sense.get('antonym', []):
-                if isinstance(ant, list) and len(ant) > 0:
-                    local_relations.append((sense_id, ant[0], ant[1] if len(ant) > 1 else None,
-                                           ant[2] if len(ant) > 2 else None, 'antonym'))
-
-    async def _process_furigana(self, conn, entity_id: int, entity_type: str, 
-                                 word_data: dict, furigana_cache) -> None:
-        """Process furigana data for an entity."""
-        if not furigana_cache:
-            return
-        
-        furigana_batch = []
-        processed = set()
-        
-        for kanji in word_data.get('kanji', []):
-            text = kanji.get('text')
-            if not text:
-                continue
-            for kana in word_data.get('kana', []):
-                reading = kana.get('reading', kana.get('text'))
-                if not reading:
-                    continue
-                applies_to = kana.get('appliesToKanji', [])
-                if applies_to and applies_to != ['*'] and text not in applies_to:
-                    continue
-                if (text, reading) in processed:
-                    continue
-                
-                furi_data = furigana_cache.get((text, reading))
-                if furi_data:
-                    furigana_batch.append((entity_id, text, reading, json_dumps(furi_data)))
-                    processed.add((text, reading))
-        
-        if furigana_batch:
-            table = f"jlpt.{entity_type}_furigana"
-            id_col = f"{entity_type}_id"
-            await conn.executemany(f'''
-                INSERT INTO {table} ({id_col}, text, reading, furigana)
-                VALUES ($1, $2, $3, $4) ON CONFLICT ({id_col}, text, reading) DO NOTHING
-            ''', furigana_batch)
-
     async def process_vocabulary_data(self) -> None:
-        """Process all vocabulary data with streaming."""
-        safe_print(f"Processing vocabulary data (batch={BATCH_SIZE})...")
+        """Process all vocabulary data, parsing in worker processes."""
+        safe_print(f"Processing vocabulary data (batch={BATCH_SIZE}, parse workers={PARSE_WORKERS})...")
         
         vocab_path = self.source_dir / "vocabulary" / "source.json"
         if not vocab_path.exists():
             safe_print(f"Vocabulary source not found: {vocab_path}")
             return
         
-        tasks = []
-        total = 0
+        def on_result(result: ShardResult) -> None:
+            for jmdict_id in result.keys:
+                self.vocabulary_cache[jmdict_id] = key_allocator.vocabulary_id(jmdict_id)
         
-        with open(vocab_path, 'rb') as f:
-            batch = []
-            for word_data in ijson.items(f, 'words.item'):
-                batch.append(word_data)
-                total += 1
-                if len(batch) >= BATCH_SIZE:
-                    tasks.append(asyncio.create_task(self.process_vocabulary_batch(batch)))
-                    batch = []
-            if batch:
-                tasks.append(asyncio.create_task(self.process_vocabulary_batch(batch)))
+        await self._write_parsed_source(vocab_path, 'vocabulary', 'Vocabulary', on_result)
+        await self.mark_stage('vocabulary')
         
-        completed = 0
-        for coro in asyncio.as_completed(tasks):
-            count, local_rels = await coro
-            completed += count
-            for rel in local_rels:
-                self.pending_vocab_relations.append(rel)
-            if completed % 10000 == 0:
-                safe_print(f"Vocabulary progress: {completed}/{total}")
-        
-        safe_print(f"Vocabulary complete: {len(self.vocabulary_cache)} entries, "
-                   f"{len(self.pending_vocab_relations)} pending relations")
+        safe_print(f"Vocabulary complete: {len(self.vocabulary_cache)} entries")
 
     # ========== Vocabulary Examples Processing ==========
     
-    async def process_vocabulary_examples_batch(self, batch: List[dict]) -> int:
-        """Process a batch of vocabulary examples."""
-        async with self.semaphore:
-            async with self.pool.acquire() as conn:
-                async with conn.transaction():
-                    for word_data in batch:
-                        jmdict_id = word_data.get('id', '')
-                        if not jmdict_id or jmdict_id not in self.vocabulary_cache:
-                            continue
-                        
-                        vocab_id = self.vocabulary_cache[jmdict_id]
-                        
-                        # Get first sense ID
-                        sense_id = await conn.fetchval('''
-                            SELECT id FROM jlpt.vocabulary_sense 
-                            WHERE vocabulary_id = $1 LIMIT 1
-                        ''', vocab_id)
-                        
-                        if not sense_id:
-                            continue
-                        
-                        for sense in word_data.get('sense', []):
-                            for example in sense.get('examples', []):
-                                source_type = example.get('source', {}).get('type')
-                                source_value = example.get('source', {}).get('value')
-                                text = example.get('text', '')
-                                
-                                example_id = await conn.fetchval('''
-                                    INSERT INTO jlpt.vocabulary_sense_example 
-                                        (sense_id, source_type, source_value, text)
-                                    VALUES ($1, $2, $3, $4) RETURNING id
-                                ''', sense_id, source_type, source_value, text)
-                                
-                                if example_id:
-                                    sentences = [(example_id, s.get('lang'), s.get('text'))
-                                                for s in example.get('sentences', [])]
-                                    if sentences:
-                                        await conn.executemany('''
-                                            INSERT INTO jlpt.vocabulary_sense_example_sentence
-                                                (example_id, lang, text)
-                                            VALUES ($1, $2, $3) ON CONFLICT DO NOTHING
-                                        ''', sentences)
-                
-                return len(batch)
-
     async def process_vocabulary_examples(self) -> None:
         """Process vocabulary examples."""
         safe_print("Processing vocabulary examples...")
@@ -692,242 +679,151 @@ class AsyncJLPTDataProcessor:
         if not examples_path.exists():
             safe_print(f"Vocabulary examples not found: {examples_path}")
             return
+        if self.stage_done('example'):
+            return
         
-        tasks = []
-        total = 0
+        example_hashes: List[Tuple[str, Optional[bytes]]] = []
         
-        with open(examples_path, 'rb') as f:
-            batch = []
-            for word_data in ijson.items(f, 'words.item'):
-                batch.append(word_data)
-                total += 1
-                if len(batch) >= BATCH_SIZE:
-                    tasks.append(asyncio.create_task(self.process_vocabulary_examples_batch(batch)))
-                    batch = []
-            if batch:
-                tasks.append(asyncio.create_task(self.process_vocabulary_examples_batch(batch)))
+        def on_result(result: ShardResult) -> None:
+            # Full loads leave entries without examples at NULL
+            example_hashes.extend(item for item in result.example_hashes if item[1] or self.delta)
         
-        completed = 0
-        for coro in asyncio.as_completed(tasks):
-            count = await coro
-            completed += count
-            if completed % 10000 == 0:
-                safe_print(f"Examples progress: {completed}/{total}")
+        completed = await self._write_parsed_source(examples_path, 'example', 'Examples', on_result)
+        
+        # Stored with the vocabulary entry, so a delta load can skip unchanged examples
+        async with self.acquire() as conn:
+            await conn.execute(f'''
+                UPDATE {self.schema}.vocabulary v SET examples_hash = h.examples_hash
+                FROM unnest($1::uuid[], $2::bytea[]) AS h(id, examples_hash)
+                WHERE v.id = h.id
+            ''', [key_allocator.vocabulary_id(key) for key, _ in example_hashes],
+                [examples_hash for _, examples_hash in example_hashes])
+            await self.mark_stage('example', conn)
         
         safe_print(f"Vocabulary examples complete: {completed} processed")
 
     # ========== Radical Processing ==========
     
     async def process_radical_data(self) -> None:
-        """Process radical data from radfile and kradfile."""
+        """
+        Process radical groups and radicals from the radfile (linked to kanji separately).
+        
+        reference.txt and source.json are parsed once and grouped in memory
+        (radical_groups), then groups, members and radicals are written with
+        one array statement each.
+        """
         safe_print("Processing radical data...")
+        if self.stage_done('radicals'):
+            async with self.acquire() as conn:
+                rows = await conn.fetch(f"SELECT literal, id FROM {self.schema}.radical")
+            self.radical_cache.update((row['literal'], row['id']) for row in rows)
+            return
         
         ref_path = self.source_dir / "radfile" / "reference.txt"
         radfile_path = self.source_dir / "radfile" / "source.json"
-        kradfile_path = self.source_dir / "kradfile" / "source.json"
         
         if not ref_path.exists():
             safe_print(f"Radical reference not found: {ref_path}")
             return
         
-        async with self.pool.acquire() as conn:
-            # Phase 1: Populate radical_group from reference.txt
-            radical_group_cache = {}
-            
-            with open(ref_path, 'r', encoding='utf-8') as f:
-                for line in f:
-                    line = line.strip()
-                    if not line:
-                        continue
-                    
-                    parts = line.split('\t')
-                    parts += [''] * (7 - len(parts))
-                    
-                    canonical = parts[0]
-                    norm_canonical = self._normalize_radical_char(canonical)
-                    
-                    try:
-                        kxn = int(parts[2]) if parts[2] else None
-                    except ValueError:
-                        kxn = None
-                    
-                    readings = [r.strip() for r in parts[4].split('・') if r.strip()]
-                    meanings = [m.strip() for m in parts[5].split(',') if m.strip()]
-                    notes = [parts[6]] if parts[6] else []
-                    
-                    if norm_canonical not in radical_group_cache:
-                        group_id = await conn.fetchval('''
-                            INSERT INTO jlpt.radical_group (canonical_literal, kang_xi_number, meanings, readings, notes)
-                            VALUES ($1, $2, $3, $4, $5)
-                            ON CONFLICT (canonical_literal) DO UPDATE SET
-                                kang_xi_number = COALESCE(EXCLUDED.kang_xi_number, jlpt.radical_group.kang_xi_number)
-                            RETURNING id
-                        ''', norm_canonical, kxn, meanings, readings, notes)
-                        radical_group_cache[norm_canonical] = group_id
-                        radical_group_cache[canonical] = group_id
-            
-            safe_print(f"Created {len(set(radical_group_cache.values()))} radical groups")
-            
-            # Phase 2: Populate radical_group_member
-            with open(ref_path, 'r', encoding='utf-8') as f:
-                for line in f:
-                    line = line.strip()
-                    if not line:
-                        continue
-                    
-                    parts = line.split('\t')
-                    parts += [''] * (7 - len(parts))
-                    
-                    canonical = parts[0]
-                    variant = parts[1] if parts[1] else None
-                    norm_canonical = self._normalize_radical_char(canonical)
-                    group_id = radical_group_cache.get(norm_canonical)
-                    if not group_id:
-                        continue
-                    
-                    for lit, is_canon in [(canonical, True), (variant, False)]:
-                        if not lit:
-                            continue
-                        await conn.execute('''
-                            INSERT INTO jlpt.radical_group_member (group_id, literal, is_canonical)
-                            VALUES ($1, $2, $3) ON CONFLICT DO NOTHING
-                        ''', group_id, lit, is_canon)
-            
-            # Build member -> group lookup
-            rows = await conn.fetch("SELECT group_id, literal FROM jlpt.radical_group_member")
-            member_to_group = {row['literal']: row['group_id'] for row in rows}
+        char_to_leader, leader_to_ref_data = radical_groups.group_maps(ref_path)
         
-        # Phase 3: Populate radical from source.json
+        # literal -> (stroke_count, code, leader); a literal repeated after normalization keeps its last entry
+        radicals: Dict[str, Tuple[int, Optional[str], Optional[str]]] = {}
         if radfile_path.exists():
-            async with self.pool.acquire() as conn:
-                with open(radfile_path, 'rb') as f:
-                    for char, data in ijson.kvitems(f, 'radicals'):
-                        norm_char = self._normalize_radical_char(char)
-                        group_id = member_to_group.get(norm_char) or member_to_group.get(char)
-                        
-                        radical_id = await conn.fetchval('''
-                            INSERT INTO jlpt.radical (literal, stroke_count, code, group_id)
-                            VALUES ($1, $2, $3, $4)
-                            ON CONFLICT (literal) DO UPDATE SET
-                                stroke_count = EXCLUDED.stroke_count, code = EXCLUDED.code,
-                                group_id = EXCLUDED.group_id
-                            RETURNING id
-                        ''', norm_char, data.get('strokeCount', 0), data.get('code'), group_id)
-                        
-                        self.radical_cache[norm_char] = radical_id
-            
-            safe_print(f"Processed {len(self.radical_cache)} radicals")
+            with open(radfile_path, 'rb') as f:
+                for char, data in ijson.kvitems(f, 'radicals'):
+                    norm_char = self._normalize_radical_char(char)
+                    leader = char_to_leader.get(norm_char) or char_to_leader.get(char)
+                    radicals[norm_char] = (data.get('strokeCount', 0), data.get('code'), leader)
+        
+        async with self.acquire() as conn:
+            async with conn.transaction():
+                leaders = list(leader_to_ref_data)
+                rows = await conn.fetch(f'''
+                    INSERT INTO {self.schema}.radical_group (canonical_literal, kang_xi_number, meanings, readings, notes)
+                    SELECT g.literal, g.kang_xi_number,
+                           ARRAY(SELECT jsonb_array_elements_text(g.meanings)),
+                           ARRAY(SELECT jsonb_array_elements_text(g.readings)),
+                           ARRAY(SELECT jsonb_array_elements_text(g.notes))
+                    FROM unnest($1::text[], $2::int[], $3::jsonb[], $4::jsonb[], $5::jsonb[])
+                        AS g(literal, kang_xi_number, meanings, readings, notes)
+                    ON CONFLICT (canonical_literal) DO UPDATE SET
+                        kang_xi_number = COALESCE(EXCLUDED.kang_xi_number, {self.schema}.radical_group.kang_xi_number),
+                        meanings = EXCLUDED.meanings,
+                        readings = EXCLUDED.readings,
+                        notes = EXCLUDED.notes,
+                        updated_at = CURRENT_TIMESTAMP
+                    RETURNING canonical_literal, id
+                ''', leaders,
+                    [leader_to_ref_data[leader]['kang_xi_number'] for leader in leaders],
+                    *([json.dumps(leader_to_ref_data[leader][field], ensure_ascii=False) for leader in leaders]
+                      for field in ('meanings', 'readings', 'notes')))
+                group_ids = {row['canonical_literal']: row['id'] for row in rows}
+                safe_print(f"Created {len(group_ids)} radical groups")
+                
+                members = list(char_to_leader.items())
+                await conn.execute(f'''
+                    INSERT INTO {self.schema}.radical_group_member (group_id, literal, is_canonical)
+                    SELECT * FROM unnest($1::uuid[], $2::text[], $3::bool[])
+                    ON CONFLICT DO NOTHING
+                ''', [group_ids[leader] for _, leader in members], [char for char, _ in members],
+                    [char == leader for char, leader in members])
+                
+                literals = list(radicals)
+                rows = await conn.fetch(f'''
+                    INSERT INTO {self.schema}.radical (literal, stroke_count, code, group_id)
+                    SELECT * FROM unnest($1::text[], $2::int[], $3::text[], $4::uuid[])
+                    ON CONFLICT (literal) DO UPDATE SET
+                        stroke_count = EXCLUDED.stroke_count, code = EXCLUDED.code,
+                        group_id = EXCLUDED.group_id
+                    RETURNING literal, id
+                ''', literals, [radicals[literal][0] for literal in literals],
+                    [radicals[literal][1] for literal in literals],
+                    [group_ids.get(radicals[literal][2]) for literal in literals])
+                self.radical_cache.update((row['literal'], row['id']) for row in rows)
+                safe_print(f"Processed {len(self.radical_cache)} radicals")
+                
+                await self.mark_stage('radicals', conn)
+    
+    async def link_kanji_radicals(self) -> None:
+        """Link kanji to their radicals from the kradfile."""
+        safe_print("Linking kanji to radicals...")
+        if self.stage_done('kanji_radical'):
+            return
         
-        # Phase 4: Link kanji to radicals
+        kradfile_path = self.source_dir / "kradfile" / "source.json"
         if kradfile_path.exists():
-            async with self.pool.acquire() as conn:
-                batch = []
+            async with self.acquire() as conn:
+                links = []
                 with open(kradfile_path, 'rb') as f:
                     for kanji_char, components in ijson.kvitems(f, 'kanji'):
                         kanji_id = self.kanji_cache.get(kanji_char)
                         if not kanji_id:
                             continue
+                        radical_ids = {}
                         for comp in components:
                             comp = self._normalize_radical_char(comp)
                             radical_id = self.radical_cache.get(comp)
                             if radical_id:
-                                batch.append((kanji_id, radical_id))
+                                radical_ids[radical_id] = None
+                        links.extend((key_allocator.derive_id(kanji_char, idx), kanji_id, radical_id)
+                                     for idx, radical_id in enumerate(radical_ids))
                 
-                if batch:
-                    await conn.executemany('''
-                        INSERT INTO jlpt.kanji_radical (kanji_id, radical_id)
-                        VALUES ($1, $2) ON CONFLICT DO NOTHING
-                    ''', batch)
-                    safe_print(f"Linked {len(batch)} kanji-radical relationships")
+                if links:
+                    async with conn.transaction():
+                        if self.delta:
+                            await conn.execute(f"DELETE FROM {self.schema}.kanji_radical")
+                        sink = create_sink(conn, self.schema)
+                        sink.extend('kanji_radical', links)
+                        await sink.flush()
+                        await self.mark_stage('kanji_radical', conn)
+                    safe_print(f"Linked {len(links)} kanji-radical relationships")
 
     # ========== Proper Nouns Processing ==========
     
-    async def process_proper_noun_batch(self, batch: List[dict]) -> Tuple[int, List]:
-        """Process a batch of proper nouns."""
-        local_relations = []
-        
-        async with self.semaphore:
-            async with self.pool.acquire() as conn:
-                async with conn.transaction():
-                    for name_data in batch:
-                        jmnedict_id = name_data.get('id', '')
-                        if not jmnedict_id:
-                            continue
-                        
-                        pn_id = await conn.fetchval('''
-                            INSERT INTO jlpt.proper_noun (jmnedict_id)
-                            VALUES ($1) ON CONFLICT (jmnedict_id) DO NOTHING RETURNING id
-                        ''', jmnedict_id)
-                        
-                        if not pn_id:
-                            pn_id = await conn.fetchval(
-                                "SELECT id FROM jlpt.proper_noun WHERE jmnedict_id = $1", jmnedict_id)
-                        
-                        # Forms
-                        kanji_batch = [(pn_id, k.get('text', ''), idx == 0)
-                                       for idx, k in enumerate(name_data.get('kanji', []))]
-                        if kanji_batch:
-                            await conn.executemany('''
-                                INSERT INTO jlpt.proper_noun_kanji (proper_noun_id, text, is_primary)
-                                VALUES ($1, $2, $3) ON CONFLICT DO NOTHING
-                            ''', kanji_batch)
-                        
-                        kana_batch = [(pn_id, k.get('text', ''), k.get('appliesToKanji', []), idx == 0)
-                                      for idx, k in enumerate(name_data.get('kana', []))]
-                        if kana_batch:
-                            await conn.executemany('''
-                                INSERT INTO jlpt.proper_noun_kana (proper_noun_id, text, applies_to_kanji, is_primary)
-                                VALUES ($1, $2, $3, $4) ON CONFLICT DO NOTHING
-                            ''', kana_batch)
-                        
-                        # Translations
-                        for trans in name_data.get('translation', []):
-                            trans_id = await conn.fetchval('''
-                                INSERT INTO jlpt.proper_noun_translation (proper_noun_id)
-                                VALUES ($1) RETURNING id
-                            ''', pn_id)
-                            
-                            # Types
-                            type_batch = [(trans_id, t) for t in trans.get('type', [])]
-                            if type_batch:
-                                await conn.executemany('''
-                                    INSERT INTO jlpt.proper_noun_translation_type (translation_id, tag_code)
-                                    VALUES ($1, $2) ON CONFLICT DO NOTHING
-                                ''', type_batch)
-                            
-                            # Text
-                            text_batch = [(trans_id, t.get('lang'), t.get('text'))
-                                         for t in trans.get('translation', [])]
-                            if text_batch:
-                                await conn.executemany('''
-                                    INSERT INTO jlpt.proper_noun_translation_text (translation_id, lang, text)
-                                    VALUES ($1, $2, $3) ON CONFLICT DO NOTHING
-                                ''', text_batch)
-                            
-                            # Related
-                            for rel in trans.get('related', []):
-                                if isinstance(rel, list) and len(rel) > 0:
-                                    local_relations.append((trans_id, rel[0], 
-                                        rel[1] if len(rel) > 1 else None,
-                                        rel[2] if len(rel) > 2 else None))
-                        
-                        # Kanji relationships
-                        for kanji in name_data.get('kanji', []):
-                            for char in kanji.get('text', ''):
-                                if char in self.kanji_cache:
-                                    await conn.execute('''
-                                        INSERT INTO jlpt.proper_noun_uses_kanji (proper_noun_id, kanji_id)
-                                        VALUES ($1, $2) ON CONFLICT DO NOTHING
-                                    ''', pn_id, self.kanji_cache[char])
-                        
-                        # Furigana
-                        await self._process_furigana(conn, pn_id, 'proper_noun', name_data,
-                                                      self.proper_noun_furigana_cache)
-                
-                return len(batch), local_relations
-
     async def process_proper_nouns(self) -> None:
-        """Process all proper nouns."""
+        """Process all proper nouns, parsing in worker processes."""
         safe_print("Processing proper nouns...")
         
         names_path = self.source_dir / "names" / "source.json"
@@ -935,317 +831,88 @@ class AsyncJLPTDataProcessor:
             safe_print(f"Names source not found: {names_path}")
             return
         
-        tasks = []
-        total = 0
-        
-        with open(names_path, 'rb') as f:
-            batch = []
-            for name_data in ijson.items(f, 'words.item'):
-                batch.append(name_data)
-                total += 1
-                if len(batch) >= BATCH_SIZE:
-                    tasks.append(asyncio.create_task(self.process_proper_noun_batch(batch)))
-                    batch = []
-            if batch:
-                tasks.append(asyncio.create_task(self.process_proper_noun_batch(batch)))
-        
-        completed = 0
-        for coro in asyncio.as_completed(tasks):
-            count, local_rels = await coro
-            completed += count
-            for rel in local_rels:
-                self.pending_proper_noun_relations.append(rel)
-            if completed % 50000 == 0:
-                safe_print(f"Proper nouns progress: {completed}/{total}")
+        completed = await self._write_parsed_source(names_path, 'proper_noun', 'Proper nouns')
+        await self.mark_stage('proper_noun')
         
         safe_print(f"Proper nouns complete: {completed} entries")
 
-    # ========== Relation Resolution ==========
-    
-    async def build_term_caches(self) -> None:
-        """Build term lookup caches for relation resolution."""
-        safe_print("Building term lookup caches...")
-        
-        self.vocab_term_cache = {}
-        self.proper_noun_term_cache = {}
-        
-        async with self.pool.acquire() as conn:
-            # Vocabulary terms
-            rows = await conn.fetch('''
-                SELECT v.id, vk.text as kanji, vka.text as kana
-                FROM jlpt.vocabulary v
-                LEFT JOIN jlpt.vocabulary_kanji vk ON vk.vocabulary_id = v.id
-                LEFT JOIN jlpt.vocabulary_kana vka ON vka.vocabulary_id = v.id
-            ''')
-            for row in rows:
-                if row['kanji']:
-                    self.vocab_term_cache[(row['kanji'], None)] = row['id']
-                    if row['kana']:
-                        self.vocab_term_cache[(row['kanji'], row['kana'])] = row['id']
-                if row['kana']:
-                    self.vocab_term_cache[(row['kana'], None)] = row['id']
-            
-            safe_print(f"Vocabulary term cache: {len(self.vocab_term_cache)} entries")
-            
-            # Proper noun terms
-            rows = await conn.fetch('''
-                SELECT pn.id, pnk.text as kanji, pnka.text as kana
-                FROM jlpt.proper_noun pn
-                LEFT JOIN jlpt.proper_noun_kanji pnk ON pnk.proper_noun_id = pn.id
-                LEFT JOIN jlpt.proper_noun_kana pnka ON pnka.proper_noun_id = pn.id
-            ''')
-            for row in rows:
-                if row['kanji']:
-                    self.proper_noun_term_cache[(row['kanji'], None)] = row['id']
-                if row['kana']:
-                    self.proper_noun_term_cache[(row['kana'], None)] = row['id']
-            
-            safe_print(f"Proper noun term cache: {len(self.proper_noun_term_cache)} entries")
-
-    async def resolve_vocab_relations(self) -> None:
-        """Resolve vocabulary relations."""
-        total = len(self.pending_vocab_relations)
-        safe_print(f"Resolving {total} vocabulary relations...")
-        
-        if total == 0:
-            return
-        
-        # Prefetch sense IDs
-        sense_cache = defaultdict(list)
-        async with self.pool.acquire() as conn:
-            rows = await conn.fetch(
-                "SELECT vocabulary_id, id FROM jlpt.vocabulary_sense ORDER BY vocabulary_id, id")
-            for row in rows:
-                sense_cache[row['vocabulary_id']].append(row['id'])
-        
-        resolved = []
-        for sense_id, term, reading, sense_idx, rel_type in self.pending_vocab_relations:
-            target_vocab_id = None
-            if reading:
-                target_vocab_id = self.vocab_term_cache.get((term, reading))
-            if not target_vocab_id:
-                target_vocab_id = self.vocab_term_cache.get((term, None))
-            
-            target_sense_id = None
-            if target_vocab_id and sense_idx and sense_idx > 0:
-                senses = sense_cache.get(target_vocab_id, [])
-                if sense_idx <= len(senses):
-                    target_sense_id = senses[sense_idx - 1]
-            
-            # Ensure all values are proper types for asyncpg
-            resolved.append((
-                sense_id, 
-                target_vocab_id, 
-                target_sense_id, 
-                str(term) if term else None, 
-                str(reading) if reading else None, 
-                str(rel_type) if rel_type else None
-            ))
-        
-        # Batch insert
-        async with self.pool.acquire() as conn:
-            await conn.executemany('''
-                INSERT INTO jlpt.vocabulary_sense_relation 
-                    (source_sense_id, target_vocab_id, target_sense_id, target_term, target_reading, relation_type)
-                VALUES ($1, $2, $3, $4, $5, $6) ON CONFLICT DO NOTHING
-            ''', resolved)
-        
-        resolved_count = sum(1 for r in resolved if r[1] is not None)
-        safe_print(f"Vocabulary relations: {resolved_count} resolved, {total - resolved_count} unresolved")
-        self.pending_vocab_relations.clear()
-
-    async def resolve_proper_noun_relations(self) -> None:
-        """Resolve proper noun relations."""
-        total = len(self.pending_proper_noun_relations)
-        safe_print(f"Resolving {total} proper noun relations...")
-        
-        if total == 0:
-            return
-        
-        resolved = []
-        for trans_id, term, reading, sense_idx in self.pending_proper_noun_relations:
-            ref_pn_id = None
-            if reading:
-                ref_pn_id = self.proper_noun_term_cache.get((term, reading))
-            if not ref_pn_id:
-                ref_pn_id = self.proper_noun_term_cache.get((term, None))
-            
-            resolved.append((trans_id, term, reading, ref_pn_id, None))
-        
-        async with self.pool.acquire() as conn:
-            await conn.executemany('''
-                INSERT INTO jlpt.proper_noun_translation_related 
-                    (translation_id, related_term, related_reading, reference_proper_noun_id, reference_proper_noun_translation_id)
-                VALUES ($1, $2, $3, $4, $5) ON CONFLICT DO NOTHING
-            ''', resolved)
-        
-        resolved_count = sum(1 for r in resolved if r[3] is not None)
-        safe_print(f"Proper noun relations: {resolved_count} resolved")
-        self.pending_proper_noun_relations.clear()
-
-    # ========== Kanji-Vocabulary Relationships ==========
-    
-    async def process_kanji_vocabulary_relationships(self) -> None:
-        """Link vocabulary to kanji characters."""
-        safe_print("Processing kanji-vocabulary relationships...")
-        
-        async with self.pool.acquire() as conn:
-            rows = await conn.fetch('''
-                SELECT v.id, vk.text FROM jlpt.vocabulary v
-                JOIN jlpt.vocabulary_kanji vk ON vk.vocabulary_id = v.id
-            ''')
-            
-            batch = []
-            for row in rows:
-                for char in row['text']:
-                    if char in self.kanji_cache:
-                        batch.append((row['id'], self.kanji_cache[char]))
-            
-            if batch:
-                await conn.executemany('''
-                    INSERT INTO jlpt.vocabulary_uses_kanji (vocabulary_id, kanji_id)
-                    VALUES ($1, $2) ON CONFLICT DO NOTHING
-                ''', batch)
-            
-            safe_print(f"Linked {len(batch)} vocabulary-kanji relationships")
-
-    # ========== Slug Computation ==========
+    # ========== Main Processing ==========
     
-    async def _compute_slugs(self) -> None:
+    def build_stage_graph(self) -> StageGraph:
         """
-        Post-process: Compute slug columns for vocabulary and proper nouns.
+        Declare the load stages and what each needs from the others.
         
-        Slug logic:
-        - If kanji exists and is unique across all entries: use kanji text
-        - If kanji exists but not unique: use kanji(kana)
-        - If only kana exists: use kana text
+        Kanji, radicals and the source scan are independent; vocabulary and
+        proper nouns need the scanned slugs, tags and term index and the kanji
+        they link to (a delta load also rewrites the entries using replaced
+        kanji), and write their relations with the entries.
         """
-        safe_print("Computing slugs...")
-        
-        async with self.pool.acquire() as conn:
-            # Compute vocabulary slugs
-            safe_print("  Computing vocabulary slugs...")
-            vocab_result = await conn.execute('''
-                UPDATE jlpt.vocabulary v
-                SET slug = (
-                    SELECT
-                        CASE
-                            WHEN pk.text IS NOT NULL THEN
-                                CASE
-                                    WHEN (SELECT COUNT(*) FROM jlpt.vocabulary_kanji vk2 
-                                          WHERE vk2.text = pk.text AND vk2.is_primary = true) = 1
-                                    THEN pk.text
-                                    ELSE pk.text || '(' || COALESCE(pka.text, '') || ')'
-                                END
-                            WHEN pka.text IS NOT NULL THEN pka.text
-                            ELSE NULL
-                        END
-                    FROM (
-                        SELECT text FROM jlpt.vocabulary_kanji
-                        WHERE vocabulary_id = v.id AND is_primary = true
-                        LIMIT 1
-                    ) pk
-                    FULL OUTER JOIN (
-                        SELECT text FROM jlpt.vocabulary_kana
-                        WHERE vocabulary_id = v.id AND is_primary = true
-                        LIMIT 1
-                    ) pka ON true
-                )
-                WHERE v.slug IS NULL
-            ''')
-            safe_print(f"    Updated vocabulary slugs: {vocab_result}")
-            
-            # Compute proper noun slugs
-            safe_print("  Computing proper noun slugs...")
-            pn_result = await conn.execute('''
-                UPDATE jlpt.proper_noun p
-                SET slug = (
-                    SELECT
-                        CASE
-                            WHEN pk.text IS NOT NULL THEN
-                                CASE
-                                    WHEN (SELECT COUNT(*) FROM jlpt.proper_noun_kanji pnk2 
-                                          WHERE pnk2.text = pk.text AND pnk2.is_primary = true) = 1
-                                    THEN pk.text
-                                    ELSE pk.text || '(' || COALESCE(pka.text, '') || ')'
-                                END
-                            WHEN pka.text IS NOT NULL THEN pka.text
-                            ELSE NULL
-                        END
-                    FROM (
-                        SELECT text FROM jlpt.proper_noun_kanji
-                        WHERE proper_noun_id = p.id AND is_primary = true
-                        LIMIT 1
-                    ) pk
-                    FULL OUTER JOIN (
-                        SELECT text FROM jlpt.proper_noun_kana
-                        WHERE proper_noun_id = p.id AND is_primary = true
-                        LIMIT 1
-                    ) pka ON true
-                )
-                WHERE p.slug IS NULL
-            ''')
-            safe_print(f"    Updated proper noun slugs: {pn_result}")
-
-    # ========== Main Processing ==========
+        graph = StageGraph(log=safe_print)
+        graph.add('scan_sources', self.scan_sources, outputs=['source_summaries'])
+        graph.add('tags', self.pre_populate_tags, ['source_summaries'], ['tag_cache'])
+        graph.add('kanji', self.process_kanji_data, outputs=['kanji_cache', 'changed_kanji'])
+        graph.add('radicals', self.process_radical_data, outputs=['radical_cache'])
+        graph.add('vocabulary', self.process_vocabulary_data,
+                  ['source_summaries', 'tag_cache', 'kanji_cache', 'changed_kanji'],
+                  ['vocabulary_cache', 'vocabulary_sense_relation'])
+        graph.add('examples', self.process_vocabulary_examples,
+                  ['source_summaries', 'vocabulary_cache'], ['vocabulary_sense_example'])
+        graph.add('kanji_radicals', self.link_kanji_radicals,
+                  ['kanji_cache', 'radical_cache'], ['kanji_radical'])
+        graph.add('proper_nouns', self.process_proper_nouns,
+                  ['source_summaries', 'tag_cache', 'kanji_cache', 'changed_kanji'],
+                  ['proper_noun', 'proper_noun_translation_related'])
+        return graph
     
     async def process_all(self) -> bool:
         """Orchestrate all data processing."""
         safe_print("=" * 60)
         safe_print("JP Reference Database - Async Data Processor")
-        safe_print(f"Batch size: {BATCH_SIZE}, Max concurrent: {MAX_CONCURRENT}")
+        safe_print(f"Batch size: {BATCH_SIZE}, Max concurrent: {MAX_CONCURRENT}, "
+                   f"load: {'delta' if self.delta else 'full'}")
         safe_print("=" * 60)
         
         try:
             await self.init_pool()
+            if self.checkpoint:
+                async with self.acquire() as conn:
+                    await self.checkpoint.load(conn)
+                if self.checkpoint.stages or self.checkpoint.batches:
+                    safe_print(f"Resuming load: {len(self.checkpoint.stages)} stages and "
+                               f"{sum(map(len, self.checkpoint.batches.values()))} batches already loaded")
             
             # Load reference data
             self.load_jlpt_mappings()
             self.load_furigana_data()
-            await self.pre_populate_tags()
+            self.create_transformer()
             
             # Process data
-            safe_print("\n=== Step 1: Processing kanji ===")
-            await self.process_kanji_data()
-            
-            safe_print("\n=== Step 2: Processing vocabulary ===")
-            await self.process_vocabulary_data()
-            
-            safe_print("\n=== Step 3: Processing vocabulary examples ===")
-            await self.process_vocabulary_examples()
-            
-            safe_print("\n=== Step 4: Processing radicals ===")
-            await self.process_radical_data()
-            
-            safe_print("\n=== Step 5: Processing proper nouns ===")
-            await self.process_proper_nouns()
-            
-            safe_print("\n=== Step 6: Processing kanji-vocabulary relationships ===")
-            await self.process_kanji_vocabulary_relationships()
-            
-            safe_print("\n=== Step 7: Building term caches ===")
-            await self.build_term_caches()
-            
-            safe_print("\n=== Step 8: Resolving relations ===")
-            await self.resolve_vocab_relations()
-            await self.resolve_proper_noun_relations()
-            
-            safe_print("\n=== Step 9: Computing slugs ===")
-            await self._compute_slugs()
+            graph = self.build_stage_graph()
+            async with stage_profiler.watch_event_loop():
+                await graph.run()
             
             # Print statistics
-            async with self.pool.acquire() as conn:
-                stats = await conn.fetch('''
-                    SELECT 'kanji' as t, COUNT(*) as c FROM jlpt.kanji
-                    UNION ALL SELECT 'vocabulary', COUNT(*) FROM jlpt.vocabulary
-                    UNION ALL SELECT 'radicals', COUNT(*) FROM jlpt.radical
-                    UNION ALL SELECT 'proper_nouns', COUNT(*) FROM jlpt.proper_noun
+            async with self.acquire() as conn:
+                stats = await conn.fetch(f'''
+                    SELECT 'kanji' as t, COUNT(*) as c FROM {self.schema}.kanji
+                    UNION ALL SELECT 'vocabulary', COUNT(*) FROM {self.schema}.vocabulary
+                    UNION ALL SELECT 'radicals', COUNT(*) FROM {self.schema}.radical
+                    UNION ALL SELECT 'proper_nouns', COUNT(*) FROM {self.schema}.proper_noun
                 ''')
                 
                 safe_print("\n=== Database Statistics ===")
                 for row in stats:
                     safe_print(f"- {row['t']}: {row['c']:,}")
             
+            if self.delta:
+                safe_print("\n=== Delta Statistics ===")
+                for kind, counts in self.delta_stats.items():
+                    safe_print(f"- {kind}: " + ', '.join(f'{n:,} {k}' for k, n in counts.items()))
+            
+            safe_print("\n=== Stage Timings ===")
+            for line in graph.report():
+                safe_print(line)
+            
             safe_print("\n=== Processing completed successfully! ===")
             return True
             
@@ -1257,12 +924,12 @@ class AsyncJLPTDataProcessor:
         
         finally:
             # Cleanup
+            if self.transformer:
+                self.transformer.close()
             if self.vocab_furigana_cache:
                 self.vocab_furigana_cache.close()
             if self.proper_noun_furigana_cache:
                 self.proper_noun_furigana_cache.close()
-            self.pending_vocab_relations.cleanup()
-            self.pending_proper_noun_relations.cleanup()
             await self.close_pool()
 
 
@@ -16,8 +16,16 @@ import psycopg2
 from pathlib import Path
 import ijson
 from concurrent.futures import ThreadPoolExecutor, as_completed
+import contextvars
 import threading
 
+import load_metrics
+import load_profile
+import radical_groups
+import sql_profiler
+from source_header import read_header
+from stage_graph import StageGraph
+
 # Batch size for commits and bulk inserts
 BATCH_SIZE = 500
 NUM_WORKERS = int(os.getenv('NUM_WORKERS', '4'))
@@ -38,6 +46,27 @@ LANGUAGE_MAP = {
     'ja': 'jpn'
 }
 
+# Child tables of a kanji and their columns after kanji_id, with the array types
+# of the unnest parameters they are inserted from
+KANJI_CHILD_COLUMNS = {
+    'kanji_codepoint': (('type', 'text'), ('value', 'text')),
+    'kanji_dictionary_reference': (('type', 'text'), ('value', 'text'),
+                                   ('morohashi_volume', 'int'), ('morohashi_page', 'int')),
+    'kanji_query_code': (('type', 'text'), ('value', 'text'), ('skip_missclassification', 'text')),
+    'kanji_reading': (('type', 'text'), ('value', 'text'), ('status', 'text'), ('on_type', 'text')),
+    'kanji_meaning': (('lang', 'text'), ('value', 'text')),
+    'kanji_nanori': (('value', 'text'),),
+}
+
+# Per-sense tables written for a whole vocabulary batch, as (column, array type)
+SENSE_ATTRIBUTE_COLUMNS = {
+    'vocabulary_sense_tag': (('sense_id', 'uuid'), ('tag_code', 'text'), ('tag_type', 'text')),
+    'vocabulary_sense_language_source': (('sense_id', 'uuid'), ('lang', 'text'), ('text', 'text'),
+                                         ('"full"', 'boolean'), ('wasei', 'boolean')),
+    'vocabulary_sense_gloss': (('sense_id', 'uuid'), ('lang', 'text'), ('text', 'text'),
+                               ('gender', 'text'), ('type', 'text')),
+}
+
 def safe_print(text):
     """Safely print text that may contain Unicode characters."""
     try:
@@ -49,7 +78,7 @@ class ParallelJLPTDataProcessor:
     def __init__(self):
         self.script_dir = Path(__file__).parent
         self.project_root = self.script_dir.parent
-        self.source_dir = self.project_root / "source"
+        self.source_dir = Path(os.getenv('JMDICT_SOURCE_DIR', self.project_root / "source"))
         
         # Database connection parameters
         self.db_params = {
@@ -69,6 +98,7 @@ class ParallelJLPTDataProcessor:
         self.radical_cache = {}  # literal -> radical_id
         self.tag_cache = {}  # code -> tag exists
         self.vocabulary_cache = {}  # jmdict_id -> vocabulary_id
+        self.vocabulary_sense_ids = {}  # vocabulary_id -> sense ids in source order
         
         # Statistics
         self.processed_count = 0
@@ -96,10 +126,64 @@ class ParallelJLPTDataProcessor:
 
     def get_db_connection(self):
         """Get a database connection from the pool."""
-        conn = psycopg2.connect(**self.db_params)
+        with load_metrics.timed('acquire_wait'):
+            options = ' '.join(filter(None, (load_profile.connect_options(), sql_profiler.connect_options())))
+            conn = psycopg2.connect(**self.db_params, options=options,
+                                    cursor_factory=sql_profiler.cursor_factory())
         conn.autocommit = False
         return conn
 
+    def submit(self, executor, fn, *args):
+        """Submit work to a worker thread that reports its metrics to the calling stage."""
+        return executor.submit(contextvars.copy_context().run, fn, *args)
+
+    def insert_unnest(self, cursor, table, columns, rows, on_conflict='ON CONFLICT DO NOTHING', return_ids=False):
+        """
+        Insert rows with a single INSERT ... SELECT FROM unnest(...) statement.
+        
+        The rows are inserted in input order (WITH ORDINALITY), so their
+        default uuidv7() ids sort like the input.
+        
+        Args:
+            cursor: Database cursor
+            table: Qualified target table
+            columns: (name, type) pairs; the type casts the column's array parameter
+            rows: Row tuples in column order
+            on_conflict: Conflict clause of the statement
+            return_ids: Generate the ids next to the unnest ordinal and return them
+        
+        Returns:
+            With return_ids, the id of every row by input position (None for
+            rows the conflict clause skipped); otherwise an empty list
+        """
+        if not rows:
+            return []
+        names = ', '.join(name for name, _ in columns)
+        arrays = ', '.join(f'%s::{pg_type}[]' for _, pg_type in columns)
+        params = [list(column) for column in zip(*rows)]
+        if not return_ids:
+            cursor.execute(f"INSERT INTO {table} ({names}) SELECT {names} "
+                           f"FROM unnest({arrays}) WITH ORDINALITY AS u({names}, ord) ORDER BY u.ord {on_conflict}",
+                           params)
+            return []
+        
+        # RETURNING cannot see the ordinal, so the ids are paired with it before the insert
+        cursor.execute(f"""
+            WITH u AS MATERIALIZED (
+                SELECT uuidv7() AS id, {names}, ord
+                FROM unnest({arrays}) WITH ORDINALITY AS u({names}, ord)
+                ORDER BY ord
+            ), inserted AS (
+                INSERT INTO {table} (id, {names}) SELECT id, {names} FROM u ORDER BY ord {on_conflict}
+                RETURNING id
+            )
+            SELECT u.ord, u.id FROM u JOIN inserted USING (id)
+        """, params)
+        ids = [None] * len(rows)
+        for position, row_id in cursor.fetchall():
+            ids[position - 1] = row_id
+        return ids
+
     def safe_cache_update(self, cache_dict, key, value, lock):
         """Thread-safe cache update."""
         with lock:
@@ -124,55 +208,63 @@ class ParallelJLPTDataProcessor:
         return False
 
     def process_kanji_batch_parallel(self, kanji_batch_data):
-        """Process a batch of kanji in parallel."""
+        """
+        Process a batch of kanji with one array statement per table.
+
+        The kanji rows go in as one upsert that returns the literal -> id
+        mapping, then each of the six child tables gets a single
+        INSERT ... SELECT FROM unnest(...) built from the collected columns.
+        """
+        # literal -> source entry; a literal repeated in the batch keeps its last
+        # entry, and only that entry's sub-items are written
+        entries = {character_data['literal']: character_data for character_data in kanji_batch_data
+                   if character_data.get('literal')}
+        kanji_rows = {}
+        children = {table: [] for table in KANJI_CHILD_COLUMNS}
+        for character, character_data in entries.items():
+            misc = character_data.get('misc', {})
+            
+            # Get JLPT levels
+            jlpt_old = None
+            jlpt_new = None
+            if character in self.kanji_jlpt_mapping:
+                jlpt_old = self.kanji_jlpt_mapping[character]['jlpt_old']
+                jlpt_new = self.kanji_jlpt_mapping[character]['jlpt_new']
+            
+            stroke_count = misc.get('strokeCounts', [0])[0] if misc.get('strokeCounts') else 0
+            kanji_rows[character] = (character, misc.get('grade'), stroke_count, misc.get('frequency'),
+                                     jlpt_old, jlpt_new)
+            self._collect_kanji_subitems(children, character_data, character)
+        
+        if not kanji_rows:
+            return len(kanji_batch_data)
+        
         conn = self.get_db_connection()
         cursor = conn.cursor()
         
         try:
-            processed = 0
-            for character_data in kanji_batch_data:
-                character = character_data.get('literal', '')
-                if not character:
-                    continue
-                
-                misc = character_data.get('misc', {})
-                
-                # Get JLPT levels
-                jlpt_old = None
-                jlpt_new = None
-                if character in self.kanji_jlpt_mapping:
-                    jlpt_old = self.kanji_jlpt_mapping[character]['jlpt_old']
-                    jlpt_new = self.kanji_jlpt_mapping[character]['jlpt_new']
-                
-                stroke_count = misc.get('strokeCounts', [0])[0] if misc.get('strokeCounts') else 0
-                
-                # Insert kanji
-                cursor.execute("""
-                    INSERT INTO jlpt.kanji (
-                        literal, grade, stroke_count, frequency, jlpt_level_old, jlpt_level_new
-                    ) VALUES (%s, %s, %s, %s, %s, %s)
-                    ON CONFLICT (literal) DO UPDATE SET
-                        grade = EXCLUDED.grade,
-                        stroke_count = EXCLUDED.stroke_count,
-                        frequency = EXCLUDED.frequency,
-                        jlpt_level_old = EXCLUDED.jlpt_level_old,
-                        jlpt_level_new = EXCLUDED.jlpt_level_new,
-                        updated_at = CURRENT_TIMESTAMP
-                    RETURNING id, literal
-                """, (character, misc.get('grade'), stroke_count, misc.get('frequency'), jlpt_old, jlpt_new))
-                
-                result = cursor.fetchone()
-                if result:
-                    kanji_id, _ = result
-                    self.safe_cache_update(self.kanji_cache, character, kanji_id, self.kanji_cache_lock)
-                
-                # Process sub-items
-                self._process_kanji_subitems_inline(cursor, character_data, character, kanji_id)
-                
-                processed += 1
-                if processed % 100 == 0:
-                    conn.commit()
-                    sys.stdout.flush()
+            cursor.execute("""
+                INSERT INTO jlpt.kanji (
+                    literal, grade, stroke_count, frequency, jlpt_level_old, jlpt_level_new
+                )
+                SELECT * FROM unnest(%s::text[], %s::int[], %s::int[], %s::int[], %s::int[], %s::int[])
+                ON CONFLICT (literal) DO UPDATE SET
+                    grade = EXCLUDED.grade,
+                    stroke_count = EXCLUDED.stroke_count,
+                    frequency = EXCLUDED.frequency,
+                    jlpt_level_old = EXCLUDED.jlpt_level_old,
+                    jlpt_level_new = EXCLUDED.jlpt_level_new,
+                    updated_at = CURRENT_TIMESTAMP
+                RETURNING literal, id
+            """, [list(column) for column in zip(*kanji_rows.values())])
+            kanji_ids = dict(cursor.fetchall())
+            with self.kanji_cache_lock:
+                for character, kanji_id in kanji_ids.items():
+                    self.kanji_cache.setdefault(character, kanji_id)
+            
+            for table, columns in KANJI_CHILD_COLUMNS.items():
+                rows = [(kanji_ids[row[0]],) + row[1:] for row in children[table]]
+                self.insert_unnest(cursor, f'jlpt.{table}', (('kanji_id', 'uuid'),) + columns, rows)
             
             conn.commit()
             return len(kanji_batch_data)
@@ -185,65 +277,40 @@ class ParallelJLPTDataProcessor:
             cursor.close()
             conn.close()
     
-    def _process_kanji_subitems_inline(self, cursor, character_data, character, kanji_id):
-        """Process kanji sub-items inline (not batched, for parallel processing)."""
+    def _collect_kanji_subitems(self, children, character_data, character):
+        """Append a kanji's sub-items as (literal, ...) rows to the rows of each child table."""
         # Codepoints
         for codepoint in character_data.get('codepoints', []):
-            cursor.execute("""
-                INSERT INTO jlpt.kanji_codepoint (kanji_id, type, value)
-                VALUES (%s, %s, %s)
-                ON CONFLICT DO NOTHING
-            """, (kanji_id, codepoint.get('type', ''), codepoint.get('value', '')))
+            children['kanji_codepoint'].append((character, codepoint.get('type', ''), codepoint.get('value', '')))
         
         # Dictionary references
         for ref in character_data.get('dictionaryReferences', []):
             morohashi = ref.get('morohashi') or {}
-            cursor.execute("""
-                INSERT INTO jlpt.kanji_dictionary_reference (
-                    kanji_id, type, value, morohashi_volume, morohashi_page
-                ) VALUES (%s, %s, %s, %s, %s)
-                ON CONFLICT DO NOTHING
-            """, (kanji_id, ref.get('type', ''), ref.get('value', ''),
-                  morohashi.get('volume') if morohashi else None,
-                  morohashi.get('page') if morohashi else None))
+            children['kanji_dictionary_reference'].append((
+                character, ref.get('type', ''), ref.get('value', ''),
+                morohashi.get('volume'), morohashi.get('page')
+            ))
         
         # Query codes
         for qc in character_data.get('queryCodes', []):
-            cursor.execute("""
-                INSERT INTO jlpt.kanji_query_code (
-                    kanji_id, type, value, skip_missclassification
-                ) VALUES (%s, %s, %s, %s)
-                ON CONFLICT DO NOTHING
-            """, (kanji_id, qc.get('type', ''), qc.get('value', ''),
-                  qc.get('skipMisclassification')))
+            children['kanji_query_code'].append((character, qc.get('type', ''), qc.get('value', ''),
+                                                 qc.get('skipMisclassification')))
         
         # Readings and meanings
         reading_meaning = character_data.get('readingMeaning', {})
         if reading_meaning and 'groups' in reading_meaning:
             for group in reading_meaning['groups']:
                 for reading in group.get('readings', []):
-                    cursor.execute("""
-                        INSERT INTO jlpt.kanji_reading (
-                            kanji_id, type, value, status, on_type
-                        ) VALUES (%s, %s, %s, %s, %s)
-                        ON CONFLICT DO NOTHING
-                    """, (kanji_id, reading.get('type', ''), reading.get('value', ''),
-                          reading.get('status'), reading.get('onType')))
+                    children['kanji_reading'].append((character, reading.get('type', ''), reading.get('value', ''),
+                                                      reading.get('status'), reading.get('onType')))
                 
                 for meaning in group.get('meanings', []):
-                    cursor.execute("""
-                        INSERT INTO jlpt.kanji_meaning (kanji_id, lang, value)
-                        VALUES (%s, %s, %s)
-                        ON CONFLICT DO NOTHING
-                    """, (kanji_id, LANGUAGE_MAP.get(meaning.get('lang', '')), meaning.get('value', '')))
+                    children['kanji_meaning'].append((character, LANGUAGE_MAP.get(meaning.get('lang', '')),
+                                                      meaning.get('value', '')))
         
         # Nanori
         for nanori in reading_meaning.get('nanori', []):
-            cursor.execute("""
-                INSERT INTO jlpt.kanji_nanori (kanji_id, value)
-                VALUES (%s, %s)
-                ON CONFLICT DO NOTHING
-            """, (kanji_id, nanori))
+            children['kanji_nanori'].append((character, nanori))
     
     def process_kanji_data_parallel(self):
         """Process kanji data using parallel workers."""
@@ -277,7 +344,7 @@ class ParallelJLPTDataProcessor:
         with ThreadPoolExecutor(max_workers=NUM_WORKERS) as executor:
             futures = []
             for batch in kanji_batches:
-                future = executor.submit(self.process_kanji_batch_parallel, batch)
+                future = self.submit(executor, self.process_kanji_batch_parallel, batch)
                 futures.append(future)
             
             completed = 0
@@ -297,9 +364,11 @@ class ParallelJLPTDataProcessor:
         cursor = conn.cursor()
         
         local_pending_vocab_relations = []
+        # (vocabulary_id, sense) and (vocabulary_id, kanji_id) of the whole batch, written after the entries
+        senses = []
+        uses_kanji = []
 
         try:
-            processed = 0
             for word_data in vocab_batch_data:
                 jmdict_id = word_data.get('id', '')
                 if not jmdict_id:
@@ -323,15 +392,18 @@ class ParallelJLPTDataProcessor:
                 
                 # Process forms and senses
                 self._process_vocab_forms(cursor, vocabulary_id, word_data)
-                self._process_vocab_senses(cursor, vocabulary_id, word_data, local_pending_vocab_relations)
+                senses.extend((vocabulary_id, sense) for sense in word_data.get('sense', []))
+                uses_kanji.extend((vocabulary_id, kanji_id) for kanji_id in self._used_kanji(word_data))
                 self._process_furigana(cursor, vocabulary_id, 'vocabulary', word_data, self.vocab_furigana_map)
-                
-                processed += 1
-                if processed % 100 == 0:
-                    conn.commit()
-                    sys.stdout.flush()
             
+            # The whole batch commits at once; its senses are only written here
+            sense_ids = self._process_vocab_senses(cursor, senses, local_pending_vocab_relations)
+            self.insert_unnest(cursor, 'jlpt.vocabulary_uses_kanji',
+                               [('vocabulary_id', 'uuid'), ('kanji_id', 'uuid')], uses_kanji)
             conn.commit()
+            # Only committed senses; the examples stage attaches to them by position
+            with self.vocab_cache_lock:
+                self.vocabulary_sense_ids.update(sense_ids)
             return len(vocab_batch_data), local_pending_vocab_relations
             
         except Exception as e:
@@ -376,7 +448,7 @@ class ParallelJLPTDataProcessor:
         with ThreadPoolExecutor(max_workers=NUM_WORKERS) as executor:
             futures = []
             for batch in vocab_batches:
-                future = executor.submit(self.process_vocabulary_batch_parallel, batch)
+                future = self.submit(executor, self.process_vocabulary_batch_parallel, batch)
                 futures.append(future)
             
             completed = 0
@@ -608,28 +680,69 @@ class ParallelJLPTDataProcessor:
                 ON CONFLICT DO NOTHING
             """, [(tag, vid, text) for vid, text, tag in kana_tag_batch])
 
-    def _process_vocab_senses(self, cursor, vocabulary_id, word_data, pending_relations_list):
-        """Process senses for vocabulary."""
-        for sense in word_data.get('sense', []):
-            applies_to_kanji = sense.get('appliesToKanji', [])
-            applies_to_kana = sense.get('appliesToKana', [])
-            info = sense.get('info', [])
-            
-            cursor.execute("""
-                INSERT INTO jlpt.vocabulary_sense (vocabulary_id, applies_to_kanji, applies_to_kana, info)
-                VALUES (%s, %s, %s, %s)
+    def _process_vocab_senses(self, cursor, senses, pending_relations_list):
+        """
+        Insert the senses of a batch with their tags, language sources and glosses.
+        
+        All senses go in with one unnest ... WITH ORDINALITY statement. Their
+        ids are generated next to the ordinal of each (vocabulary, sense) pair
+        and returned with it, so every id is matched to its sense by position
+        rather than by the order RETURNING happens to produce; the attributes
+        of the whole batch then take one statement per table.
+        
+        Args:
+            cursor: Database cursor
+            senses: (vocabulary_id, sense) pairs in source order
+            pending_relations_list: Receives the relations of the senses for later resolution
+        
+        Returns:
+            vocabulary_id -> sense ids in source order
+        """
+        if not senses:
+            return {}
+        
+        cursor.execute("""
+            WITH s AS MATERIALIZED (
+                SELECT uuidv7() AS id, s.vocabulary_id, s.applies_to_kanji, s.applies_to_kana, s.info, s.ord
+                FROM unnest(%s::uuid[], %s::jsonb[], %s::jsonb[], %s::jsonb[]) WITH ORDINALITY
+                    AS s(vocabulary_id, applies_to_kanji, applies_to_kana, info, ord)
+                ORDER BY s.ord
+            ), inserted AS (
+                INSERT INTO jlpt.vocabulary_sense (id, vocabulary_id, applies_to_kanji, applies_to_kana, info)
+                SELECT s.id, s.vocabulary_id,
+                       ARRAY(SELECT jsonb_array_elements_text(s.applies_to_kanji)),
+                       ARRAY(SELECT jsonb_array_elements_text(s.applies_to_kana)),
+                       ARRAY(SELECT jsonb_array_elements_text(s.info))
+                FROM s ORDER BY s.ord
                 RETURNING id
-            """, (vocabulary_id, applies_to_kanji, applies_to_kana, info))
-            
-            sense_id = cursor.fetchone()[0]
-            
-            # Process sense attributes in batches
-            self._process_sense_attributes(cursor, sense_id, sense, pending_relations_list)
-
-    def _process_sense_attributes(self, cursor, sense_id, sense, pending_relations_list):
-        """Process attributes for a sense."""
+            )
+            SELECT s.ord, s.id FROM s JOIN inserted USING (id) ORDER BY s.ord
+        """, (
+            [vocabulary_id for vocabulary_id, _ in senses],
+            [json.dumps(sense.get('appliesToKanji', [])) for _, sense in senses],
+            [json.dumps(sense.get('appliesToKana', [])) for _, sense in senses],
+            [json.dumps(sense.get('info', [])) for _, sense in senses],
+        ))
+        returned = cursor.fetchall()
+        if [position for position, _ in returned] != list(range(1, len(senses) + 1)):
+            raise RuntimeError("vocabulary_sense ids were not returned for every sense ordinal")
+        
+        attributes = {table: [] for table in SENSE_ATTRIBUTE_COLUMNS}
+        for (_, sense_id), (_, sense) in zip(returned, senses):
+            self._process_sense_attributes(cursor, attributes, sense_id, sense, pending_relations_list)
+        
+        for table, columns in SENSE_ATTRIBUTE_COLUMNS.items():
+            self.insert_unnest(cursor, f'jlpt.{table}', columns, attributes[table])
+        
+        sense_ids = {}
+        for (_, sense_id), (vocabulary_id, _) in zip(returned, senses):
+            sense_ids.setdefault(vocabulary_id, []).append(sense_id)
+        return sense_ids
+
+    def _process_sense_attributes(self, cursor, attributes, sense_id, sense, pending_relations_list):
+        """Collect the tag, language source and gloss rows of a sense into attributes (table -> rows)."""
         # Unified tag processing
-        tag_batch = []
+        tag_batch = attributes['vocabulary_sense_tag']
         
         for pos in sense.get('partOfSpeech', []):
             self.ensure_tag_exists(cursor, pos, 'part_of_speech')
@@ -647,38 +760,17 @@ class ParallelJLPTDataProcessor:
             self.ensure_tag_exists(cursor, misc, 'misc')
             tag_batch.append((sense_id, misc, 'misc'))
         
-        if tag_batch:
-            cursor.executemany("""
-                INSERT INTO jlpt.vocabulary_sense_tag (sense_id, tag_code, tag_type)
-                VALUES (%s, %s, %s)
-                ON CONFLICT DO NOTHING
-            """, tag_batch)
-        
         # Language sources
-        lang_batch = [
+        attributes['vocabulary_sense_language_source'].extend(
             (sense_id, ls.get('lang'), ls.get('text'), ls.get('full'), ls.get('wasei'))
             for ls in sense.get('languageSource', [])
-        ]
-        if lang_batch:
-            cursor.executemany("""
-                INSERT INTO jlpt.vocabulary_sense_language_source (
-                    sense_id, lang, text, "full", wasei
-                ) VALUES (%s, %s, %s, %s, %s)
-                ON CONFLICT DO NOTHING
-            """, lang_batch)
+        )
         
         # Glosses
-        gloss_batch = [
+        attributes['vocabulary_sense_gloss'].extend(
             (sense_id, g.get('lang'), g.get('text'), g.get('gender'), g.get('type'))
             for g in sense.get('gloss', [])
-        ]
-        if gloss_batch:
-            cursor.executemany("""
-                INSERT INTO jlpt.vocabulary_sense_gloss (
-                    sense_id, lang, text, gender, type
-                ) VALUES (%s, %s, %s, %s, %s)
-                ON CONFLICT DO NOTHING
-            """, gloss_batch)
+        )
 
         # Related terms - store for later resolution
         for related in sense.get('related', []):
@@ -838,7 +930,7 @@ class ParallelJLPTDataProcessor:
         return
 
     def _load_tag_descriptions(self):
-        """Load tag descriptions from JSON source files using streaming."""
+        """Load tag descriptions from the headers of the JSON source files."""
         self._tag_descriptions = {}
         
         json_files = [
@@ -850,11 +942,9 @@ class ParallelJLPTDataProcessor:
         for json_file in json_files:
             if json_file.exists():
                 try:
-                    with open(json_file, 'rb') as f:
-                        # Stream only the tags section
-                        tags = ijson.kvitems(f, 'tags')
-                        for tag_code, description in tags:
-                            self._tag_descriptions[tag_code] = description
+                    # Stops reading once the tags map has been parsed
+                    tags = read_header(json_file, ('tags',)).get('tags', {})
+                    self._tag_descriptions.update(tags)
                     print(f"Loaded tags from {json_file.name}")
                 except Exception as e:
                     print(f"Error loading tags from {json_file}: {e}")
@@ -938,181 +1028,57 @@ class ParallelJLPTDataProcessor:
 
     def _normalize_radical_char(self, char):
         """Normalize look-alike radical characters (Katakana/Full-width to CJK Ideographs)."""
-        norm_map = {
-            '｜': '丨', '|': '丨',
-            'ノ': '丿',
-            'ハ': '八',
-            'ト': '卜',
-            'ヨ': '彐', 'ユ': '彐',
-            'マ': '龴',
-            'ム': '厶'
-        }
-        return norm_map.get(char, char)
-
-    def _get_radical_group_maps(self):
-        """
-        Load radical grouping maps from reference.txt.
-        Returns (char_to_leader, leader_to_ref_data).
-        """
-        ref_path = self.source_dir / "radfile" / "reference.txt"
-        char_to_leader = {}
-        leader_to_ref_data = {}
-        
-        if not ref_path.exists():
-            print(f"Radical reference file not found: {ref_path}", flush=True)
-            return char_to_leader, leader_to_ref_data
-        
-        print(f"Building radical group maps from {ref_path}...", flush=True)
-        with open(ref_path, 'r', encoding='utf-8') as f:
-            for line in f:
-                line = line.strip()
-                if not line: continue
-                
-                parts = line.split('\t')
-                if len(parts) < 7: parts += [''] * (7 - len(parts))
-                
-                leader = self._normalize_radical_char(parts[0])
-                variant = self._normalize_radical_char(parts[1]) if parts[1] else None
-                
-                # Transitive grouping: 
-                # If variant already has a leader, use it. 
-                # If leader already has a leader, use it.
-                if variant and char_to_leader.get(variant):
-                    current_leader = char_to_leader[variant]
-                else:
-                    current_leader = char_to_leader.get(leader, leader)
-                
-                char_to_leader[leader] = current_leader
-                if variant:
-                    char_to_leader[variant] = current_leader
-                
-                # Also record the original (un-normalized) characters as mapping to the leader
-                char_to_leader[parts[0]] = current_leader
-                if parts[1]:
-                    char_to_leader[parts[1]] = current_leader
-
-                if current_leader not in leader_to_ref_data:
-                    try:
-                        kxn = int(parts[2]) if parts[2] else None
-                    except ValueError:
-                        kxn = None
-                        
-                    leader_to_ref_data[current_leader] = {
-                        'meanings': [m.strip() for m in parts[5].split(',') if m.strip()],
-                        'readings': [r.strip() for r in parts[4].split('・') if r.strip()],
-                        'variants': {variant} if variant else set(),
-                        'notes': [parts[6]] if parts[6] else [],
-                        'kang_xi_number': kxn
-                    }
-                else:
-                    if variant:
-                        leader_to_ref_data[current_leader]['variants'].add(variant)
-                    if parts[6] and parts[6] not in leader_to_ref_data[current_leader]['notes']:
-                        leader_to_ref_data[current_leader]['notes'].append(parts[6])
-
-        # Final pass to ensure all variants are in the set
-        for char, leader in char_to_leader.items():
-            if char != leader:
-                leader_to_ref_data[leader]['variants'].add(char)
-                
-        return char_to_leader, leader_to_ref_data
+        return radical_groups.normalize(char)
 
     def process_radical_data_parallel(self):
         """Process radical data from radfile and kradfile."""
         print(f"Processing radical data with {NUM_WORKERS} workers...", flush=True)
         
-        conn = self.get_db_connection()
-        cursor = conn.cursor()
-        
-        # === Phase 1: Populate radical_group from reference.txt ===
-        print("Radical Phase 1: Populating radical_group...", flush=True)
         ref_path = self.source_dir / "radfile" / "reference.txt"
         if not ref_path.exists():
             print(f"Reference file not found: {ref_path}", flush=True)
-            cursor.close()
-            conn.close()
             return
         
-        # Parse reference.txt and insert into radical_group
-        radical_group_cache = {}  # canonical_literal -> group_id
+        # Transitive groups of reference.txt, shared with the async processor
+        print(f"Building radical group maps from {ref_path}...", flush=True)
+        char_to_leader, leader_to_ref_data = radical_groups.group_maps(ref_path)
         
-        with open(ref_path, 'r', encoding='utf-8') as f:
-            for line in f:
-                line = line.strip()
-                if not line: continue
-                
-                parts = line.split('\t')
-                if len(parts) < 7: parts += [''] * (7 - len(parts))
-                
-                canonical = parts[0]
-                norm_canonical = self._normalize_radical_char(canonical)
-                variant = parts[1] if parts[1] else None
-                
-                try:
-                    kxn = int(parts[2]) if parts[2] else None
-                except ValueError:
-                    kxn = None
-                    
-                readings = [r.strip() for r in parts[4].split('・') if r.strip()]
-                meanings = [m.strip() for m in parts[5].split(',') if m.strip()]
-                notes = [parts[6]] if parts[6] else []
-                
-                if norm_canonical not in radical_group_cache:
-                    cursor.execute("""
-                        INSERT INTO jlpt.radical_group (canonical_literal, kang_xi_number, meanings, readings, notes)
-                        VALUES (%s, %s, %s, %s, %s)
-                        ON CONFLICT (canonical_literal) DO UPDATE SET
-                            kang_xi_number = COALESCE(EXCLUDED.kang_xi_number, jlpt.radical_group.kang_xi_number),
-                            meanings = CASE WHEN array_length(EXCLUDED.meanings, 1) > 0 THEN EXCLUDED.meanings ELSE jlpt.radical_group.meanings END,
-                            readings = CASE WHEN array_length(EXCLUDED.readings, 1) > 0 THEN EXCLUDED.readings ELSE jlpt.radical_group.readings END,
-                            notes = jlpt.radical_group.notes || EXCLUDED.notes,
-                            updated_at = CURRENT_TIMESTAMP
-                        RETURNING id
-                    """, (norm_canonical, kxn, meanings, readings, notes))
-                    result = cursor.fetchone()
-                    if result:
-                        radical_group_cache[norm_canonical] = result[0]
-                        radical_group_cache[canonical] = result[0]
+        conn = self.get_db_connection()
+        cursor = conn.cursor()
+        
+        # === Phase 1: Populate radical_group from the grouped reference ===
+        print("Radical Phase 1: Populating radical_group...", flush=True)
+        leaders = list(leader_to_ref_data)
+        cursor.execute("""
+            INSERT INTO jlpt.radical_group (canonical_literal, kang_xi_number, meanings, readings, notes)
+            SELECT g.literal, g.kang_xi_number,
+                   ARRAY(SELECT jsonb_array_elements_text(g.meanings)),
+                   ARRAY(SELECT jsonb_array_elements_text(g.readings)),
+                   ARRAY(SELECT jsonb_array_elements_text(g.notes))
+            FROM unnest(%s::text[], %s::int[], %s::jsonb[], %s::jsonb[], %s::jsonb[])
+                AS g(literal, kang_xi_number, meanings, readings, notes)
+            ON CONFLICT (canonical_literal) DO UPDATE SET
+                kang_xi_number = COALESCE(EXCLUDED.kang_xi_number, jlpt.radical_group.kang_xi_number),
+                meanings = EXCLUDED.meanings,
+                readings = EXCLUDED.readings,
+                notes = EXCLUDED.notes,
+                updated_at = CURRENT_TIMESTAMP
+            RETURNING canonical_literal, id
+        """, (leaders, [leader_to_ref_data[leader]['kang_xi_number'] for leader in leaders],
+              *([json.dumps(leader_to_ref_data[leader][field], ensure_ascii=False) for leader in leaders]
+                for field in ('meanings', 'readings', 'notes'))))
+        radical_group_cache = dict(cursor.fetchall())  # leader -> group_id
         
         conn.commit()
-        print(f"Created {len(set(radical_group_cache.values()))} radical groups.", flush=True)
+        print(f"Created {len(radical_group_cache)} radical groups.", flush=True)
         
-        # === Phase 2: Populate radical_group_member from reference.txt ===
+        # === Phase 2: Populate radical_group_member ===
         print("Radical Phase 2: Populating radical_group_member...", flush=True)
-        member_count = 0
-        
-        with open(ref_path, 'r', encoding='utf-8') as f:
-            for line in f:
-                line = line.strip()
-                if not line: continue
-                
-                parts = line.split('\t')
-                if len(parts) < 7: parts += [''] * (7 - len(parts))
-                
-                canonical = parts[0]
-                variant = parts[1] if parts[1] else None
-                norm_canonical = self._normalize_radical_char(canonical)
-                group_id = radical_group_cache.get(norm_canonical)
-                if not group_id: continue
-                
-                # Insert canonical (and normalized canonical) as members
-                for lit, is_canon in [(canonical, True), (variant, False)]:
-                    if not lit: continue
-                    norm_lit = self._normalize_radical_char(lit)
-                    cursor.execute("""
-                        INSERT INTO jlpt.radical_group_member (group_id, literal, is_canonical)
-                        VALUES (%s, %s, %s)
-                        ON CONFLICT (group_id, literal) DO NOTHING
-                    """, (group_id, lit, is_canon))
-                    if lit != norm_lit:
-                        cursor.execute("""
-                            INSERT INTO jlpt.radical_group_member (group_id, literal, is_canonical)
-                            VALUES (%s, %s, %s)
-                            ON CONFLICT (group_id, literal) DO NOTHING
-                        """, (group_id, norm_lit, False))
-                    member_count += 1
+        members = [(radical_group_cache[leader], char, char == leader) for char, leader in char_to_leader.items()]
+        self.insert_unnest(cursor, 'jlpt.radical_group_member',
+                           [('group_id', 'uuid'), ('literal', 'text'), ('is_canonical', 'bool')], members)
         conn.commit()
-        print(f"Inserted {member_count} radical_group_member entries.", flush=True)
+        print(f"Inserted {len(members)} radical_group_member entries.", flush=True)
         
         # Build member -> group_id lookup for source.json linking
         cursor.execute("SELECT group_id, literal FROM jlpt.radical_group_member")
@@ -1160,7 +1126,7 @@ class ParallelJLPTDataProcessor:
         
         print(f"{total_radicals} source radicals. Processing in {len(radical_batches)} batches", flush=True)
         with ThreadPoolExecutor(max_workers=NUM_WORKERS) as executor:
-            futures = [executor.submit(self.process_radical_batch_parallel, batch) for batch in radical_batches]
+            futures = [self.submit(executor, self.process_radical_batch_parallel, batch) for batch in radical_batches]
             
             completed = 0
             for future in as_completed(futures):
@@ -1199,7 +1165,7 @@ class ParallelJLPTDataProcessor:
         print(f"Split {total_krad} krad entries into {len(krad_batches)} batches", flush=True)
         
         with ThreadPoolExecutor(max_workers=NUM_WORKERS) as executor:
-            futures = [executor.submit(self.process_krad_batch_parallel, batch) for batch in krad_batches]
+            futures = [self.submit(executor, self.process_krad_batch_parallel, batch) for batch in krad_batches]
             
             completed = 0
             for future in as_completed(futures):
@@ -1212,49 +1178,6 @@ class ParallelJLPTDataProcessor:
 
         print("Radical processing complete.", flush=True)
 
-    def process_kanji_vocabulary_relationships(self, conn, cursor):
-        """Process relationships between kanji and vocabulary."""
-        print("Processing kanji-vocabulary relationships...")
-        
-        # Use server-side cursor for large result sets
-        cursor.execute("""
-            SELECT v.id, vk.text 
-            FROM jlpt.vocabulary v
-            JOIN jlpt.vocabulary_kanji vk ON vk.vocabulary_id = v.id
-        """)
-        
-        relationship_batch = []
-        processed = 0
-        
-        while True:
-            rows = cursor.fetchmany(BATCH_SIZE)
-            if not rows:
-                break
-            
-            for vocab_id, kanji_text in rows:
-                # Find kanji characters in the text
-                for char in kanji_text:
-                    if char in self.kanji_cache:
-                        kanji_id = self.kanji_cache[char]
-                        relationship_batch.append((vocab_id, kanji_id))
-            
-            processed += len(rows)
-            if processed % (BATCH_SIZE * 10) == 0:
-                print(f"Processed {processed} vocabulary entries for relationships...")
-        
-        # Insert relationships in batches
-        print(f"Inserting {len(relationship_batch)} kanji-vocabulary relationships...")
-        for i in range(0, len(relationship_batch), BATCH_SIZE):
-            batch = relationship_batch[i:i + BATCH_SIZE]
-            cursor.executemany("""
-                INSERT INTO jlpt.vocabulary_uses_kanji (vocabulary_id, kanji_id)
-                VALUES (%s, %s)
-                ON CONFLICT DO NOTHING
-            """, batch)
-            self.periodic_commit(conn, cursor)
-        
-        self.periodic_commit(conn, cursor, force=True)
-
     def process_proper_nouns_batch_parallel(self, name_batch_data):
         """Process a batch of vocabulary in parallel."""
         conn = self.get_db_connection()
@@ -1339,7 +1262,7 @@ class ParallelJLPTDataProcessor:
         with ThreadPoolExecutor(max_workers=NUM_WORKERS) as executor:
             futures = []
             for batch in names_batches:
-                future = executor.submit(self.process_proper_nouns_batch_parallel, batch)
+                future = self.submit(executor, self.process_proper_nouns_batch_parallel, batch)
                 futures.append(future)
 
             completed = 0
@@ -1473,16 +1396,18 @@ class ParallelJLPTDataProcessor:
                     ON CONFLICT DO NOTHING
                 """, text_batch)
 
+    def _used_kanji(self, entry):
+        """Return the ids of the loaded kanji in an entry's kanji forms (deduplicated, in order)."""
+        used_kanji = {}
+        for kanji in entry.get('kanji', []):
+            for char in kanji.get('text', ''):
+                if char in self.kanji_cache:
+                    used_kanji[self.kanji_cache[char]] = None
+        return list(used_kanji)
+
     def _process_proper_noun_kanji_relationships(self, cursor, proper_noun_id, name_data):
         """Process kanji relationships for proper nouns."""
-        relationship_batch = []
-        
-        for kanji in name_data.get('kanji', []):
-            kanji_text = kanji.get('text', '')
-            for char in kanji_text:
-                if char in self.kanji_cache:
-                    kanji_id = self.kanji_cache[char]
-                    relationship_batch.append((proper_noun_id, kanji_id))
+        relationship_batch = [(proper_noun_id, kanji_id) for kanji_id in self._used_kanji(name_data)]
         
         if relationship_batch:
             cursor.executemany("""
@@ -1492,55 +1417,43 @@ class ParallelJLPTDataProcessor:
             """, relationship_batch)
 
     def process_vocabulary_examples_batch_parallel(self, example_batch_data):
-        """Process a batch of vocabulary examples in parallel."""
+        """
+        Process a batch of vocabulary examples with bulk statements.
+        
+        Every example is attached by position to the sense ids the vocabulary
+        stage returned in source order; the examples and their sentences then
+        take one statement each.
+        """
+        words = [(word_data, self.vocabulary_cache[word_data['id']]) for word_data in example_batch_data
+                 if word_data.get('id') and word_data['id'] in self.vocabulary_cache]
+        if not words:
+            return len(example_batch_data)
+        
         conn = self.get_db_connection()
         cursor = conn.cursor()
 
         try:
-            processed = 0
-            for word_data in example_batch_data:
-                jmdict_id = word_data.get('id', '')
-                if not jmdict_id or jmdict_id not in self.vocabulary_cache:
-                    continue
-                vocab_id = self.vocabulary_cache[jmdict_id]
-                # Process examples for each sense
-                for sense in word_data.get('sense', []):
+            example_rows = []
+            sentences = []
+            for word_data, vocab_id in words:
+                vocab_sense_ids = self.vocabulary_sense_ids.get(vocab_id, [])
+                for sense_id, sense in zip(vocab_sense_ids, word_data.get('sense', [])):
                     for example in sense.get('examples', []):
-                        source_type = example.get('source', {}).get('type')
-                        source_value = example.get('source', {}).get('value')
-                        text = example.get('text', '')
-                        
-                        cursor.execute("""
-                            INSERT INTO jlpt.vocabulary_sense_example (
-                                sense_id, source_type, source_value, text
-                            ) VALUES (
-                                (SELECT id FROM jlpt.vocabulary_sense WHERE vocabulary_id = %s LIMIT 1),
-                                %s, %s, %s
-                            )
-                            RETURNING id
-                        """, (vocab_id, source_type, source_value, text))
-                        
-                        result = cursor.fetchone()
-                        if result:
-                            example_id = result[0]
-                            
-                            # Process example sentences
-                            sentence_batch = [
-                                (example_id, s.get('lang'), s.get('text'))
-                                for s in example.get('sentences', [])
-                            ]
-                            
-                            if sentence_batch:
-                                cursor.executemany("""
-                                    INSERT INTO jlpt.vocabulary_sense_example_sentence (
-                                        example_id, lang, text
-                                    ) VALUES (%s, %s, %s)
-                                    ON CONFLICT DO NOTHING
-                                """, sentence_batch)
-                processed += 1
-                if processed % 100 == 0:
-                    conn.commit()
-                    sys.stdout.flush()
+                        source = example.get('source', {})
+                        example_rows.append((sense_id, source.get('type'), source.get('value'),
+                                             example.get('text', '')))
+                        sentences.append(example.get('sentences', []))
+            
+            example_ids = self.insert_unnest(cursor, 'jlpt.vocabulary_sense_example', (
+                ('sense_id', 'uuid'), ('source_type', 'text'), ('source_value', 'text'), ('text', 'text')
+            ), example_rows, on_conflict='', return_ids=True)
+            
+            self.insert_unnest(cursor, 'jlpt.vocabulary_sense_example_sentence', (
+                ('example_id', 'uuid'), ('lang', 'text'), ('text', 'text')
+            ), [(example_id, s.get('lang'), s.get('text'))
+                for example_id, example_sentences in zip(example_ids, sentences)
+                for s in example_sentences])
+            
             conn.commit()
             return len(example_batch_data)
         except Exception as e:
@@ -1582,7 +1495,7 @@ class ParallelJLPTDataProcessor:
         with ThreadPoolExecutor(max_workers=NUM_WORKERS) as executor:
             futures = []
             for batch in examples_batches:
-                future = executor.submit(self.process_vocabulary_examples_batch_parallel, batch)
+                future = self.submit(executor, self.process_vocabulary_examples_batch_parallel, batch)
                 futures.append(future)
             
             completed = 0
@@ -1764,7 +1677,7 @@ class ParallelJLPTDataProcessor:
         total_unresolved = 0
 
         with ThreadPoolExecutor(max_workers=NUM_WORKERS) as executor:
-            futures = [executor.submit(self.resolve_vocabulary_relations_batch, chunk) for chunk in relation_chunks]
+            futures = [self.submit(executor, self.resolve_vocabulary_relations_batch, chunk) for chunk in relation_chunks]
             
             for future in as_completed(futures):
                 try:
@@ -1857,7 +1770,7 @@ class ParallelJLPTDataProcessor:
         total_unresolved = 0
 
         with ThreadPoolExecutor(max_workers=NUM_WORKERS) as executor:
-            futures = [executor.submit(self.resolve_proper_noun_relations_batch, chunk) for chunk in relation_chunks]
+            futures = [self.submit(executor, self.resolve_proper_noun_relations_batch, chunk) for chunk in relation_chunks]
             
             for future in as_completed(futures):
                 try:
@@ -1880,7 +1793,7 @@ class ParallelJLPTDataProcessor:
         - If kanji exists but not unique: use kanji(kana)
         - If only kana exists: use kana text
         """
-        print("\n=== Step 10: Computing slugs ===" , flush=True)
+        print("Computing slugs...", flush=True)
         
         conn = self.get_db_connection()
         cursor = conn.cursor()
@@ -1890,31 +1803,33 @@ class ParallelJLPTDataProcessor:
             print("Computing vocabulary slugs...", flush=True)
             cursor.execute("""
                 UPDATE jlpt.vocabulary v
-                SET slug = (
-                    SELECT
+                SET slug = s.slug
+                FROM (
+                    SELECT e.id,
                         CASE
                             WHEN pk.text IS NOT NULL THEN
                                 CASE
-                                    WHEN (SELECT COUNT(*) FROM jlpt.vocabulary_kanji vk2 
-                                          WHERE vk2.text = pk.text AND vk2.is_primary = true) = 1
-                                    THEN pk.text
+                                    WHEN kc.n = 1 THEN pk.text
                                     ELSE pk.text || '(' || COALESCE(pka.text, '') || ')'
                                 END
-                            WHEN pka.text IS NOT NULL THEN pka.text
-                            ELSE NULL
-                        END
-                    FROM (
-                        SELECT text FROM jlpt.vocabulary_kanji
-                        WHERE vocabulary_id = v.id AND is_primary = true
-                        LIMIT 1
-                    ) pk
-                    FULL OUTER JOIN (
-                        SELECT text FROM jlpt.vocabulary_kana
-                        WHERE vocabulary_id = v.id AND is_primary = true
-                        LIMIT 1
-                    ) pka ON true
-                )
-                WHERE v.slug IS NULL
+                            ELSE pka.text
+                        END AS slug
+                    FROM jlpt.vocabulary e
+                    LEFT JOIN (
+                        SELECT DISTINCT ON (vocabulary_id) vocabulary_id, text FROM jlpt.vocabulary_kanji
+                        WHERE is_primary = true ORDER BY vocabulary_id, id
+                    ) pk ON pk.vocabulary_id = e.id
+                    LEFT JOIN (
+                        SELECT DISTINCT ON (vocabulary_id) vocabulary_id, text FROM jlpt.vocabulary_kana
+                        WHERE is_primary = true ORDER BY vocabulary_id, id
+                    ) pka ON pka.vocabulary_id = e.id
+                    LEFT JOIN (
+                        SELECT text, COUNT(*) AS n FROM jlpt.vocabulary_kanji
+                        WHERE is_primary = true GROUP BY text
+                    ) kc ON kc.text = pk.text
+                    WHERE e.slug IS NULL
+                ) s
+                WHERE v.id = s.id
             """)
             vocab_updated = cursor.rowcount
             conn.commit()
@@ -1924,31 +1839,33 @@ class ParallelJLPTDataProcessor:
             print("Computing proper noun slugs...", flush=True)
             cursor.execute("""
                 UPDATE jlpt.proper_noun p
-                SET slug = (
-                    SELECT
+                SET slug = s.slug
+                FROM (
+                    SELECT e.id,
                         CASE
                             WHEN pk.text IS NOT NULL THEN
                                 CASE
-                                    WHEN (SELECT COUNT(*) FROM jlpt.proper_noun_kanji pnk2 
-                                          WHERE pnk2.text = pk.text AND pnk2.is_primary = true) = 1
-                                    THEN pk.text
+                                    WHEN kc.n = 1 THEN pk.text
                                     ELSE pk.text || '(' || COALESCE(pka.text, '') || ')'
                                 END
-                            WHEN pka.text IS NOT NULL THEN pka.text
-                            ELSE NULL
-                        END
-                    FROM (
-                        SELECT text FROM jlpt.proper_noun_kanji
-                        WHERE proper_noun_id = p.id AND is_primary = true
-                        LIMIT 1
-                    ) pk
-                    FULL OUTER JOIN (
-                        SELECT text FROM jlpt.proper_noun_kana
-                        WHERE proper_noun_id = p.id AND is_primary = true
-                        LIMIT 1
-                    ) pka ON true
-                )
-                WHERE p.slug IS NULL
+                            ELSE pka.text
+                        END AS slug
+                    FROM jlpt.proper_noun e
+                    LEFT JOIN (
+                        SELECT DISTINCT ON (proper_noun_id) proper_noun_id, text FROM jlpt.proper_noun_kanji
+                        WHERE is_primary = true ORDER BY proper_noun_id, id
+                    ) pk ON pk.proper_noun_id = e.id
+                    LEFT JOIN (
+                        SELECT DISTINCT ON (proper_noun_id) proper_noun_id, text FROM jlpt.proper_noun_kana
+                        WHERE is_primary = true ORDER BY proper_noun_id, id
+                    ) pka ON pka.proper_noun_id = e.id
+                    LEFT JOIN (
+                        SELECT text, COUNT(*) AS n FROM jlpt.proper_noun_kanji
+                        WHERE is_primary = true GROUP BY text
+                    ) kc ON kc.text = pk.text
+                    WHERE e.slug IS NULL
+                ) s
+                WHERE p.id = s.id
             """)
             pn_updated = cursor.rowcount
             conn.commit()
@@ -1962,6 +1879,44 @@ class ParallelJLPTDataProcessor:
             cursor.close()
             conn.close()
 
+    def build_term_caches(self):
+        """Build the vocabulary and proper noun term caches on their own connection."""
+        conn = self.get_db_connection()
+        cursor = conn.cursor()
+        try:
+            self.build_vocabulary_term_cache(cursor)
+            self.build_proper_noun_term_cache(cursor)
+        finally:
+            cursor.close()
+            conn.close()
+
+    def build_stage_graph(self):
+        """
+        Declare the processing steps and what each needs from the others.
+
+        Vocabulary, radicals and proper nouns link to kanji, examples to
+        vocabulary.
+        """
+        graph = StageGraph()
+        graph.add('kanji', self.process_kanji_data_parallel, outputs=['kanji_cache'])
+        graph.add('vocabulary', self.process_vocabulary_data_parallel,
+                  ['kanji_cache'], ['vocabulary_cache', 'vocabulary_sense_ids', 'pending_vocab_relations'])
+        graph.add('examples', self.process_vocabulary_examples_parallel,
+                  ['vocabulary_cache', 'vocabulary_sense_ids'], ['vocabulary_sense_example'])
+        graph.add('radicals', self.process_radical_data_parallel,
+                  ['kanji_cache'], ['radical_cache', 'kanji_radical'])
+        graph.add('proper_nouns', self.process_proper_nouns_parallel,
+                  ['kanji_cache'], ['proper_noun', 'pending_proper_noun_relations'])
+        graph.add('term_caches', self.build_term_caches,
+                  ['vocabulary_cache', 'proper_noun'], ['vocab_term_cache', 'proper_noun_term_cache'])
+        graph.add('vocab_relations', self.resolve_vocabulary_relations_parallel,
+                  ['vocab_term_cache', 'pending_vocab_relations'], ['vocabulary_sense_relation'])
+        graph.add('proper_noun_relations', self.resolve_proper_noun_relations_parallel,
+                  ['proper_noun_term_cache', 'pending_proper_noun_relations'],
+                  ['proper_noun_translation_related'])
+        graph.add('slugs', self._compute_slugs, ['vocabulary_cache', 'proper_noun'], ['slug'])
+        return graph
+
     def process_all_data_parallel(self):
         """Process all data with parallelization where beneficial."""
         print("Starting parallel data processing...", flush=True)
@@ -1976,42 +1931,8 @@ class ParallelJLPTDataProcessor:
         self.pre_populate_tags()
         
         try:
-            print("\n=== Step 1: Processing kanji data (PARALLEL) ===", flush=True)
-            self.process_kanji_data_parallel()
-            
-            print("\n=== Step 2: Processing vocabulary data (PARALLEL) ===", flush=True)
-            self.process_vocabulary_data_parallel()
-            
-            print("\n=== Step 3: Processing vocabulary examples (PARALLEL) ===", flush=True)
-            self.process_vocabulary_examples_parallel()
-            
-            print("\n=== Step 4: Processing radical data ===", flush=True)
-            self.process_radical_data_parallel()
-            
-            print("\n=== Step 5: Processing proper nouns (PARALLEL) ===", flush=True)
-            self.process_proper_nouns_parallel()
-            
-            print("\n=== Step 6: Processing kanji-vocabulary relationships ===", flush=True)
-            conn = self.get_db_connection()
-            cursor = conn.cursor()
-            self.process_kanji_vocabulary_relationships(conn, cursor)
-            
-            print("\n=== Step 7: Building term lookup caches ===", flush=True)
-            self.build_vocabulary_term_cache(cursor)
-            self.build_proper_noun_term_cache(cursor)
-            
-            # Close this connection, workers will use their own
-            cursor.close()
-            conn.close()
-
-            print("\n=== Step 8: Resolving vocabulary relationships ===", flush=True)
-            self.resolve_vocabulary_relations_parallel()
-            
-            print("\n=== Step 9: Resolving proper noun relationships ===", flush=True)
-            self.resolve_proper_noun_relations_parallel()
-            
-            # Post-process: Compute slugs for vocabulary and proper nouns
-            self._compute_slugs()
+            graph = self.build_stage_graph()
+            graph.run_threaded()
             
             print("\n=== All data processing completed successfully! ===", flush=True)
                         
@@ -2043,6 +1964,10 @@ class ParallelJLPTDataProcessor:
             cursor.close()
             conn.close()
             
+            print("\n=== Stage Timings ===", flush=True)
+            for line in graph.report():
+                print(line, flush=True)
+            
             return True
             
         except Exception as e:
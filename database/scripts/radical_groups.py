@@ -0,0 +1,117 @@
+"""
+Radical groups of the radfile reference (radfile/reference.txt).
+
+Each reference line names a radical, an optional variant, the Kang Xi number,
+readings, meanings and a note (tab separated). Lines whose radical or variant
+already belongs to a group join that group, so variants chain transitively to
+the first radical of their group, the leader.
+
+Look-alike characters the sources use for radicals (katakana, full-width bar)
+are normalized to their CJK ideographs before grouping.
+"""
+
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+LOOKALIKES = {
+    '｜': '丨', '|': '丨',
+    'ノ': '丿',
+    'ハ': '八',
+    'ト': '卜',
+    'ヨ': '彐', 'ユ': '彐',
+    'マ': '龴',
+    'ム': '厶'
+}
+
+
+def normalize(char: str) -> str:
+    """Normalize look-alike radical characters (Katakana/Full-width to CJK Ideographs)."""
+    return LOOKALIKES.get(char, char)
+
+
+def _kang_xi_number(value: str) -> Optional[int]:
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
+
+
+def _extend_unique(values: List[str], new_values: List[str]) -> None:
+    for value in new_values:
+        if value not in values:
+            values.append(value)
+
+
+def group_maps(ref_path: Path) -> Tuple[Dict[str, str], Dict[str, dict]]:
+    """
+    Group the radicals of reference.txt.
+
+    Args:
+        ref_path: Path of reference.txt
+
+    Returns:
+        (char_to_leader, leader_to_ref_data): the leader of every radical and
+        variant (normalized and as written), and per leader its meanings,
+        readings, variants, notes and kang_xi_number (merged over the lines of
+        the group, the first Kang Xi number wins)
+    """
+    char_to_leader: Dict[str, str] = {}
+    leader_to_ref_data: Dict[str, dict] = {}
+
+    with open(ref_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+
+            parts = line.split('\t')
+            parts += [''] * (7 - len(parts))
+
+            leader = normalize(parts[0])
+            variant = normalize(parts[1]) if parts[1] else None
+
+            # Transitive grouping:
+            # If variant already has a leader, use it.
+            # If leader already has a leader, use it.
+            if variant and char_to_leader.get(variant):
+                current_leader = char_to_leader[variant]
+            else:
+                current_leader = char_to_leader.get(leader, leader)
+
+            char_to_leader[leader] = current_leader
+            if variant:
+                char_to_leader[variant] = current_leader
+
+            # Also record the original (un-normalized) characters as mapping to the leader
+            char_to_leader[parts[0]] = current_leader
+            if parts[1]:
+                char_to_leader[parts[1]] = current_leader
+
+            meanings = [m.strip() for m in parts[5].split(',') if m.strip()]
+            readings = [r.strip() for r in parts[4].split('・') if r.strip()]
+            if current_leader not in leader_to_ref_data:
+                leader_to_ref_data[current_leader] = {
+                    'meanings': meanings,
+                    'readings': readings,
+                    'variants': {variant} if variant else set(),
+                    'notes': [parts[6]] if parts[6] else [],
+                    'kang_xi_number': _kang_xi_number(parts[2])
+                }
+            else:
+                # Merged lines add their meanings, readings and notes to the group
+                ref_data = leader_to_ref_data[current_leader]
+                if variant:
+                    ref_data['variants'].add(variant)
+                _extend_unique(ref_data['meanings'], meanings)
+                _extend_unique(ref_data['readings'], readings)
+                if parts[6]:
+                    _extend_unique(ref_data['notes'], [parts[6]])
+                if ref_data['kang_xi_number'] is None:
+                    ref_data['kang_xi_number'] = _kang_xi_number(parts[2])
+
+    # Final pass to ensure all variants are in the set
+    for char, leader in char_to_leader.items():
+        if char != leader:
+            leader_to_ref_data[leader]['variants'].add(char)
+
+    return char_to_leader, leader_to_ref_data
@@ -24,17 +24,35 @@ sys.stderr.reconfigure(line_buffering=True)
 script_dir = Path(__file__).parent
 sys.path.insert(0, str(script_dir))
 
-def clean_database():
-    """Clean the database before processing."""
-    print("Cleaning database...", flush=True)
-    
-    db_params = {
+import delta_load
+import index_manager
+import load_checkpoint
+import load_metrics
+import load_profile
+import shadow_schema
+import sql_profiler
+import stage_profiler
+
+# Source files the processors load (database/source unless set)
+SOURCE_DIR = Path(os.getenv('JMDICT_SOURCE_DIR', script_dir.parent / 'source'))
+
+
+def get_db_params():
+    """Return psycopg2 connection parameters from the environment."""
+    return {
         'host': os.getenv('POSTGRES_HOST', 'localhost'),
         'port': os.getenv('POSTGRES_PORT', '5432'),
         'database': os.getenv('POSTGRES_DB', 'jlptreference'),
         'user': os.getenv('POSTGRES_USER', 'jlptuser'),
         'password': os.getenv('POSTGRES_PASSWORD', 'jlptpassword')
     }
+
+
+def clean_database():
+    """Clean the database before processing."""
+    print("Cleaning database...", flush=True)
+    
+    db_params = get_db_params()
     
     max_retries = 30
     retry_delay = 2
@@ -104,17 +122,11 @@ def clean_database():
 
 
 
-def update_status():
+def update_status(schema='jlpt'):
     """Update the database status with the current timestamp."""
     print("Updating database status...", flush=True)
     
-    db_params = {
-        'host': os.getenv('POSTGRES_HOST', 'localhost'),
-        'port': os.getenv('POSTGRES_PORT', '5432'),
-        'database': os.getenv('POSTGRES_DB', 'jlptreference'),
-        'user': os.getenv('POSTGRES_USER', 'jlptuser'),
-        'password': os.getenv('POSTGRES_PASSWORD', 'jlptpassword')
-    }
+    db_params = get_db_params()
     
     conn = None
     try:
@@ -123,7 +135,7 @@ def update_status():
         
         # Insert the status record (id=1 is enforced by check constraint)
         # using NOW() for the timestamp
-        cursor.execute("INSERT INTO jlpt.status (id, last_update) VALUES (1, NOW()) ON CONFLICT (id) DO UPDATE SET last_update = NOW();")
+        cursor.execute(f"INSERT INTO {schema}.status (id, last_update) VALUES (1, NOW()) ON CONFLICT (id) DO UPDATE SET last_update = NOW();")
         
         conn.commit()
         print("Database status updated successfully.", flush=True)
@@ -143,9 +155,141 @@ def main():
     print("JLPT Reference Database - Data Processor", flush=True)
     print("=" * 60, flush=True)
     
-    # Clean the database first
-    clean_database()
+    # Per-stage metrics of the run, written next to .data_seeded (see load_metrics),
+    # and the profiles ETL_PROFILE asks for (see stage_profiler and sql_profiler)
+    with load_metrics.collect() as metrics, stage_profiler.session(), sql_profiler.session():
+        exit_code = 1
+        try:
+            exit_code = run_load(get_db_params())
+        finally:
+            metrics.write(exit_code == 0)
+    return exit_code
+
+
+def run_load(db_params):
+    """Run a delta, shadow or full load (see main)."""
+    if delta_load.resolve_load_mode(db_params) == 'delta':
+        load_metrics.describe(load='delta')
+        if run_delta() == 0:
+            update_status()
+            return 0
+        print("Delta load failed, falling back to a full load", flush=True)
+    
+    if shadow_schema.SHADOW_LOAD:
+        load_metrics.describe(load='shadow')
+        return run_shadow_load(db_params)
+    
+    load_metrics.describe(load='full')
+    # Resume an interrupted load of the same sources, otherwise clean the database first
+    fingerprint = load_checkpoint.source_fingerprint(SOURCE_DIR)
+    if load_checkpoint.can_resume(db_params, fingerprint):
+        print("Resuming the interrupted load from its checkpoint", flush=True)
+    else:
+        with load_metrics.stage('clean'):
+            clean_database()
+            load_checkpoint.start(db_params, fingerprint)
+    
+    # Secondary indexes are rebuilt once after the load instead of per row
+    with load_metrics.stage('drop_indexes'):
+        index_manager.drop_indexes(db_params)
     
+    try:
+        with load_metrics.stage('load'), load_profile.bulk_load(db_params):
+            exit_code = run_processors()
+    finally:
+        print("", flush=True)
+        with load_metrics.stage('rebuild_indexes'):
+            indexes_ok = index_manager.rebuild_indexes(db_params)
+    
+    if exit_code == 0:
+        if not indexes_ok:
+            print("❌ Index rebuild failed!", flush=True)
+            return 1
+        if update_status():
+            load_checkpoint.finish(db_params)
+    return exit_code
+
+
+def run_shadow_load(db_params):
+    """Full load into the shadow schema, swapped in once it is complete (see shadow_schema)."""
+    schema = shadow_schema.SHADOW_SCHEMA
+    fingerprint = load_checkpoint.source_fingerprint(SOURCE_DIR)
+    if load_checkpoint.can_resume(db_params, fingerprint, schema):
+        print(f"Resuming the interrupted load of {schema} from its checkpoint", flush=True)
+    else:
+        with load_metrics.stage('clean'):
+            shadow_schema.create_shadow_schema(db_params, schema)
+            load_checkpoint.start(db_params, fingerprint, schema)
+    with load_metrics.stage('drop_indexes'):
+        index_manager.drop_indexes(db_params, schema)
+    
+    try:
+        with load_metrics.stage('load'), load_profile.bulk_load(db_params, schema):
+            exit_code = run_processors(schema)
+    finally:
+        print("", flush=True)
+        with load_metrics.stage('rebuild_indexes'):
+            indexes_ok = index_manager.rebuild_indexes(db_params, schema)
+    
+    if exit_code != 0:
+        print(f"❌ Shadow load failed, {shadow_schema.LIVE_SCHEMA} is unchanged", flush=True)
+        return exit_code
+    if not indexes_ok:
+        print("❌ Index rebuild failed!", flush=True)
+        return 1
+    
+    with load_metrics.stage('analyze'):
+        shadow_schema.analyze_schema(db_params, schema)
+    problems = shadow_schema.validate_row_counts(db_params, schema)
+    if problems:
+        print(f"❌ Shadow schema {schema} failed validation, not swapping:", flush=True)
+        for problem in problems:
+            print(f"  - {problem}", flush=True)
+        return 1
+    
+    if not update_status(schema):
+        return 1
+    load_checkpoint.finish(db_params, schema)
+    with load_metrics.stage('swap'):
+        shadow_schema.swap_schemas(db_params, schema)
+    if not shadow_schema.SHADOW_KEEP_RETIRED:
+        shadow_schema.drop_schema(db_params, shadow_schema.RETIRED_SCHEMA)
+    return 0
+
+
+def run_delta():
+    """Apply the changed source entries to the loaded database (see delta_load)."""
+    print("", flush=True)
+    print("Using DELTA load (only changed entries are written)", flush=True)
+    print("", flush=True)
+    
+    try:
+        import asyncio
+        from process_data_async import AsyncJLPTDataProcessor
+        
+        async def run_async():
+            processor = AsyncJLPTDataProcessor(delta=True)
+            return await processor.process_all()
+        
+        start_time = time.time()
+        with load_metrics.stage('load'):
+            success = asyncio.run(run_async())
+        elapsed = time.time() - start_time
+    except Exception as e:
+        print(f"Delta load failed ({e})", flush=True)
+        return 1
+    
+    if not success:
+        return 1
+    print("", flush=True)
+    print("=" * 60, flush=True)
+    print(f"✅ Delta load completed successfully in {elapsed:.2f} seconds!", flush=True)
+    print("=" * 60, flush=True)
+    return 0
+
+
+def run_processors(schema='jlpt'):
+    """Run the async processor, falling back to the parallel one (jlpt schema only)."""
     print("", flush=True)
     print("Processing data sources:", flush=True)
     print("- Kanji data from kanjidic2", flush=True)
@@ -168,7 +312,8 @@ def main():
             from process_data_async import AsyncJLPTDataProcessor
             
             async def run_async():
-                processor = AsyncJLPTDataProcessor()
+                processor = AsyncJLPTDataProcessor(
+                    schema=schema, checkpoint=load_checkpoint.LoadCheckpoint(schema))
                 return await processor.process_all()
             
             start_time = time.time()
@@ -180,7 +325,6 @@ def main():
                 print("=" * 60, flush=True)
                 print(f"✅ Data processing completed successfully in {elapsed:.2f} seconds!", flush=True)
                 print("=" * 60, flush=True)
-                update_status()
                 return 0
             else:
                 print("❌ Data processing failed!", flush=True)
@@ -193,6 +337,10 @@ def main():
             print(f"Async processor failed ({e}), falling back to parallel", flush=True)
             use_async = False
     
+    if schema != 'jlpt':
+        print(f"The parallel processor only loads the jlpt schema, not {schema}", flush=True)
+        return 1
+    
     # Fall back to parallel processor
     num_workers = int(os.getenv('NUM_WORKERS', '4'))
     use_parallel = not use_async
@@ -214,7 +362,6 @@ def main():
                 print("=" * 60, flush=True)
                 print(f"✅ Data processing completed successfully in {elapsed:.2f} seconds!", flush=True)
                 print("=" * 60, flush=True)
-                update_status()
                 return 0
             else:
                 print("❌ Data processing failed!", flush=True)
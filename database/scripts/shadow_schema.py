@@ -0,0 +1,170 @@
+"""
+Blue/green full loads through a shadow schema.
+
+Instead of truncating the live jlpt schema, a shadow load builds a fresh copy
+of it under SHADOW_SCHEMA from the init scripts (tables, triggers and
+functions), loads the data there while the API keeps serving jlpt, rebuilds
+the indexes, runs ANALYZE and checks the row counts against the live schema.
+The schemas then trade names with two renames in one short transaction, and
+the previous data is dropped afterwards.
+
+Function bodies in 03-init-functions.sql refer to jlpt.<table>. Only the
+function names are moved to the shadow schema; the bodies are created
+unchecked and resolve against the shadow tables once it is renamed to jlpt.
+"""
+
+import os
+import re
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import psycopg2
+from psycopg2 import errors
+
+# Set to 1 to run full loads through the shadow schema
+SHADOW_LOAD = os.getenv('SHADOW_LOAD', '0') == '1'
+
+LIVE_SCHEMA = 'jlpt'
+SHADOW_SCHEMA = os.getenv('SHADOW_SCHEMA', 'jlpt_next')
+RETIRED_SCHEMA = os.getenv('RETIRED_SCHEMA', 'jlpt_old')
+
+# Keep the previous data as RETIRED_SCHEMA after the swap (dropped by the next shadow load)
+SHADOW_KEEP_RETIRED = os.getenv('SHADOW_KEEP_RETIRED', '0') == '1'
+
+# Every shadow table needs at least this share of its live row count
+SHADOW_MIN_ROW_RATIO = float(os.getenv('SHADOW_MIN_ROW_RATIO', '0.9'))
+
+# The swap gives up on a lock after this long and retries
+SWAP_LOCK_TIMEOUT = os.getenv('SWAP_LOCK_TIMEOUT', '5s')
+SWAP_RETRIES = int(os.getenv('SWAP_RETRIES', '5'))
+
+# Schema init scripts, in execution order
+INIT_SQL_DIR = Path(os.getenv('INIT_SQL_DIR', Path(__file__).parent.parent / 'init'))
+INIT_SCRIPTS = ('01-init-database.sql', '02-init-triggers.sql', '03-init-functions.sql')
+
+# Tables that may never be empty after a load
+REQUIRED_TABLES = ('kanji', 'vocabulary', 'proper_noun', 'tag')
+
+
+def _schema_script(name: str, sql: str, schema: str) -> str:
+    """Rewrite an init script so it creates its objects in another schema."""
+    if name == '03-init-functions.sql':
+        sql = re.sub(r'\bFUNCTION jlpt\.', f'FUNCTION {schema}.', sql)
+        sql = re.sub(r'\bSET search_path TO jlpt\b', f'SET search_path TO {schema}', sql)
+        return 'SET check_function_bodies = off;\n' + sql
+    return re.sub(r'\bjlpt\b', schema, sql)
+
+
+def create_shadow_schema(db_params: dict, schema: str = SHADOW_SCHEMA) -> None:
+    """(Re)create the shadow schema, empty, from the init scripts."""
+    print(f"Creating shadow schema {schema}...", flush=True)
+    conn = psycopg2.connect(**db_params)
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(f'DROP SCHEMA IF EXISTS {schema} CASCADE')
+            for name in INIT_SCRIPTS:
+                sql = (INIT_SQL_DIR / name).read_text(encoding='utf-8')
+                cursor.execute(_schema_script(name, sql, schema))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def drop_schema(db_params: dict, schema: str) -> None:
+    """Drop a schema and everything in it."""
+    conn = psycopg2.connect(**db_params)
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(f'DROP SCHEMA IF EXISTS {schema} CASCADE')
+    finally:
+        conn.close()
+
+
+def analyze_schema(db_params: dict, schema: str = SHADOW_SCHEMA) -> None:
+    """ANALYZE every table of a schema (after its indexes exist)."""
+    start = time.perf_counter()
+    conn = psycopg2.connect(**db_params)
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cursor:
+            for table in _tables(cursor, schema):
+                cursor.execute(f'ANALYZE {schema}.{table}')
+    finally:
+        conn.close()
+    print(f"Analyzed {schema} ({time.perf_counter() - start:.2f}s)", flush=True)
+
+
+def _tables(cursor, schema: str) -> List[str]:
+    cursor.execute("""
+        SELECT c.relname FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = %s AND c.relkind = 'r' ORDER BY c.relname
+    """, (schema,))
+    return [row[0] for row in cursor.fetchall()]
+
+
+def _row_counts(cursor, schema: str) -> Dict[str, int]:
+    counts = {}
+    for table in _tables(cursor, schema):
+        cursor.execute(f'SELECT COUNT(*) FROM {schema}.{table}')
+        counts[table] = cursor.fetchone()[0]
+    return counts
+
+
+def validate_row_counts(db_params: dict, schema: str = SHADOW_SCHEMA,
+                        live_schema: str = LIVE_SCHEMA) -> List[str]:
+    """
+    Compare the row counts of the shadow schema with the live schema.
+
+    Returns:
+        Problems found (empty if the shadow schema may be swapped in)
+    """
+    conn = psycopg2.connect(**db_params)
+    try:
+        with conn.cursor() as cursor:
+            shadow = _row_counts(cursor, schema)
+            live = _row_counts(cursor, live_schema)
+    finally:
+        conn.close()
+
+    problems = [f"{table} is empty" for table in REQUIRED_TABLES if not shadow.get(table)]
+    print(f"Row counts ({schema} / {live_schema}):", flush=True)
+    for table, count in shadow.items():
+        live_count = live.get(table, 0)
+        print(f"  {table}: {count:,} / {live_count:,}", flush=True)
+        if table != 'status' and count < live_count * SHADOW_MIN_ROW_RATIO:
+            problems.append(f"{table} has {count:,} rows, live has {live_count:,}")
+    return problems
+
+
+def swap_schemas(db_params: dict, schema: str = SHADOW_SCHEMA, live_schema: str = LIVE_SCHEMA,
+                 retired_schema: str = RETIRED_SCHEMA) -> None:
+    """
+    Make the shadow schema live by renaming both schemas in one transaction.
+
+    The live schema becomes retired_schema. Lock timeouts are retried up to
+    SWAP_RETRIES times.
+    """
+    drop_schema(db_params, retired_schema)
+    conn = psycopg2.connect(**db_params)
+    try:
+        for attempt in range(1, SWAP_RETRIES + 1):
+            try:
+                with conn.cursor() as cursor:
+                    start = time.perf_counter()
+                    cursor.execute("SET LOCAL lock_timeout = %s", (SWAP_LOCK_TIMEOUT,))
+                    cursor.execute(f'ALTER SCHEMA {live_schema} RENAME TO {retired_schema}')
+                    cursor.execute(f'ALTER SCHEMA {schema} RENAME TO {live_schema}')
+                conn.commit()
+                print(f"Swapped {schema} in as {live_schema} "
+                      f"({(time.perf_counter() - start) * 1000:.0f}ms)", flush=True)
+                return
+            except errors.LockNotAvailable:
+                conn.rollback()
+                if attempt == SWAP_RETRIES:
+                    raise
+                print(f"Swap attempt {attempt}/{SWAP_RETRIES}: lock timeout, retrying", flush=True)
+                time.sleep(attempt)
+    finally:
+        conn.close()
@@ -0,0 +1,119 @@
+"""
+Header reader for jmdict-simplified source files.
+
+Every jmdict-simplified document starts with a few small metadata keys
+(version, languages, dictDate, tags, ...) followed by the entry data. The
+header reader decodes top-level keys one by one and returns as soon as the
+requested keys have been consumed or the entry data begins, so reading the
+tags of a multi-hundred-MB file only touches its first few kilobytes.
+
+Only the standard library is used, so ndjson_shards can stream documents with
+the same DocumentScanner in the jmdict-processor container.
+"""
+
+import json
+from pathlib import Path
+from typing import Any, Dict, Iterable, Tuple
+
+# Metadata keys read by default
+HEADER_KEYS = ('tags', 'version', 'dictDate', 'languages')
+
+# Top-level keys holding the entry data; the header ends where they start
+DATA_KEYS = ('words', 'characters', 'kanji', 'radicals')
+
+_DECODER = json.JSONDecoder()
+
+
+class DocumentScanner:
+    """Incremental reader over a JSON text file using JSONDecoder.raw_decode."""
+
+    def __init__(self, f, read_chars: int = 8 * 1024 * 1024, lookahead_chars: int = 1024 * 1024):
+        """
+        Initialize the scanner.
+
+        Args:
+            f: File opened in text mode
+            read_chars: Characters read from the file at a time
+            lookahead_chars: Characters kept buffered before decoding a value
+        """
+        self.f = f
+        self.read_chars = read_chars
+        self.lookahead_chars = lookahead_chars
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def _read_more(self) -> bool:
+        chunk = self.f.read(self.read_chars)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self, skip: str = ' \t\r\n') -> str:
+        """Skip the given characters and return the next one ('' at the end)."""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in skip:
+                self.pos += 1
+            if self.pos < len(self.buf) or not self._read_more():
+                return self.buf[self.pos:self.pos + 1]
+
+    def expect(self, char: str) -> None:
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Expected '{char}' but found '{found}' in JSON document")
+        self.pos += 1
+
+    def decode(self) -> Tuple[Any, str]:
+        """Decode the next value and return it with its source text."""
+        self.peek()
+        if len(self.buf) - self.pos < self.lookahead_chars and not self.eof:
+            self._read_more()
+        while True:
+            try:
+                value, end = _DECODER.raw_decode(self.buf, self.pos)
+                # A number ending at the buffer end may continue in the file
+                if end < len(self.buf) or self.eof or not self._read_more():
+                    break
+            except json.JSONDecodeError:
+                # The value runs past the buffer; read on and retry
+                if not self._read_more():
+                    raise
+        text = self.buf[self.pos:end]
+        self.pos = end
+        return value, text
+
+
+def read_header(path: Path, keys: Iterable[str] = HEADER_KEYS,
+                read_chars: int = 64 * 1024) -> Dict[str, Any]:
+    """
+    Read top-level metadata keys from the start of a source file.
+
+    Parsing stops once every requested key has been read or an entry data
+    key (DATA_KEYS) is reached; the data itself is never decoded.
+
+    Args:
+        path: jmdict-simplified JSON file
+        keys: Top-level keys to return
+        read_chars: Characters read from the file at a time
+
+    Returns:
+        Dict with the requested keys that appear in the header
+    """
+    wanted = set(keys)
+    header: Dict[str, Any] = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        scanner = DocumentScanner(f, read_chars=read_chars, lookahead_chars=0)
+        scanner.expect('{')
+        while wanted and scanner.peek(' \t\r\n,') not in ('}', ''):
+            key, _ = scanner.decode()
+            scanner.expect(':')
+            if key in DATA_KEYS and key not in wanted:
+                break
+            value, _ = scanner.decode()
+            if key in wanted:
+                header[key] = value
+                wanted.discard(key)
+    return header
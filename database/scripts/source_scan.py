@@ -0,0 +1,147 @@
+"""
+Single-pass source summaries for the async data processor.
+
+Everything the processor needs to know about a source before loading it is
+collected in one pass over its entries (run shard by shard in the parse
+pool): tag codes with their categories and sources, primary kanji form
+counts for slug uniqueness, the term index relations are resolved against,
+and the entry count for progress reporting.
+
+The term index maps (term, reading) and (term, None) to the key of the first
+entry in source order with those forms, so relation targets do not depend on
+the order in which shards are parsed or written.
+"""
+
+from typing import Dict, Optional, Tuple
+
+
+class SourceSummary:
+    """Global facts about one jmdict-simplified source file."""
+
+    def __init__(self):
+        self.entries = 0
+        # {tag_code: ({category: None}, {source: None})}; dicts keep first-seen order
+        self.tags: Dict[str, tuple] = {}
+        # Primary kanji text -> number of entries using it as their primary form
+        self.primary_kanji_counts: Dict[str, int] = {}
+        # Tag descriptions from the file header
+        self.tag_descriptions: Dict[str, str] = {}
+        # (term, reading or None) -> key of the first entry with those forms
+        self.terms: Dict[Tuple[str, Optional[str]], str] = {}
+        # jmdict_id -> number of senses (vocabulary)
+        self.sense_counts: Dict[str, int] = {}
+
+    def add_tag(self, tag: str, category: str, source: str) -> None:
+        if tag not in self.tags:
+            self.tags[tag] = ({}, {})
+        categories, sources = self.tags[tag]
+        categories[category] = None
+        sources[source] = None
+
+    def merge(self, other: 'SourceSummary') -> None:
+        """Merge the summary of a later part of the same source (or another source)."""
+        self.entries += other.entries
+        for tag, (categories, sources) in other.tags.items():
+            own_categories, own_sources = self.tags.setdefault(tag, ({}, {}))
+            own_categories.update(categories)
+            own_sources.update(sources)
+        for text, count in other.primary_kanji_counts.items():
+            self.primary_kanji_counts[text] = self.primary_kanji_counts.get(text, 0) + count
+        self.tag_descriptions.update(other.tag_descriptions)
+        for term, key in other.terms.items():
+            self.terms.setdefault(term, key)
+        self.sense_counts.update(other.sense_counts)
+
+
+def scan_entry(summary: SourceSummary, entry: dict, kind: str) -> None:
+    """
+    Add one source entry to a summary.
+
+    Args:
+        summary: Summary of the source being scanned
+        entry: Parsed entry
+        kind: 'vocabulary', 'proper_noun' or 'example'
+    """
+    summary.entries += 1
+    if kind == 'example':
+        return
+
+    key = entry.get('id')
+    kanji_list = entry.get('kanji', [])
+    if key and kanji_list:
+        text = kanji_list[0].get('text', '')
+        summary.primary_kanji_counts[text] = summary.primary_kanji_counts.get(text, 0) + 1
+    if key:
+        _add_terms(summary.terms, key, entry, kind)
+        if kind == 'vocabulary':
+            summary.sense_counts[key] = len(entry.get('sense', []))
+
+    add_tag = summary.add_tag
+    if kind == 'vocabulary':
+        for kanji in kanji_list:
+            for tag in kanji.get('tags', []):
+                add_tag(tag, 'kanji', 'vocabulary')
+        for kana in entry.get('kana', []):
+            for tag in kana.get('tags', []):
+                add_tag(tag, 'kana', 'vocabulary')
+        for sense in entry.get('sense', []):
+            for tag in sense.get('partOfSpeech', []):
+                add_tag(tag, 'part_of_speech', 'vocabulary')
+            for tag in sense.get('field', []):
+                add_tag(tag, 'field', 'vocabulary')
+            for tag in sense.get('dialect', []):
+                add_tag(tag, 'dialect', 'vocabulary')
+            for tag in sense.get('misc', []):
+                add_tag(tag, 'misc', 'vocabulary')
+    elif kind == 'proper_noun':
+        for kanji in kanji_list:
+            for tag in kanji.get('tags', []):
+                add_tag(tag, 'proper_noun', 'proper-noun')
+        for kana in entry.get('kana', []):
+            for tag in kana.get('tags', []):
+                add_tag(tag, 'proper_noun', 'proper-noun')
+        for trans in entry.get('translation', []):
+            for tag in trans.get('type', []):
+                add_tag(tag, 'translation_type', 'proper-noun')
+    else:
+        raise ValueError(f"Unknown source kind '{kind}'")
+
+
+def _add_terms(terms: Dict[Tuple[str, Optional[str]], str], key: str, entry: dict, kind: str) -> None:
+    """Index the forms of an entry; vocabulary also indexes every kanji form with each reading."""
+    kanji_texts = [kanji.get('text') for kanji in entry.get('kanji', []) if kanji.get('text')]
+    kana_texts = [kana.get('text') for kana in entry.get('kana', []) if kana.get('text')]
+    for kanji in kanji_texts:
+        terms.setdefault((kanji, None), key)
+        if kind == 'vocabulary':
+            for kana in kana_texts:
+                terms.setdefault((kanji, kana), key)
+    for kana in kana_texts:
+        terms.setdefault((kana, None), key)
+
+
+def resolve_term(terms: Dict[Tuple[str, Optional[str]], str], term: str,
+                 reading: Optional[str] = None) -> Optional[str]:
+    """Return the key of the entry a (term, reading) reference points to, or None."""
+    key = terms.get((term, reading)) if reading else None
+    return key or terms.get((term, None))
+
+
+def entry_slug(entry: dict, primary_kanji_counts: Dict[str, int]) -> Optional[str]:
+    """
+    Compute the slug of a vocabulary or proper noun entry.
+
+    - If kanji exists and is unique across all entries: use kanji text
+    - If kanji exists but not unique: use kanji(kana)
+    - If only kana exists: use kana text
+    """
+    kanji_list = entry.get('kanji', [])
+    kana_list = entry.get('kana', [])
+    primary_kana = kana_list[0].get('text', '') if kana_list else None
+    if not kanji_list:
+        return primary_kana
+
+    primary_kanji = kanji_list[0].get('text', '')
+    if primary_kanji_counts.get(primary_kanji, 0) == 1:
+        return primary_kanji
+    return f"{primary_kanji}({primary_kana or ''})"
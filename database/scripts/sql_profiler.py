@@ -0,0 +1,304 @@
+"""
+SQL statement profile of the data processors (ETL_PROFILE=sql, see stage_profiler).
+
+Every statement the processors issue is reduced to its template (literals,
+placeholder lists and repeated VALUES rows collapsed) and counted per stage:
+
+    count           statements (each parameter set of an executemany counts)
+    total / p50 / p99
+                    latency; an executemany contributes its average
+    rows            rows returned, changed or copied
+
+Dividing a stage's statements by the entries it loaded (rows of its root
+table, see load_metrics) gives the statements issued per vocabulary entry,
+proper noun or kanji, which shows the templates worth batching first.
+The report is printed and written to PROFILE_DIR/sql_profile.json.
+
+ETL_PROFILE=explain[:ms] makes the processor sessions load auto_explain
+and log the plan of every statement slower than ms to the server log.
+Without ms, the threshold is the p99 latency of the EXPLAIN_TEMPLATES-th
+slowest template of the previous sql profile, so only the slowest
+templates are explained. Loading auto_explain per session requires a
+superuser, like the container's database user.
+
+The asyncpg pool uses ProfiledConnection and psycopg2 connections use
+ProfiledCursor; other sessions (index rebuilds, delta bookkeeping, parse
+workers writing their shards, see parse_pool.WORKER_WRITE_KINDS) are not
+profiled.
+"""
+
+import json
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Tuple
+
+import asyncpg
+
+import load_metrics
+import stage_profiler
+
+SQL_PROFILE = 'sql' in stage_profiler.targets
+SQL_EXPLAIN = 'explain' in stage_profiler.targets
+PROFILE_FILE = stage_profiler.PROFILE_DIR / 'sql_profile.json'
+
+# Slowest templates auto_explain targets when no threshold is given
+EXPLAIN_TEMPLATES = 5
+DEFAULT_EXPLAIN_MS = 100.0
+
+# Latency samples kept per template for the percentiles (reservoir sample)
+MAX_SAMPLES = 100000
+
+# Root table of the entries a stage loads
+STAGE_ENTITIES = {'kanji': 'kanji', 'vocabulary': 'vocabulary', 'proper_nouns': 'proper_noun'}
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'(?<![\w$])-?\d+(?:\.\d+)?\b')
+_KEYWORD_LITERAL = re.compile(r'\b(?:NULL|TRUE|FALSE)\b', re.IGNORECASE)
+_VALUES_ROWS = re.compile(r'(\((?:\?|%s|\$\d+)(?:\s*,\s*(?:\?|%s|\$\d+))*\))(?:\s*,\s*\((?:\?|%s|\$\d+)'
+                          r'(?:\s*,\s*(?:\?|%s|\$\d+))*\))+')
+_LIST = re.compile(r'\?(?:\s*,\s*\?)+')
+_STATUS_ROWS = re.compile(r'(\d+)$')
+
+
+def template(query: Any) -> str:
+    """Reduce a statement to its template."""
+    text = query.decode() if isinstance(query, bytes) else str(query)
+    text = ' '.join(text.split())
+    text = _STRING.sub('?', text)
+    text = _NUMBER.sub('?', text)
+    text = _KEYWORD_LITERAL.sub('?', text)
+    text = _VALUES_ROWS.sub(r'\1, ...', text)
+    return _LIST.sub('?, ...', text)
+
+
+class TemplateStats:
+    """Counters of one template in one stage."""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.rows = 0
+        self.samples: List[float] = []
+        self._seen = 0
+
+    def add(self, seconds: float, rows: int, statements: int) -> None:
+        self.count += statements
+        self.total += seconds
+        self.rows += rows
+        latency = seconds / max(statements, 1)
+        self._seen += 1
+        if len(self.samples) < MAX_SAMPLES:
+            self.samples.append(latency)
+        else:
+            slot = random.randrange(self._seen)
+            if slot < MAX_SAMPLES:
+                self.samples[slot] = latency
+
+    def to_dict(self, entities: int) -> Dict[str, Any]:
+        samples = sorted(self.samples)
+        return {
+            'count': self.count,
+            'per_entity': round(self.count / entities, 3) if entities else None,
+            'total_seconds': round(self.total, 3),
+            'p50_ms': round(stage_profiler.percentile(samples, 0.5) * 1000, 3),
+            'p99_ms': round(stage_profiler.percentile(samples, 0.99) * 1000, 3),
+            'rows': self.rows,
+        }
+
+
+_lock = threading.Lock()
+# (stage, template) -> stats
+_stats: Dict[Tuple[str, str], TemplateStats] = {}
+
+
+def record(query: Any, seconds: float, rows: int, statements: int = 1) -> None:
+    """Count a statement (or an executemany of statements parameter sets) towards the current stage."""
+    key = (load_metrics.current_stage(), template(query))
+    with _lock:
+        stats = _stats.get(key)
+        if stats is None:
+            stats = _stats[key] = TemplateStats()
+        stats.add(seconds, rows, statements)
+
+
+def _status_rows(status: Any) -> int:
+    """Return the row count of a command status ('INSERT 0 5', 'COPY 100')."""
+    match = _STATUS_ROWS.search(status) if isinstance(status, str) else None
+    return int(match.group(1)) if match else 0
+
+
+# ========== Connections ==========
+
+class ProfiledConnection(asyncpg.Connection):
+    """asyncpg connection recording every statement (the pool's connection_class)."""
+
+    async def execute(self, query, *args, **kwargs):
+        started = time.perf_counter()
+        status = await super().execute(query, *args, **kwargs)
+        record(query, time.perf_counter() - started, _status_rows(status))
+        return status
+
+    async def executemany(self, command, args, **kwargs):
+        args = list(args)
+        started = time.perf_counter()
+        result = await super().executemany(command, args, **kwargs)
+        record(command, time.perf_counter() - started, len(args), len(args))
+        return result
+
+    async def fetch(self, query, *args, **kwargs):
+        started = time.perf_counter()
+        rows = await super().fetch(query, *args, **kwargs)
+        record(query, time.perf_counter() - started, len(rows))
+        return rows
+
+    async def fetchrow(self, query, *args, **kwargs):
+        started = time.perf_counter()
+        row = await super().fetchrow(query, *args, **kwargs)
+        record(query, time.perf_counter() - started, int(row is not None))
+        return row
+
+    async def fetchval(self, query, *args, **kwargs):
+        started = time.perf_counter()
+        value = await super().fetchval(query, *args, **kwargs)
+        record(query, time.perf_counter() - started, 1)
+        return value
+
+    async def copy_records_to_table(self, table_name, **kwargs):
+        started = time.perf_counter()
+        status = await super().copy_records_to_table(table_name, **kwargs)
+        schema = kwargs.get('schema_name')
+        columns = ', '.join(kwargs.get('columns') or ())
+        record(f"COPY {f'{schema}.' if schema else ''}{table_name} ({columns}) FROM STDIN",
+               time.perf_counter() - started, _status_rows(status))
+        return status
+
+
+class ProfiledCursor(load_metrics.MetricsCursor):
+    """psycopg2 cursor recording every statement on top of the load metrics."""
+
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            record(query, time.perf_counter() - started, max(self.rowcount, 0))
+
+    def executemany(self, query, vars_list):
+        vars_list = list(vars_list)
+        started = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            record(query, time.perf_counter() - started, max(self.rowcount, 0), len(vars_list))
+
+
+def connection_class():
+    """Return the asyncpg connection class for processor pools."""
+    return ProfiledConnection if SQL_PROFILE else asyncpg.Connection
+
+
+def cursor_factory():
+    """Return the psycopg2 cursor class for processor connections."""
+    return ProfiledCursor if SQL_PROFILE else load_metrics.MetricsCursor
+
+
+# ========== auto_explain ==========
+
+def _explain_threshold_ms() -> float:
+    """Return the explain:<ms> threshold, or one that catches the slowest templates of the last profile."""
+    value = stage_profiler.targets['explain'][-1]
+    if value:
+        return float(value)
+    try:
+        templates = json.loads(PROFILE_FILE.read_text(encoding='utf-8'))['templates']
+    except (OSError, ValueError, KeyError):
+        return DEFAULT_EXPLAIN_MS
+    slowest = sorted((t['p99_ms'] for t in templates), reverse=True)[:EXPLAIN_TEMPLATES]
+    return slowest[-1] if slowest else DEFAULT_EXPLAIN_MS
+
+
+_explain_settings: Dict[str, str] = {}
+if SQL_EXPLAIN:
+    _explain_settings = {
+        'session_preload_libraries': 'auto_explain',
+        'auto_explain.log_min_duration': f'{_explain_threshold_ms():g}ms',
+        'auto_explain.log_analyze': 'on',
+        'auto_explain.log_timing': 'off',
+        'auto_explain.log_nested_statements': 'on',
+    }
+
+
+def session_settings() -> Dict[str, str]:
+    """Return the auto_explain settings for new processor sessions (empty unless ETL_PROFILE asks)."""
+    return dict(_explain_settings)
+
+
+def connect_options() -> str:
+    """Return session_settings() as a libpq options string for psycopg2."""
+    return ' '.join(f'-c {name}={value}' for name, value in _explain_settings.items())
+
+
+# ========== Report ==========
+
+def report() -> Dict[str, Any]:
+    """Return the statements per stage and entity and the templates, slowest in total first."""
+    with _lock:
+        items = list(_stats.items())
+    stages: Dict[str, Dict[str, Any]] = {}
+    templates = []
+    for (stage_name, text), stats in items:
+        table = STAGE_ENTITIES.get(stage_name)
+        entities = load_metrics.stage_rows(stage_name, table) if table else 0
+        summary = stages.setdefault(stage_name, {'statements': 0, 'seconds': 0.0, 'entities': entities,
+                                                 'entity_table': table})
+        summary['statements'] += stats.count
+        summary['seconds'] += stats.total
+        templates.append({'stage': stage_name, 'template': text, **stats.to_dict(entities)})
+    for summary in stages.values():
+        summary['seconds'] = round(summary['seconds'], 3)
+        summary['per_entity'] = (round(summary['statements'] / summary['entities'], 3)
+                                 if summary['entities'] else None)
+    templates.sort(key=lambda t: t['total_seconds'], reverse=True)
+    return {'stages': stages, 'templates': templates}
+
+
+def _print_report(data: Dict[str, Any], top: int = 20) -> None:
+    print("\n=== SQL Statements ===", flush=True)
+    print(f"{'stage':<22} {'statements':>11} {'time':>9} {'entries':>9} {'per entry':>10}", flush=True)
+    for name, s in sorted(data['stages'].items(), key=lambda item: -item[1]['seconds']):
+        per_entity = f"{s['per_entity']:.2f}" if s['per_entity'] is not None else '-'
+        print(f"{name:<22} {s['statements']:>11} {s['seconds']:>8.2f}s "
+              f"{s['entities'] or '-':>9} {per_entity:>10}", flush=True)
+    print(f"\nSlowest templates (of {len(data['templates'])}):", flush=True)
+    print(f"{'stage':<22} {'count':>9} {'/entry':>7} {'total':>9} {'p50':>9} {'p99':>9} {'rows':>9}  template",
+          flush=True)
+    for t in data['templates'][:top]:
+        per_entity = f"{t['per_entity']:.2f}" if t['per_entity'] is not None else '-'
+        print(f"{t['stage']:<22} {t['count']:>9} {per_entity:>7} {t['total_seconds']:>8.2f}s "
+              f"{t['p50_ms']:>7.2f}ms {t['p99_ms']:>7.2f}ms {t['rows']:>9}  {t['template'][:100]}", flush=True)
+
+
+@contextmanager
+def session() -> Iterator[None]:
+    """Profile the statements of a load and report them at the end (see run_processor)."""
+    if SQL_EXPLAIN:
+        print(f"auto_explain: logging plans of statements over "
+              f"{_explain_settings['auto_explain.log_min_duration']}", flush=True)
+    if not SQL_PROFILE:
+        yield
+        return
+    _stats.clear()
+    try:
+        yield
+    finally:
+        data = report()
+        if not data['templates']:
+            # Keep the previous profile (and the explain threshold derived from it)
+            return
+        _print_report(data)
+        PROFILE_FILE.parent.mkdir(parents=True, exist_ok=True)
+        PROFILE_FILE.write_text(json.dumps(data, indent=2), encoding='utf-8')
+        print(f"SQL profile written to {PROFILE_FILE}", flush=True)
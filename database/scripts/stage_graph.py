@@ -0,0 +1,222 @@
+"""
+Dependency-driven stage scheduling for the data processors.
+
+Every stage declares the inputs it reads and the outputs it provides, named
+after the caches and tables they stand for ('kanji_cache', 'vocabulary_cache',
+...). A stage starts as soon as the stages providing its inputs have
+finished, so independent stages overlap. At most STAGE_CONCURRENCY stages
+run at once; their writers share the processor's connections, so the
+connection budget stays the same as for a sequential run.
+
+After a run, report() lists when each stage ran and the critical path: the
+chain of stages, each started by the completion of the one before it (a
+dependency, or a stage freeing a concurrency slot), that ends with the last
+stage to finish. Shortening any other stage does not shorten the load.
+"""
+
+import asyncio
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import load_metrics
+import stage_profiler
+
+# Stages that may run at the same time
+STAGE_CONCURRENCY = int(os.getenv('STAGE_CONCURRENCY', '3'))
+
+
+def _print(text: str) -> None:
+    print(text, flush=True)
+
+
+class Stage:
+    """One unit of work in a StageGraph and its timings."""
+
+    def __init__(self, name: str, run: Callable[[], Any],
+                 inputs: Sequence[str], outputs: Sequence[str]):
+        self.name = name
+        self.run = run
+        self.inputs = tuple(inputs)
+        self.outputs = tuple(outputs)
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        # The stage whose completion let this one start
+        self.started_after: Optional['Stage'] = None
+
+    @property
+    def duration(self) -> float:
+        return self.finished - self.started
+
+
+class StageGraph:
+    """Runs stages in dependency order, overlapping the independent ones."""
+
+    def __init__(self, max_concurrent: int = STAGE_CONCURRENCY,
+                 log: Callable[[str], None] = _print):
+        """
+        Initialize an empty graph.
+
+        Args:
+            max_concurrent: Stages that may run at the same time
+            log: Receives stage start/finish messages
+        """
+        self.max_concurrent = max(1, max_concurrent)
+        self.log = log
+        self.stages: Dict[str, Stage] = {}
+        self._providers: Dict[str, str] = {}
+        self._started: Optional[float] = None
+        self._finished: Optional[float] = None
+        # Stages that finished in the latest scheduling round
+        self._just_finished: List[Stage] = []
+
+    def add(self, name: str, run: Callable[[], Any],
+            inputs: Sequence[str] = (), outputs: Sequence[str] = ()) -> None:
+        """
+        Declare a stage.
+
+        Args:
+            name: Unique stage name
+            run: Coroutine function (run()) or plain function (run_threaded())
+            inputs: Outputs of other stages this stage needs
+            outputs: What this stage provides to later stages
+        """
+        if name in self.stages:
+            raise ValueError(f"Duplicate stage '{name}'")
+        for output in outputs:
+            if output in self._providers:
+                raise ValueError(f"'{output}' is provided by both '{self._providers[output]}' and '{name}'")
+            self._providers[output] = name
+        self.stages[name] = Stage(name, run, inputs, outputs)
+
+    def dependencies(self, stage: Stage) -> List[Stage]:
+        """Return the stages providing the inputs of a stage."""
+        names = dict.fromkeys(self._providers[i] for i in stage.inputs)
+        return [self.stages[name] for name in names]
+
+    def _check(self) -> None:
+        """Reject unknown inputs and dependency cycles before anything runs."""
+        for stage in self.stages.values():
+            missing = [i for i in stage.inputs if i not in self._providers]
+            if missing:
+                raise ValueError(f"Stage '{stage.name}' needs {', '.join(missing)}, which no stage provides")
+
+        done = set()
+        remaining = list(self.stages.values())
+        while remaining:
+            ready = [s for s in remaining if all(d.name in done for d in self.dependencies(s))]
+            if not ready:
+                raise ValueError(f"Dependency cycle between {', '.join(s.name for s in remaining)}")
+            done.update(s.name for s in ready)
+            remaining = [s for s in remaining if s.name not in done]
+
+    def _ready(self, done: set) -> List[Stage]:
+        """Return the stages not started yet whose dependencies are done, in declaration order."""
+        return [s for s in self.stages.values()
+                if s.started is None and all(d.name in done for d in self.dependencies(s))]
+
+    def _start(self, stage: Stage) -> None:
+        stage.started = time.perf_counter()
+        # A dependency that just finished explains the start better than a freed slot
+        dependencies = [s for s in self._just_finished if s in self.dependencies(stage)]
+        stage.started_after = (dependencies or self._just_finished or [None])[-1]
+        self.log(f"\n=== Stage {stage.name} started ===")
+
+    def _finish(self, stage: Stage) -> None:
+        stage.finished = time.perf_counter()
+        self._just_finished.append(stage)
+        self.log(f"=== Stage {stage.name} finished ({stage.duration:.1f}s) ===")
+
+    async def _run_async(self, stage: Stage) -> None:
+        with load_metrics.stage(stage.name), stage_profiler.stage(stage.name):
+            await stage.run()
+
+    def _run_sync(self, stage: Stage) -> None:
+        with load_metrics.stage(stage.name), stage_profiler.stage(stage.name):
+            stage.run()
+
+    async def run(self) -> None:
+        """Run coroutine stages as asyncio tasks. The first failure cancels the others."""
+        self._check()
+        self._started = time.perf_counter()
+        done = set()
+        running: Dict[asyncio.Task, Stage] = {}
+        try:
+            while len(done) < len(self.stages):
+                for stage in self._ready(done)[:self.max_concurrent - len(running)]:
+                    self._start(stage)
+                    running[asyncio.ensure_future(self._run_async(stage))] = stage
+                finished, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                self._just_finished = []
+                for task in finished:
+                    stage = running.pop(task)
+                    task.result()
+                    self._finish(stage)
+                    done.add(stage.name)
+        finally:
+            for task in running:
+                task.cancel()
+            await asyncio.gather(*running, return_exceptions=True)
+            self._finished = time.perf_counter()
+
+    def run_threaded(self) -> None:
+        """Run plain function stages on threads. A failure waits for running stages, then raises."""
+        self._check()
+        self._started = time.perf_counter()
+        done = set()
+        running = {}
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_concurrent) as executor:
+                while len(done) < len(self.stages):
+                    for stage in self._ready(done)[:self.max_concurrent - len(running)]:
+                        self._start(stage)
+                        running[executor.submit(self._run_sync, stage)] = stage
+                    finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                    self._just_finished = []
+                    for future in finished:
+                        stage = running.pop(future)
+                        future.result()
+                        self._finish(stage)
+                        done.add(stage.name)
+        finally:
+            self._finished = time.perf_counter()
+
+    def critical_path(self) -> List[Stage]:
+        """
+        Return the chain of stages that determined the wall time.
+
+        Starts at the stage that finished last and follows the stages whose
+        completion let each one start.
+        """
+        finished = [s for s in self.stages.values() if s.finished is not None]
+        if not finished:
+            return []
+        path = [max(finished, key=lambda s: s.finished)]
+        while path[-1].started_after is not None:
+            path.append(path[-1].started_after)
+        return path[::-1]
+
+    def report(self) -> List[str]:
+        """Return the stage timings and the critical path as printable lines."""
+        if self._started is None:
+            return []
+        critical = {s.name for s in self.critical_path()}
+        width = max(len(name) for name in self.stages)
+        lines = [f"{'stage':<{width}}   start     end    time   wait"]
+        ran = sorted((s for s in self.stages.values() if s.finished is not None),
+                     key=lambda s: s.started)
+        for stage in ran:
+            # Time spent ready but held back by STAGE_CONCURRENCY
+            ready_at = max((d.finished for d in self.dependencies(stage)), default=self._started)
+            lines.append(f"{stage.name:<{width}} {stage.started - self._started:7.1f}s "
+                         f"{stage.finished - self._started:6.1f}s {stage.duration:6.1f}s "
+                         f"{stage.started - ready_at:5.1f}s{'  *' if stage.name in critical else ''}")
+
+        wall = self._finished - self._started
+        path = self.critical_path()
+        lines.append(f"Critical path (*): {' -> '.join(s.name for s in path)} "
+                     f"= {sum(s.duration for s in path):.1f}s of {wall:.1f}s wall time")
+        lines.append(f"Stages ran for {sum(s.duration for s in ran):.1f}s in total "
+                     f"(max {self.max_concurrent} at a time)")
+        return lines
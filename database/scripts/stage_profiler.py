@@ -0,0 +1,283 @@
+"""
+Opt-in profiling of load stages, switched on with ETL_PROFILE.
+
+ETL_PROFILE is a comma-separated list of:
+
+    stage:<name>    cProfile a stage of the stage graph (stage:* for all of them)
+                    -> <name>.prof, plus <name>.workers.prof with the shards the
+                       async processor's parse workers handled for the stage
+    sampler[:ms]    sample the stacks of all threads every ms milliseconds
+                    (default 5) while the load runs
+                    -> stacks.folded, input for flamegraph.pl or speedscope
+    waits           keep every connection, batch queue and parse wait (see
+                    load_metrics.TIME_KINDS) and the event loop lag of the async
+                    processor instead of only their sums
+                    -> waits.json, with count, total, p50, p99 and max per stage
+                       and kind, also printed at the end of the run
+    sql             profile every SQL statement by template (see sql_profiler)
+    explain[:ms]    log the plans of statements slower than ms with auto_explain
+                    (see sql_profiler)
+
+    ETL_PROFILE=stage:vocabulary,waits python run_processor.py
+    python -m pstats profile/vocabulary.prof
+
+The files are written to PROFILE_DIR. A stage profile covers its whole
+thread while the stage runs, so with the async processor it includes the
+stages overlapping it on the event loop (STAGE_CONCURRENCY=1 separates
+them), and only one stage per thread is profiled at a time. The threads the
+parallel processor's stages hand batches to are only covered by the sampler.
+"""
+
+import asyncio
+import cProfile
+import json
+import math
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import asynccontextmanager, contextmanager
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Sequence
+
+import load_metrics
+
+ETL_PROFILE = os.getenv('ETL_PROFILE', '')
+
+# Where profiles are written (default: a profile directory next to the load metrics)
+PROFILE_DIR = Path(os.getenv('PROFILE_DIR', load_metrics.METRICS_DIR / 'profile'))
+
+# Interval of the event loop lag probe
+LOOP_LAG_INTERVAL = 0.01
+
+
+def _parse_targets(spec: str) -> Dict[str, List[str]]:
+    targets: Dict[str, List[str]] = {}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        kind, _, value = item.partition(':')
+        if kind not in ('stage', 'sampler', 'waits', 'sql', 'explain'):
+            raise ValueError(f"Unknown ETL_PROFILE entry '{item}' "
+                             f"(expected stage:<name>, sampler[:ms], waits, sql or explain[:ms])")
+        targets.setdefault(kind, []).append(value)
+    return targets
+
+
+targets = _parse_targets(ETL_PROFILE)
+PROFILED_STAGES = set(targets.get('stage', []))
+SAMPLE_INTERVAL = float(targets['sampler'][-1] or 5) / 1000 if 'sampler' in targets else 0.0
+RECORD_WAITS = 'waits' in targets
+
+_local = threading.local()
+_lock = threading.Lock()
+# (stage, kind) -> durations in seconds
+_waits: Dict[tuple, List[float]] = {}
+# Profiles of the stages a parse worker process handled shards for
+_worker_profiles: Dict[str, cProfile.Profile] = {}
+
+
+def enabled() -> bool:
+    return bool(PROFILED_STAGES or SAMPLE_INTERVAL or RECORD_WAITS)
+
+
+def profiling(stage: str) -> bool:
+    """Return True if ETL_PROFILE asks for a cProfile of a stage."""
+    return stage in PROFILED_STAGES or '*' in PROFILED_STAGES
+
+
+def percentile(samples: Sequence[float], fraction: float) -> float:
+    """Return the nearest-rank percentile of sorted samples."""
+    if not samples:
+        return 0.0
+    return samples[max(0, math.ceil(fraction * len(samples)) - 1)]
+
+
+def _worker_parts(stage: str) -> List[Path]:
+    return sorted(PROFILE_DIR.glob(f'{stage}.worker-*.prof'))
+
+
+# ========== Stage Profiles ==========
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """cProfile the block when ETL_PROFILE lists the stage (see StageGraph)."""
+    if not profiling(name):
+        yield
+        return
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    profile = None
+    active = getattr(_local, 'stage', None)
+    if active is None:
+        profile = cProfile.Profile()
+        _local.stage = name
+        profile.enable()
+    else:
+        print(f"Profiler: stage {name} runs inside the profile of {active} in this thread", flush=True)
+    try:
+        yield
+    finally:
+        written = []
+        if profile:
+            profile.disable()
+            _local.stage = None
+            profile.dump_stats(str(PROFILE_DIR / f'{name}.prof'))
+            written.append(f'{name}.prof')
+        # Parse workers profile the stage's shards in their own processes
+        parts = _worker_parts(name)
+        if parts:
+            pstats.Stats(*map(str, parts)).dump_stats(str(PROFILE_DIR / f'{name}.workers.prof'))
+            for part in parts:
+                part.unlink()
+            written.append(f'{name}.workers.prof')
+        if written:
+            print(f"Profiler: wrote {', '.join(written)} to {PROFILE_DIR}", flush=True)
+
+
+def worker_call(stage: str, fn: Callable, *args: Any) -> Any:
+    """
+    Run fn(*args) in a parse worker under the worker's profile of a stage.
+
+    The profile accumulates over the shards the worker handles and is
+    rewritten after each one; stage() merges the workers' files when the
+    stage ends.
+    """
+    profile = _worker_profiles.setdefault(stage, cProfile.Profile())
+    try:
+        return profile.runcall(fn, *args)
+    finally:
+        PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+        profile.dump_stats(str(PROFILE_DIR / f'{stage}.worker-{os.getpid()}.prof'))
+
+
+# ========== Stack Sampler ==========
+
+class StackSampler(threading.Thread):
+    """Daemon thread counting the stacks of all other threads at a fixed interval."""
+
+    def __init__(self, interval: float):
+        super().__init__(name='stack-sampler', daemon=True)
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop_event.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                calls = []
+                while frame is not None:
+                    code = frame.f_code
+                    calls.append(f'{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})')
+                    frame = frame.f_back
+                calls.append(names.get(ident, str(ident)))
+                self.stacks[';'.join(reversed(calls))] += 1
+            self.samples += 1
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.join()
+
+    def write(self, path: Path) -> None:
+        """Write the stacks in the folded format (one 'frame;frame;... count' line per stack)."""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f'{stack} {count}\n')
+        print(f"Profiler: wrote {self.samples} stack samples to {path}", flush=True)
+
+
+# ========== Waits ==========
+
+def _record_wait(stage: str, kind: str, seconds: float) -> None:
+    with _lock:
+        _waits.setdefault((stage, kind), []).append(seconds)
+
+
+@asynccontextmanager
+async def watch_event_loop() -> AsyncIterator[None]:
+    """
+    Measure how late the event loop wakes a sleeping task while the block runs.
+
+    A late wake-up means the loop was busy with other callbacks (transforms,
+    encoding, parsing on the loop thread) instead of serving writers.
+    """
+    if not RECORD_WAITS:
+        yield
+        return
+
+    async def probe() -> None:
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(LOOP_LAG_INTERVAL)
+            _record_wait('event_loop', 'lag', max(0.0, time.perf_counter() - started - LOOP_LAG_INTERVAL))
+
+    task = asyncio.ensure_future(probe())
+    try:
+        yield
+    finally:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+
+def wait_report() -> Dict[str, Dict[str, Dict[str, float]]]:
+    """Return {stage: {kind: count, total, p50, p99, max}} of the recorded waits."""
+    report: Dict[str, Dict[str, Dict[str, float]]] = {}
+    with _lock:
+        items = [(key, sorted(samples)) for key, samples in _waits.items()]
+    for (stage_name, kind), samples in sorted(items):
+        report.setdefault(stage_name, {})[kind] = {
+            'count': len(samples),
+            'total_seconds': round(sum(samples), 3),
+            'p50_ms': round(percentile(samples, 0.5) * 1000, 3),
+            'p99_ms': round(percentile(samples, 0.99) * 1000, 3),
+            'max_ms': round(samples[-1] * 1000, 3),
+        }
+    return report
+
+
+def _write_waits() -> None:
+    report = wait_report()
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    (PROFILE_DIR / 'waits.json').write_text(json.dumps(report, indent=2), encoding='utf-8')
+    print("\n=== Waits ===", flush=True)
+    print(f"{'stage':<22} {'kind':<13} {'count':>8} {'total':>9} {'p50':>9} {'p99':>9} {'max':>9}", flush=True)
+    for stage_name, kinds in report.items():
+        for kind, w in kinds.items():
+            print(f"{stage_name:<22} {kind:<13} {w['count']:>8} {w['total_seconds']:>8.2f}s "
+                  f"{w['p50_ms']:>7.2f}ms {w['p99_ms']:>7.2f}ms {w['max_ms']:>7.2f}ms", flush=True)
+
+
+# ========== Session ==========
+
+@contextmanager
+def session() -> Iterator[None]:
+    """Run the profiling ETL_PROFILE asks for around a load (see run_processor)."""
+    if not enabled():
+        yield
+        return
+    print(f"Profiling enabled (ETL_PROFILE={ETL_PROFILE}), writing to {PROFILE_DIR}", flush=True)
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    for stale in (*PROFILE_DIR.glob('*.prof'), PROFILE_DIR / 'stacks.folded', PROFILE_DIR / 'waits.json'):
+        stale.unlink(missing_ok=True)
+
+    sampler: Optional[StackSampler] = None
+    if SAMPLE_INTERVAL:
+        sampler = StackSampler(SAMPLE_INTERVAL)
+        sampler.start()
+    if RECORD_WAITS:
+        _waits.clear()
+        load_metrics.time_listeners.append(_record_wait)
+    try:
+        yield
+    finally:
+        if sampler:
+            sampler.stop()
+            sampler.write(PROFILE_DIR / 'stacks.folded')
+        if RECORD_WAITS:
+            load_metrics.time_listeners.remove(_record_wait)
+            _write_waits()
@@ -14,6 +14,7 @@ import shutil
 import glob
 from pathlib import Path
 from sync_furigana import sync_furigana
+from ndjson_shards import SHARD_DIR_SUFFIX, convert_sources, file_checksum
 
 # Configuration
 REPO_URL = "https://github.com/scriptin/jmdict-simplified.git"
@@ -272,23 +273,19 @@ def main():
         print("ERROR: Failed to copy JSON files")
         return 1
 
-    import hashlib
-
     def calculate_checksums():
         """Calculate MD5 checksums for all source JSON files."""
         checksums = {}
-        for root, _, files in os.walk(SOURCE_DIR):
+        for root, dirs, files in os.walk(SOURCE_DIR):
+            # Shards are derived from the sources and carry no changes of their own
+            dirs[:] = [d for d in dirs if not d.endswith(SHARD_DIR_SUFFIX)]
             for file in files:
                 if file.endswith('.json'):
                     path = Path(root) / file
                     # relative path for stable keys
                     rel_path = str(path.relative_to(SOURCE_DIR))
                     try:
-                        with open(path, 'rb') as f:
-                            file_hash = hashlib.md5()
-                            while chunk := f.read(8192):
-                                file_hash.update(chunk)
-                            checksums[rel_path] = file_hash.hexdigest()
+                        checksums[rel_path] = file_checksum(path)
                     except Exception as e:
                         print(f"Warning: Could not hash {rel_path}: {e}")
         return checksums
@@ -302,6 +299,12 @@ def main():
 
     # Calculate new checksums
     new_checksums = calculate_checksums()
+
+    # Convert the large sources to NDJSON shards (once per dictionary release)
+    try:
+        convert_sources(SOURCE_DIR, new_checksums)
+    except Exception as e:
+        print(f"WARNING: NDJSON conversion failed, processors will read the JSON files: {e}")
     old_checksums = state.get("checksums", {})
     
     if new_checksums != old_checksums:
@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+"""
+Synthetic source files for benchmarking the data processors.
+
+Writes the files the sync scripts put under database/source (jmdict-simplified
+words, examples and names, kanjidic2, radk/kradfile, the radical and JLPT
+references and the furigana lists) in their upstream layout, with
+FULL_SIZES x scale entries. Field distributions (forms, senses and glosses
+per entry, multilingual glosses, tags, cross references and their share of
+unresolvable targets) are modelled on the upstream releases, so relative
+stage costs match a real seed. The same scale and seed always produce the
+same files.
+
+    python synthetic_sources.py /tmp/jlpt-source --scale 0.05
+"""
+
+import argparse
+import json
+import random
+from pathlib import Path
+from typing import Any, Dict, List, Sequence
+
+# Entries in the upstream releases (scale 1.0)
+FULL_SIZES = {
+    'vocabulary': 215000,
+    'example': 25000,
+    'proper_noun': 740000,
+    'kanji': 13100,
+    'vocabulary_reference': 8100,
+    'kanji_reference': 2200,
+}
+
+# Radicals are a fixed set, not scaled
+RADICAL_COUNT = 253
+
+# Share of each form / sense / gloss count, e.g. 65% of words have one kanji form
+KANJI_FORMS = {0: 0.2, 1: 0.65, 2: 0.1, 3: 0.05}
+KANA_FORMS = {1: 0.85, 2: 0.12, 3: 0.03}
+SENSES = {1: 0.6, 2: 0.2, 3: 0.1, 4: 0.05, 5: 0.03, 8: 0.02}
+ENGLISH_GLOSSES = {1: 0.4, 2: 0.3, 3: 0.2, 4: 0.1}
+NAME_KANJI_FORMS = {0: 0.05, 1: 0.9, 2: 0.05}
+NAME_TRANSLATIONS = {1: 0.95, 2: 0.05}
+
+# Languages with glosses besides English and the share of senses that have them
+GLOSS_LANGUAGES = {'ger': 0.35, 'rus': 0.3, 'dut': 0.25, 'hun': 0.2, 'spa': 0.1, 'fre': 0.1,
+                   'swe': 0.05, 'slv': 0.03}
+
+# Share of senses with each optional attribute
+SENSE_ATTRIBUTES = {'misc': 0.2, 'field': 0.05, 'dialect': 0.01, 'info': 0.03,
+                    'languageSource': 0.02, 'related': 0.06, 'antonym': 0.01}
+
+# Share of cross references whose target is not in the dictionary
+UNRESOLVED_REFERENCES = 0.1
+
+TAGS = {
+    'pos': ['n', 'v5r', 'v5k', 'v1', 'vs', 'adj-i', 'adj-na', 'adv', 'exp', 'n-suf', 'prt', 'int', 'ctr'],
+    'misc': ['uk', 'pol', 'hon', 'hum', 'col', 'arch', 'abbr', 'on-mim', 'yoji', 'sl'],
+    'field': ['comp', 'med', 'math', 'law', 'bot', 'ling', 'sports'],
+    'dialect': ['ksb', 'kyb', 'osb', 'hob'],
+    'kanji': ['iK', 'ateji', 'rK', 'oK'],
+    'kana': ['ik', 'ok', 'gikun'],
+    'name': ['surname', 'place', 'unclass', 'given', 'person', 'company', 'station', 'organization'],
+}
+
+# Look-alike radical characters the processors normalize
+RADICAL_LOOKALIKES = ['｜', 'ノ', 'ハ', 'ト', 'ヨ', 'マ', 'ム']
+
+HIRAGANA = [chr(c) for c in range(0x3041, 0x3094)]
+KATAKANA = [chr(c) for c in range(0x30A1, 0x30F5)]
+CJK = [chr(c) for c in range(0x4E00, 0x9FA0)]
+
+
+def _count(rng: random.Random, shares: Dict[int, float]) -> int:
+    return rng.choices(list(shares), weights=list(shares.values()))[0]
+
+
+def _dump(path: Path, data: Any, encoding: str = 'utf-8') -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding=encoding) as f:
+        json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+
+
+class SourceGenerator:
+    """Generates one consistent set of synthetic sources."""
+
+    def __init__(self, scale: float, seed: int = 7):
+        self.rng = random.Random(seed)
+        self.sizes = {kind: max(20, int(size * scale)) for kind, size in FULL_SIZES.items()}
+        # Dictionary kanji, plus rarer characters that are not in kanjidic
+        self.kanji = CJK[:self.sizes['kanji']]
+        self.rare_kanji = CJK[self.sizes['kanji']:self.sizes['kanji'] + 500]
+        self.words: List[dict] = []
+        self.names: List[dict] = []
+
+    def _kanji_text(self, length: int) -> str:
+        # Frequent kanji dominate (rough Zipf), 2% of characters are outside kanjidic
+        chars = []
+        for _ in range(length):
+            if self.rng.random() < 0.02:
+                chars.append(self.rng.choice(self.rare_kanji))
+            else:
+                chars.append(self.kanji[min(int(self.rng.paretovariate(1.2)) - 1, len(self.kanji) - 1)
+                                        if self.rng.random() < 0.7 else self.rng.randrange(len(self.kanji))])
+        return ''.join(chars)
+
+    def _kana_text(self, length: int, katakana: bool = False) -> str:
+        return ''.join(self.rng.choice(KATAKANA if katakana else HIRAGANA) for _ in range(length))
+
+    def _header(self, languages: Sequence[str]) -> Dict[str, Any]:
+        tags = {tag: f'{tag} ({category})' for category, codes in TAGS.items() for tag in codes}
+        return {'version': '3.6.1', 'languages': list(languages), 'commonOnly': False,
+                'dictDate': '2026-01-01', 'dictRevisions': ['1.09'], 'tags': tags}
+
+    def _reference(self, entries: List[dict], numbered: bool = True) -> List[Any]:
+        """Return a cross reference in one of the jmdict-simplified xref shapes (names never number senses)."""
+        if self.rng.random() < UNRESOLVED_REFERENCES or not entries:
+            return [self._kanji_text(2)]
+        target = self.rng.choice(entries)
+        kana = target['kana'][0]['text']
+        term = target['kanji'][0]['text'] if target['kanji'] else kana
+        shape = self.rng.random()
+        if shape < 0.5:
+            return [term]
+        if shape < 0.8 or not numbered:
+            return [term, kana]
+        sense = self.rng.randint(1, len(target['sense']))
+        return [term, kana, sense] if shape < 0.95 else [term, sense]
+
+    # ========== Vocabulary ==========
+
+    def _sense(self, entry_no: int, sense_no: int) -> dict:
+        rng = self.rng
+        glosses = [{'lang': 'eng', 'gender': None, 'type': rng.choice([None, None, None, 'expl', 'lit']),
+                    'text': f'meaning {entry_no}.{sense_no}.{idx}'}
+                   for idx in range(_count(rng, ENGLISH_GLOSSES))]
+        for lang, share in GLOSS_LANGUAGES.items():
+            if rng.random() < share:
+                glosses += [{'lang': lang, 'gender': None, 'type': None, 'text': f'{lang} {entry_no}.{sense_no}.{idx}'}
+                            for idx in range(rng.randint(1, 3))]
+        has = {attribute: rng.random() < share for attribute, share in SENSE_ATTRIBUTES.items()}
+        return {
+            'partOfSpeech': rng.sample(TAGS['pos'], rng.randint(1, 2)),
+            'appliesToKanji': ['*'],
+            'appliesToKana': ['*'],
+            'related': [self._reference(self.words) for _ in range(rng.randint(1, 2))] if has['related'] else [],
+            'antonym': [self._reference(self.words)] if has['antonym'] else [],
+            'field': [rng.choice(TAGS['field'])] if has['field'] else [],
+            'dialect': [rng.choice(TAGS['dialect'])] if has['dialect'] else [],
+            'misc': rng.sample(TAGS['misc'], rng.randint(1, 2)) if has['misc'] else [],
+            'info': [f'note {entry_no}.{sense_no}'] if has['info'] else [],
+            'languageSource': [{'lang': rng.choice(['eng', 'ger', 'fre', 'por']), 'full': True,
+                                'wasei': rng.random() < 0.2, 'text': f'source {entry_no}'}] if has['languageSource'] else [],
+            'gloss': glosses,
+        }
+
+    def _word(self, entry_no: int) -> dict:
+        rng = self.rng
+        kanji = [{'common': rng.random() < 0.1, 'text': self._kanji_text(rng.randint(1, 3)),
+                  'tags': [rng.choice(TAGS['kanji'])] if rng.random() < 0.03 else []}
+                 for _ in range(_count(rng, KANJI_FORMS))]
+        katakana = not kanji and rng.random() < 0.5
+        kana = [{'common': rng.random() < 0.1, 'text': self._kana_text(rng.randint(2, 6), katakana),
+                 'tags': [rng.choice(TAGS['kana'])] if rng.random() < 0.02 else [],
+                 'appliesToKanji': ['*'] if idx == 0 or not kanji else [kanji[0]['text']]}
+                for idx in range(_count(rng, KANA_FORMS))]
+        word = {'id': str(1000000 + entry_no * 10), 'kanji': kanji, 'kana': kana}
+        word['sense'] = [self._sense(entry_no, sense_no) for sense_no in range(_count(rng, SENSES))]
+        return word
+
+    def word_entries(self, count: int) -> List[dict]:
+        """Return count JMdict words (cross references point at earlier words)."""
+        self.words = []
+        for entry_no in range(count):
+            self.words.append(self._word(entry_no))
+        return self.words
+
+    def vocabulary(self, out_dir: Path) -> None:
+        self.word_entries(self.sizes['vocabulary'])
+        header = self._header(['eng'] + list(GLOSS_LANGUAGES))
+        _dump(out_dir / 'vocabulary' / 'source.json', {**header, 'words': self.words})
+
+        # Examples: English glosses only, Tatoeba sentences on some senses
+        examples = []
+        for word in self.rng.sample(self.words, min(self.sizes['example'], len(self.words))):
+            senses = []
+            for sense_no, sense in enumerate(word['sense']):
+                sentences = []
+                if sense_no == 0 or self.rng.random() < 0.3:
+                    sentences = [{
+                        'source': {'type': 'tatoeba', 'value': str(self.rng.randint(1, 999999))},
+                        'text': word['kana'][0]['text'],
+                        'sentences': [{'lang': 'jpn', 'text': f"{word['kana'][0]['text']}です。"},
+                                      {'lang': 'eng', 'text': f"Example for {word['id']}."}],
+                    } for _ in range(self.rng.randint(1, 2))]
+                senses.append({**sense, 'gloss': [g for g in sense['gloss'] if g['lang'] == 'eng'],
+                               'examples': sentences})
+            examples.append({**word, 'sense': senses})
+        examples.sort(key=lambda w: int(w['id']))
+        _dump(out_dir / 'vocabulary' / 'vocabularyWithExamples' / 'source.json',
+              {**self._header(['eng']), 'words': examples})
+
+        # JLPT levels for a subset of words
+        reference = []
+        for word in self.rng.sample(self.words, min(self.sizes['vocabulary_reference'], len(self.words))):
+            reading = word['kana'][0]['text']
+            reference.append({'Original': word['kanji'][0]['text'] if word['kanji'] else '',
+                              'Furigana': reading, 'English': word['sense'][0]['gloss'][0]['text'],
+                              'JLPT Level': f'N{self.rng.randint(1, 5)}'})
+        _dump(out_dir / 'vocabulary' / 'reference.json', reference)
+
+        _dump(out_dir / 'vocabulary' / 'furigana.json', self.furigana(self.words, 0.9), 'utf-8-sig')
+
+    def furigana(self, entries: List[dict], share: float) -> List[dict]:
+        """Return furigana for (kanji form, first reading) of a share of the entries."""
+        furigana = []
+        for entry in entries:
+            if not entry['kanji'] or self.rng.random() >= share:
+                continue
+            text = entry['kanji'][0]['text']
+            reading = entry['kana'][0]['text']
+            split = max(1, len(reading) // len(text))
+            segments = [{'ruby': char, 'rt': reading[idx * split:(idx + 1) * split] or reading[-1]}
+                        for idx, char in enumerate(text)]
+            furigana.append({'text': text, 'reading': reading, 'furigana': segments})
+        return furigana
+
+    # ========== Proper Nouns ==========
+
+    def name_entries(self, count: int) -> List[dict]:
+        """Return count JMnedict names."""
+        rng = self.rng
+        self.names = []
+        for entry_no in range(count):
+            kanji = [{'text': self._kanji_text(rng.randint(1, 4)), 'tags': []}
+                     for _ in range(_count(rng, NAME_KANJI_FORMS))]
+            kana = [{'text': self._kana_text(rng.randint(2, 7)), 'tags': [], 'appliesToKanji': ['*']}]
+            translations = []
+            for _ in range(_count(rng, NAME_TRANSLATIONS)):
+                translations.append({
+                    'type': rng.sample(TAGS['name'], 1 if rng.random() < 0.9 else 2),
+                    'related': [self._reference(self.names, numbered=False)] if rng.random() < 0.02 else [],
+                    'translation': [{'lang': 'eng', 'text': f'Name {entry_no}'}],
+                })
+            self.names.append({'id': str(5000000 + entry_no), 'kanji': kanji, 'kana': kana,
+                               'translation': translations})
+        return self.names
+
+    def proper_nouns(self, out_dir: Path) -> None:
+        self.name_entries(self.sizes['proper_noun'])
+        header = self._header(['eng'])
+        _dump(out_dir / 'names' / 'source.json', {**header, 'words': self.names})
+        _dump(out_dir / 'names' / 'furigana.json', self.furigana(self.names, 0.5), 'utf-8-sig')
+
+    # ========== Kanji and Radicals ==========
+
+    def kanji_sources(self, out_dir: Path) -> None:
+        rng = self.rng
+        characters = []
+        for rank, literal in enumerate(self.kanji):
+            groups = [{
+                'readings': ([{'type': 'ja_on', 'onType': None, 'status': None,
+                               'value': self._kana_text(rng.randint(1, 3), True)}
+                              for _ in range(rng.randint(0, 2))] +
+                             [{'type': 'ja_kun', 'onType': None, 'status': None,
+                               'value': self._kana_text(rng.randint(1, 4))}
+                              for _ in range(rng.randint(0, 3))] +
+                             [{'type': 'pinyin', 'onType': None, 'status': None, 'value': 'yi1'}]),
+                'meanings': [{'lang': lang, 'value': f'{lang} meaning {rank}'}
+                             for lang in ['en'] + rng.sample(['fr', 'es', 'pt'], rng.randint(0, 3))],
+            }]
+            characters.append({
+                'literal': literal,
+                'codepoints': [{'type': 'ucs', 'value': f'{ord(literal):x}'},
+                               {'type': 'jis208', 'value': f'1-{rank // 94 + 16}-{rank % 94 + 1}'}],
+                'radicals': [{'type': 'classical', 'value': rng.randint(1, 214)}],
+                'misc': {'grade': rng.choice([1, 2, 3, 4, 5, 6, 8, None, None, None]),
+                         'strokeCounts': [rng.randint(1, 24)], 'variants': [],
+                         'frequency': rank + 1 if rank < 2500 else None, 'radicalNames': [], 'jlptLevel': None},
+                'dictionaryReferences': [
+                    {'type': 'nelson_c', 'morohashi': None, 'value': str(rank + 1)},
+                    {'type': 'moro', 'morohashi': {'volume': rng.randint(1, 13), 'page': rng.randint(1, 999)},
+                     'value': str(rank + 1)},
+                ],
+                'queryCodes': [{'type': 'skip', 'skipMisclassification': None,
+                                'value': f'{rng.randint(1, 4)}-{rng.randint(1, 9)}-{rng.randint(1, 9)}'}],
+                'readingMeaning': {'groups': groups,
+                                   'nanori': [self._kana_text(2) for _ in range(rng.randint(0, 2))]},
+            })
+        _dump(out_dir / 'kanji' / 'source.json',
+              {'version': '3.6.1', 'languages': ['en', 'fr', 'es', 'pt'], 'dictDate': '2026-01-01',
+               'fileVersion': 4, 'databaseVersion': '2026-01', 'characters': characters})
+        _dump(out_dir / 'kanji' / 'reference.json',
+              {literal: {'jlpt_old': rng.randint(1, 4), 'jlpt_new': rng.randint(1, 5)}
+               for literal in self.kanji[:self.sizes['kanji_reference']]})
+
+        # Radicals: common kanji plus look-alike characters the processors normalize
+        radicals = self.kanji[:RADICAL_COUNT - len(RADICAL_LOOKALIKES)] + RADICAL_LOOKALIKES
+        _dump(out_dir / 'radfile' / 'source.json', {'version': '1.0', 'radicals': {
+            radical: {'strokeCount': rng.randint(1, 17), 'code': None,
+                      'kanji': rng.sample(self.kanji, min(len(self.kanji), rng.randint(1, 40)))}
+            for radical in radicals
+        }})
+        lines = []
+        for number, radical in enumerate(radicals[:214], 1):
+            variant = rng.choice(RADICAL_LOOKALIKES) if number % 30 == 0 else ''
+            lines.append('\t'.join([radical, variant, str(number), str(rng.randint(1, 17)),
+                                    self._kana_text(2), f'radical {number}', 'note' if number % 7 == 0 else '']))
+        (out_dir / 'radfile').mkdir(parents=True, exist_ok=True)
+        (out_dir / 'radfile' / 'reference.txt').write_text('\n'.join(lines) + '\n', encoding='utf-8')
+        _dump(out_dir / 'kradfile' / 'source.json', {'version': '1.0', 'kanji': {
+            literal: rng.sample(radicals, rng.randint(1, 6))
+            for literal in self.kanji if rng.random() < 0.95
+        }})
+
+
+def generate(out_dir: Path, scale: float, seed: int = 7) -> Dict[str, int]:
+    """
+    Write a complete set of synthetic sources.
+
+    Args:
+        out_dir: Directory laid out like database/source
+        scale: Entry counts relative to the upstream releases (FULL_SIZES)
+        seed: Random seed
+
+    Returns:
+        Entry counts by source
+    """
+    generator = SourceGenerator(scale, seed)
+    generator.kanji_sources(out_dir)
+    generator.vocabulary(out_dir)
+    generator.proper_nouns(out_dir)
+    return generator.sizes
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('out_dir', type=Path, help='Directory to write the sources to')
+    parser.add_argument('--scale', type=float, default=0.01, help='Entry counts relative to the upstream releases')
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+    sizes = generate(args.out_dir, args.scale, args.seed)
+    print(f"Generated sources in {args.out_dir}: " + ', '.join(f'{kind} {n:,}' for kind, n in sizes.items()))
+
+
+if __name__ == '__main__':
+    main()
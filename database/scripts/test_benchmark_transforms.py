@@ -0,0 +1,129 @@
+"""
+Tests of the per-entry transforms benchmark_transforms.py measures.
+
+The transform tests check what each transform writes on the synthetic
+sample and run in every test session. The benchmarks only measure: they
+run through the pytest-benchmark fixture when the plugin is installed
+(skip them with --benchmark-skip), and otherwise only with
+TRANSFORM_BENCHMARKS=1, printing the timings Benchmark.measure reports
+(run with -s to see them). No timing is ever asserted.
+"""
+
+import importlib.util
+import os
+
+import pytest
+
+import key_allocator
+import synthetic_sources
+from benchmark_transforms import TransformBenchmarks
+from entry_transform import scan_kanji
+
+HAVE_PYTEST_BENCHMARK = importlib.util.find_spec('pytest_benchmark') is not None
+RUN_BENCHMARKS = HAVE_PYTEST_BENCHMARK or os.getenv('TRANSFORM_BENCHMARKS') == '1'
+
+ENTRIES = 1000
+ROUNDS = 3
+
+BENCHMARKS = (
+    'jlpt_level[async]', 'jlpt_level[parallel]',
+    'furigana[async]', 'furigana[parallel]',
+    'senses[async]', 'sense_attributes[parallel]',
+    'normalize_radical[async]', 'normalize_radical[parallel]',
+    'kanji_scan',
+    'vocabulary_entry[async]', 'proper_noun_entry[async]',
+)
+
+
+@pytest.fixture(scope='module')
+def suite(tmp_path_factory):
+    suite = TransformBenchmarks(ENTRIES, seed=7, cache_dir=tmp_path_factory.mktemp('transforms'))
+    yield suite
+    suite.transformer.close()
+
+
+@pytest.fixture(scope='module')
+def benchmarks(suite):
+    return {benchmark.name: benchmark for benchmark in suite.benchmarks()}
+
+
+def run_once(benchmarks, name):
+    """Run one round of a benchmark and return its results in item order."""
+    benchmark = benchmarks[name]
+    if benchmark.setup:
+        benchmark.setup()
+    return [benchmark.run(item) for item in benchmark.items]
+
+
+# ========== Transform output ==========
+
+def test_every_benchmark_is_collected(benchmarks):
+    assert sorted(benchmarks) == sorted(BENCHMARKS)
+
+
+def test_jlpt_levels_agree_between_processors(suite, benchmarks):
+    levels = run_once(benchmarks, 'jlpt_level[async]')
+    assert levels == run_once(benchmarks, 'jlpt_level[parallel]')
+    # Every third word is mapped to N3
+    assert all(level == 3 for level in levels[::3])
+
+
+def test_senses_write_every_sense_and_gloss(suite, benchmarks):
+    senses = sum(len(word['sense']) for word in suite.words)
+    glosses = sum(len(sense['gloss']) for word in suite.words for sense in word['sense'])
+
+    run_once(benchmarks, 'senses[async]')
+    assert len(suite.out.rows['vocabulary_sense']) == senses
+    assert len(suite.out.rows['vocabulary_sense_gloss']) == glosses
+
+    run_once(benchmarks, 'sense_attributes[parallel]')
+    assert len(suite.attributes['vocabulary_sense_gloss']) == glosses
+
+
+def test_furigana_rows_belong_to_the_entry(suite, benchmarks):
+    run_once(benchmarks, 'furigana[async]')
+    rows = suite.out.rows.get('vocabulary_furigana', [])
+    assert rows
+    assert {row[1] for row in rows} == {key_allocator.vocabulary_id('0')}
+
+    run_once(benchmarks, 'furigana[parallel]')
+    assert suite.cursor.rows > 0
+
+
+def test_radical_normalization_agrees_and_maps_lookalikes(benchmarks):
+    normalized = run_once(benchmarks, 'normalize_radical[async]')
+    assert normalized == run_once(benchmarks, 'normalize_radical[parallel]')
+    assert not set(normalized) & set(synthetic_sources.RADICAL_LOOKALIKES)
+
+
+def test_kanji_scan_finds_the_loaded_kanji(suite, benchmarks):
+    kanji_cache = suite.transformer.kanji_cache
+    for text in benchmarks['kanji_scan'].items:
+        found = {}
+        scan_kanji(text, kanji_cache, found)
+        assert list(found) == list(dict.fromkeys(kanji_cache[c] for c in text if c in kanji_cache))
+
+
+def test_entries_write_one_root_row_each(suite, benchmarks):
+    assert run_once(benchmarks, 'vocabulary_entry[async]') == [word['id'] for word in suite.words]
+    assert len(suite.out.rows['vocabulary']) == len(suite.words)
+
+    assert run_once(benchmarks, 'proper_noun_entry[async]') == [name['id'] for name in suite.names]
+    assert len(suite.out.rows['proper_noun']) == len(suite.names)
+
+
+# ========== Benchmarks ==========
+
+@pytest.mark.skipif(not RUN_BENCHMARKS, reason='install pytest-benchmark or set TRANSFORM_BENCHMARKS=1')
+@pytest.mark.parametrize('name', BENCHMARKS)
+def test_benchmark(name, benchmarks, request):
+    benchmark = benchmarks[name]
+    if not HAVE_PYTEST_BENCHMARK:
+        result = benchmark.measure(ROUNDS)
+        print(f"{name}: {result['min_us']:.3f} µs min, {result['median_us']:.3f} µs median per item")
+        return
+
+    def one_round():
+        for item in benchmark.items:
+            benchmark.run(item)
+    request.getfixturevalue('benchmark').pedantic(one_round, setup=benchmark.setup, rounds=ROUNDS)
@@ -0,0 +1,89 @@
+"""Tests for the pending index state of index_manager.py."""
+
+import pytest
+
+import index_manager
+
+
+class FakeConnection:
+    """Connection that records executed statements instead of running them."""
+
+    def __init__(self):
+        self.statements = []
+
+    def cursor(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        self.statements.append(sql)
+
+    def fetchall(self):
+        return []
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def index(schema, name, table='vocabulary'):
+    return {'schema': schema, 'name': name, 'table': table,
+            'definition': f'CREATE INDEX {name} ON {schema}.{table} (id)', 'fk_lookup': False}
+
+
+@pytest.fixture
+def state_file(tmp_path, monkeypatch):
+    path = tmp_path / 'dropped_indexes.json'
+    monkeypatch.setattr(index_manager, 'INDEX_STATE_FILE', path)
+    monkeypatch.setattr(index_manager.psycopg2, 'connect', lambda **params: FakeConnection())
+    return path
+
+
+def drop(monkeypatch, schema, indexes):
+    monkeypatch.setattr(index_manager, 'capture_indexes', lambda conn, s: indexes if s == schema else [])
+    return index_manager.drop_indexes({}, schema)
+
+
+def test_shadow_schema_does_not_overwrite_live_entries(state_file, monkeypatch):
+    drop(monkeypatch, 'jlpt', [index('jlpt', 'idx_vocabulary_id')])
+    drop(monkeypatch, 'jlpt_next', [index('jlpt_next', 'idx_vocabulary_id')])
+
+    assert index_manager.pending_indexes('jlpt') == [index('jlpt', 'idx_vocabulary_id')]
+    assert index_manager.pending_indexes('jlpt_next') == [index('jlpt_next', 'idx_vocabulary_id')]
+
+
+def test_rebuild_only_clears_its_own_schema(state_file, monkeypatch):
+    drop(monkeypatch, 'jlpt', [index('jlpt', 'idx_vocabulary_id')])
+    drop(monkeypatch, 'jlpt_next', [index('jlpt_next', 'idx_vocabulary_id')])
+    built = []
+    monkeypatch.setattr(index_manager, '_build_index', lambda params, idx: built.append(idx) or 0.0)
+
+    assert index_manager.rebuild_indexes({}, 'jlpt_next')
+
+    assert built == [index('jlpt_next', 'idx_vocabulary_id')]
+    assert index_manager.pending_indexes('jlpt_next') == []
+    assert index_manager.pending_indexes('jlpt') == [index('jlpt', 'idx_vocabulary_id')]
+
+
+def test_failed_builds_stay_pending(state_file, monkeypatch):
+    drop(monkeypatch, 'jlpt', [index('jlpt', 'idx_a'), index('jlpt', 'idx_b')])
+
+    def build(params, idx):
+        if idx['name'] == 'idx_b':
+            raise RuntimeError('out of disk')
+        return 0.0
+    monkeypatch.setattr(index_manager, '_build_index', build)
+
+    assert not index_manager.rebuild_indexes({}, 'jlpt')
+    assert index_manager.pending_indexes('jlpt') == [index('jlpt', 'idx_b')]
+
+    monkeypatch.setattr(index_manager, '_build_index', lambda params, idx: 0.0)
+    assert index_manager.rebuild_indexes({}, 'jlpt')
+    assert not state_file.exists()
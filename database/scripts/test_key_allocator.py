@@ -0,0 +1,14 @@
+"""Tests for key_allocator.py."""
+
+import key_allocator
+
+
+def test_ascii_numeric_ids_map_to_themselves():
+    assert key_allocator.entity_ordinal('1000220') == 1000220
+
+
+def test_non_ascii_digits_do_not_parse_as_numbers():
+    # '²'.isdigit() is True but int('²') fails; '１２' must not collide with '12'
+    assert key_allocator.entity_ordinal('²') == ord('²')
+    assert key_allocator.entity_ordinal('１２') != key_allocator.entity_ordinal('12')
+    assert key_allocator.vocabulary_id('１２') != key_allocator.vocabulary_id('12')
@@ -0,0 +1,60 @@
+"""Tests for the table persistence switches of load_profile.py."""
+
+import load_profile
+
+
+class FakeCursor:
+    """Cursor that answers the foreign key query and records the other statements."""
+
+    def __init__(self, references):
+        self.references = references
+        self.statements = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        self.statements.append(' '.join(sql.split()))
+
+    def fetchall(self):
+        if 'pg_constraint' in self.statements[-1]:
+            return self.references
+        return []
+
+
+class FakeConnection:
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self.autocommit = False
+
+    def cursor(self):
+        return self._cursor
+
+    def close(self):
+        pass
+
+
+def altered(cursor, persistence):
+    return [sql.split()[2].split('.')[1] for sql in cursor.statements
+            if sql.startswith('ALTER TABLE') and sql.endswith(persistence)]
+
+
+def test_only_the_tables_switched_by_the_profile_are_logged_again(monkeypatch):
+    cursor = FakeCursor([('vocabulary_sense_gloss', 'vocabulary_sense'),
+                         ('vocabulary_sense', 'vocabulary')])
+    monkeypatch.setattr(load_profile, 'LOAD_PROFILE', True)
+    monkeypatch.setattr(load_profile, 'UNLOGGED_TABLES', ('vocabulary_sense',))
+    monkeypatch.setattr(load_profile.psycopg2, 'connect', lambda **params: FakeConnection(cursor))
+
+    with load_profile.bulk_load({}):
+        assert load_profile.active()
+    assert not load_profile.active()
+
+    # Referencing tables go UNLOGGED first and LOGGED last
+    assert altered(cursor, 'SET UNLOGGED') == ['vocabulary_sense_gloss', 'vocabulary_sense']
+    assert altered(cursor, 'SET LOGGED') == ['vocabulary_sense', 'vocabulary_sense_gloss']
+    # Tables created UNLOGGED (the load checkpoint) are never queried for or switched
+    assert not any('relpersistence' in sql for sql in cursor.statements)
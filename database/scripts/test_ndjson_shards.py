@@ -0,0 +1,37 @@
+"""Tests for ndjson_shards.py."""
+
+import json
+
+import ndjson_shards
+
+
+def write_source(path, words):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps({'version': '3.6.1', 'tags': {}, 'words': words}), encoding='utf-8')
+
+
+def test_known_checksums_are_not_recomputed(tmp_path, monkeypatch):
+    words = [{'id': str(n), 'kana': [{'text': 'あ'}]} for n in range(5)]
+    write_source(tmp_path / 'vocabulary' / 'source.json', words)
+
+    def no_hashing(path):
+        raise AssertionError(f'{path} hashed again')
+    monkeypatch.setattr(ndjson_shards, 'file_checksum', no_hashing)
+
+    assert ndjson_shards.convert_sources(tmp_path, {'vocabulary/source.json': 'abc'}) == 1
+    source = tmp_path / 'vocabulary' / 'source.json'
+    manifest = ndjson_shards.load_manifest(source)
+    assert manifest['checksum'] == 'abc'
+    assert ndjson_shards.fetch_entry(source, manifest, 3) == words[3]
+
+    # Same checksum: up to date without reading the source
+    assert ndjson_shards.convert_sources(tmp_path, {'vocabulary/source.json': 'abc'}) == 0
+
+
+def test_kanji_source_is_not_sharded(tmp_path):
+    kanji = tmp_path / 'kanji' / 'source.json'
+    kanji.parent.mkdir()
+    kanji.write_text(json.dumps({'characters': [{'literal': '日'}]}), encoding='utf-8')
+
+    assert ndjson_shards.convert_sources(tmp_path) == 0
+    assert not ndjson_shards.shard_dir(kanji).exists()
@@ -0,0 +1,80 @@
+"""Tests for source_header.py."""
+
+import builtins
+import io
+import json
+
+import pytest
+
+import source_header
+
+TAGS = {'n': 'noun (common) (futsuumeishi)', 'uk': 'word usually written using kana alone'}
+
+
+class CountingFile(io.TextIOWrapper):
+    """Text file that counts the characters read through it."""
+
+    chars_read = 0
+
+    def read(self, size=-1):
+        chunk = super().read(size)
+        CountingFile.chars_read += len(chunk)
+        return chunk
+
+
+@pytest.fixture
+def counting_open(monkeypatch):
+    """Make source_header open its files as CountingFile."""
+    CountingFile.chars_read = 0
+
+    def open_counting(path, mode='r', encoding=None):
+        assert mode == 'r'
+        return CountingFile(builtins.open(path, 'rb'), encoding=encoding)
+
+    monkeypatch.setattr(source_header, 'open', open_counting, raising=False)
+    return CountingFile
+
+
+def write_source(path, words_text):
+    header = json.dumps({'version': '3.6.1', 'languages': ['eng'], 'dictDate': '2026-10-12',
+                         'tags': TAGS}, ensure_ascii=False)
+    path.write_text(header[:-1] + ', "words": ' + words_text + '}', encoding='utf-8')
+
+
+def test_reads_tags_from_first_chunk_of_large_file(tmp_path, counting_open):
+    path = tmp_path / 'source.json'
+    entry = json.dumps({'id': '1000000', 'kanji': [], 'kana': [{'text': 'あ'}], 'sense': []})
+    write_source(path, '[' + ','.join([entry] * 100_000) + ']')
+    assert path.stat().st_size > 5_000_000
+
+    header = source_header.read_header(path, read_chars=4096)
+
+    assert header['tags'] == TAGS
+    assert header['version'] == '3.6.1'
+    assert counting_open.chars_read <= 4096
+
+
+def test_stops_before_malformed_entry_data(tmp_path, counting_open):
+    path = tmp_path / 'source.json'
+    # Not valid JSON past the header; decoding it would raise
+    write_source(path, '[{"id": "1", "kana": [' + 'x' * 1_000_000)
+
+    header = source_header.read_header(path, keys=('tags',), read_chars=4096)
+
+    assert header == {'tags': TAGS}
+    assert counting_open.chars_read <= 4096
+
+
+def test_missing_key_stops_at_entry_data(tmp_path, counting_open):
+    path = tmp_path / 'source.json'
+    write_source(path, '[' + 'x' * 1_000_000)
+
+    assert source_header.read_header(path, keys=('tags', 'missing'), read_chars=4096) == {'tags': TAGS}
+    assert counting_open.chars_read <= 4096
+
+
+def test_header_spanning_chunks(tmp_path):
+    path = tmp_path / 'source.json'
+    write_source(path, '[]')
+
+    assert source_header.read_header(path, read_chars=7)['tags'] == TAGS
@@ -0,0 +1,75 @@
+"""Tests for the statement templates and aggregation of sql_profiler.py."""
+
+import pytest
+
+import load_metrics
+import sql_profiler
+
+
+@pytest.fixture(autouse=True)
+def clear_stats():
+    sql_profiler._stats.clear()
+    yield
+    sql_profiler._stats.clear()
+
+
+@pytest.mark.parametrize('query, expected', [
+    ("SELECT id FROM jlpt.kanji WHERE literal = '日' AND grade = 3",
+     "SELECT id FROM jlpt.kanji WHERE literal = ? AND grade = ?"),
+    ("SELECT 'it''s' WHERE a = -1.5 OR b IS NULL OR c = true",
+     "SELECT ? WHERE a = ? OR b IS ? OR c = ?"),
+    ("SELECT 'a', 2, NULL", "SELECT ?, ..."),
+    ("INSERT INTO jlpt.tag (code) VALUES (%s), (%s), (%s)",
+     "INSERT INTO jlpt.tag (code) VALUES (%s), ..."),
+    ("INSERT INTO jlpt.kanji_reading (kanji_id, type, value)\n  VALUES ($1, $2, $3), ($4, $5, $6)",
+     "INSERT INTO jlpt.kanji_reading (kanji_id, type, value) VALUES ($1, $2, $3), ..."),
+    ("SELECT * FROM jlpt.vocabulary WHERE id IN (1, 2, 3)",
+     "SELECT * FROM jlpt.vocabulary WHERE id IN (?, ...)"),
+    (b"SELECT $1::uuid[]", "SELECT $1::uuid[]"),
+])
+def test_template_collapses_literals_and_lists(query, expected):
+    assert sql_profiler.template(query) == expected
+
+
+def test_identifiers_with_digits_are_kept():
+    assert sql_profiler.template('SELECT kang_xi_number FROM t2 WHERE x = 10') == \
+        'SELECT kang_xi_number FROM t2 WHERE x = ?'
+
+
+def test_status_rows():
+    assert sql_profiler._status_rows('INSERT 0 5') == 5
+    assert sql_profiler._status_rows('COPY 100') == 100
+    assert sql_profiler._status_rows('CREATE INDEX') == 0
+    assert sql_profiler._status_rows(None) == 0
+
+
+def test_statements_aggregate_per_stage_and_template():
+    with load_metrics.collect():
+        with load_metrics.stage('kanji'):
+            load_metrics.record_write('kanji', 4, 1, 0)
+            sql_profiler.record("SELECT id FROM jlpt.kanji WHERE literal = '日'", 0.002, 1)
+            sql_profiler.record("SELECT id FROM jlpt.kanji WHERE literal = '月'", 0.004, 1)
+            sql_profiler.record("INSERT INTO jlpt.kanji_meaning VALUES (%s, %s)", 0.010, 10, statements=10)
+        with load_metrics.stage('vocabulary'):
+            sql_profiler.record("SELECT id FROM jlpt.kanji WHERE literal = '火'", 0.001, 0)
+        data = sql_profiler.report()
+
+    kanji = data['stages']['kanji']
+    assert kanji['statements'] == 12
+    assert kanji['seconds'] == pytest.approx(0.016)
+    assert kanji['entities'] == 4
+    assert kanji['per_entity'] == 3.0
+    assert data['stages']['vocabulary']['statements'] == 1
+
+    by_key = {(t['stage'], t['template']): t for t in data['templates']}
+    select = by_key[('kanji', 'SELECT id FROM jlpt.kanji WHERE literal = ?')]
+    assert (select['count'], select['rows'], select['per_entity']) == (2, 2, 0.5)
+    assert select['p99_ms'] == pytest.approx(4.0)
+    insert = by_key[('kanji', 'INSERT INTO jlpt.kanji_meaning VALUES (%s, %s)')]
+    # An executemany contributes its average latency
+    assert (insert['count'], insert['rows'], insert['p99_ms']) == (10, 10, pytest.approx(1.0))
+    assert ('vocabulary', 'SELECT id FROM jlpt.kanji WHERE literal = ?') in by_key
+
+    # Slowest in total first
+    assert [t['total_seconds'] for t in data['templates']] == sorted(
+        (t['total_seconds'] for t in data['templates']), reverse=True)
@@ -0,0 +1,119 @@
+"""Tests for stage_graph.py."""
+
+import asyncio
+import time
+
+import pytest
+
+from stage_graph import StageGraph
+
+
+def graph_with_log(max_concurrent=3):
+    order = []
+    graph = StageGraph(max_concurrent=max_concurrent, log=lambda text: None)
+
+    def stage(name, seconds=0.0):
+        def run():
+            time.sleep(seconds)
+            order.append(name)
+        return run
+    return graph, order, stage
+
+
+def test_stages_run_after_their_inputs():
+    graph, order, stage = graph_with_log()
+    graph.add('examples', stage('examples'), ['vocabulary_cache'], ['vocabulary_sense_example'])
+    graph.add('vocabulary', stage('vocabulary', 0.02), ['kanji_cache'], ['vocabulary_cache'])
+    graph.add('kanji', stage('kanji', 0.02), outputs=['kanji_cache'])
+    graph.add('radicals', stage('radicals'), ['kanji_cache'], ['radical_cache'])
+
+    graph.run_threaded()
+
+    assert order.index('kanji') < order.index('vocabulary') < order.index('examples')
+    assert order.index('kanji') < order.index('radicals')
+    assert set(order) == set(graph.stages)
+
+
+def test_coroutine_stages_run_in_dependency_order():
+    order = []
+    graph = StageGraph(log=lambda text: None)
+
+    def stage(name):
+        async def run():
+            await asyncio.sleep(0)
+            order.append(name)
+        return run
+    graph.add('relations', stage('relations'), ['term_cache', 'pending'])
+    graph.add('terms', stage('terms'), ['vocabulary_cache'], ['term_cache'])
+    graph.add('vocabulary', stage('vocabulary'), outputs=['vocabulary_cache', 'pending'])
+
+    asyncio.run(graph.run())
+
+    assert order == ['vocabulary', 'terms', 'relations']
+
+
+def test_cycle_is_rejected_before_anything_runs():
+    graph, order, stage = graph_with_log()
+    graph.add('a', stage('a'), ['b_out'], ['a_out'])
+    graph.add('b', stage('b'), ['a_out'], ['b_out'])
+    graph.add('c', stage('c'), outputs=['c_out'])
+
+    with pytest.raises(ValueError, match='Dependency cycle between a, b'):
+        graph.run_threaded()
+    assert order == []
+
+
+def test_missing_input_is_rejected():
+    graph, order, stage = graph_with_log()
+    graph.add('examples', stage('examples'), ['vocabulary_cache'])
+
+    with pytest.raises(ValueError, match="'examples' needs vocabulary_cache, which no stage provides"):
+        graph.run_threaded()
+    assert order == []
+
+
+def test_duplicate_stages_and_outputs_are_rejected():
+    graph, _, stage = graph_with_log()
+    graph.add('kanji', stage('kanji'), outputs=['kanji_cache'])
+
+    with pytest.raises(ValueError, match="Duplicate stage 'kanji'"):
+        graph.add('kanji', stage('kanji'))
+    with pytest.raises(ValueError, match="provided by both 'kanji' and 'radicals'"):
+        graph.add('radicals', stage('radicals'), outputs=['kanji_cache'])
+
+
+def test_critical_path_follows_the_chain_that_finished_last():
+    graph, _, stage = graph_with_log()
+    graph.add('kanji', stage('kanji', 0.05), outputs=['kanji_cache'])
+    graph.add('vocabulary', stage('vocabulary', 0.1), ['kanji_cache'], ['vocabulary_cache'])
+    graph.add('radicals', stage('radicals', 0.01), ['kanji_cache'], ['radical_cache'])
+    graph.add('names', stage('names', 0.01), outputs=['proper_noun'])
+
+    graph.run_threaded()
+
+    assert [s.name for s in graph.critical_path()] == ['kanji', 'vocabulary']
+    report = graph.report()
+    assert report[0].split() == ['stage', 'start', 'end', 'time', 'wait']
+    marked = {line.split()[0] for line in report[1:-2] if line.endswith('*')}
+    assert marked == {'kanji', 'vocabulary'}
+    assert report[-2].startswith('Critical path (*): kanji -> vocabulary = ')
+    assert report[-1].endswith('(max 3 at a time)')
+
+
+def test_critical_path_includes_stages_holding_a_concurrency_slot():
+    graph, _, stage = graph_with_log(max_concurrent=1)
+    graph.add('kanji', stage('kanji', 0.02), outputs=['kanji_cache'])
+    graph.add('names', stage('names', 0.02), outputs=['proper_noun'])
+
+    graph.run_threaded()
+
+    # names was ready from the start but waited for kanji's slot
+    assert [s.name for s in graph.critical_path()] == ['kanji', 'names']
+    assert graph.stages['names'].started >= graph.stages['kanji'].finished
+
+
+def test_report_is_empty_before_a_run():
+    graph, _, stage = graph_with_log()
+    graph.add('kanji', stage('kanji'))
+    assert graph.report() == []
+    assert graph.critical_path() == []
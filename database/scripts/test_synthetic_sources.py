@@ -0,0 +1,37 @@
+"""Tests for synthetic_sources.py."""
+
+import json
+
+import synthetic_sources
+
+
+def read_json(path):
+    return json.loads(path.read_text(encoding='utf-8'))
+
+
+def test_generated_sources_match_the_reported_sizes(tmp_path):
+    sizes = synthetic_sources.generate(tmp_path, 0.001)
+
+    assert len(read_json(tmp_path / 'vocabulary' / 'source.json')['words']) == sizes['vocabulary']
+    assert len(read_json(tmp_path / 'names' / 'source.json')['words']) == sizes['proper_noun']
+    assert len(read_json(tmp_path / 'kanji' / 'source.json')['characters']) == sizes['kanji']
+    examples = read_json(tmp_path / 'vocabulary' / 'vocabularyWithExamples' / 'source.json')['words']
+    assert len(examples) == sizes['example']
+
+
+def test_examples_refer_to_generated_vocabulary(tmp_path):
+    synthetic_sources.generate(tmp_path, 0.001)
+
+    words = {w['id']: w for w in read_json(tmp_path / 'vocabulary' / 'source.json')['words']}
+    for example_word in read_json(tmp_path / 'vocabulary' / 'vocabularyWithExamples' / 'source.json')['words']:
+        assert example_word['id'] in words
+        assert len(example_word['sense']) <= len(words[example_word['id']]['sense'])
+
+
+def test_same_seed_gives_the_same_sources(tmp_path):
+    synthetic_sources.generate(tmp_path / 'a', 0.001, seed=3)
+    synthetic_sources.generate(tmp_path / 'b', 0.001, seed=3)
+
+    for path in sorted((tmp_path / 'a').rglob('*')):
+        if path.is_file():
+            assert path.read_bytes() == (tmp_path / 'b' / path.relative_to(tmp_path / 'a')).read_bytes()